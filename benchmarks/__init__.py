@@ -0,0 +1,9 @@
+"""Benchmarks of the AIS Stream Visualization.
+
+   * ``ais_generator``: Synthetic (Piraeus-area) AIS traffic, along with a stand-in Kafka producer
+   * ``fake_kafka``: An in-process (fake) Kafka consumer, fed by the generator, for ``data_thread`` and the ingest process
+   * ``e2e``: A headless, multi-session, end-to-end benchmark (throughput, ingest-to-client latency, server RSS and CPU per session)
+   * ``microbench``: Microbenchmarks (time and peak memory) of the VISIONS data preparation, compared against a stored baseline
+
+   Run from the repository's root (i.e., next to server.ini), e.g., ``python -m benchmarks.e2e --sessions 8 --vessels 2000 --rate 500``.
+"""
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+"""Synthetic AIS Traffic (Piraeus Area).
+
+   Every vessel is either anchored/moored (i.e., reports a position within a few meters, at zero speed) or sails at a constant speed,
+   slowly changing its heading (and turning back into the area at its borders). Reports are issued round-robin at a fixed (overall) rate,
+   as kinematic (i.e., ``mmsi``, ``timestamp``, ``longitude``, ``latitude``, ``speed``, ``heading``) or static (i.e., ``mmsi``,
+   ``shipname``, ``shiptype``) payloads, i.e., the format of the AIS stream's Kafka messages (``{"payload": {...}}``).
+
+   Usage (stand-in producer): python -m benchmarks.ais_generator --broker localhost:9092 --topic ais --vessels 2000 --rate 500
+"""
+
+
+import json
+import math
+import time
+import argparse
+
+import numpy as np
+
+
+PIRAEUS_BBOX = (23.35, 37.70, 23.75, 38.02)    # (lon_min, lat_min, lon_max, lat_max)
+SHIP_TYPES = (30, 31, 52, 60, 69, 70, 79, 80, 89, 36, 37)    # Fishing, towing, tug, passenger, cargo, tanker, sailing and pleasure craft
+KNOTS_TO_DEG = 0.514444 / 111_320    # (Approximate) degrees of latitude per second, per knot
+
+
+class AISGenerator:
+    def __init__(self, n_vessels: int = 1000, rate: float = 200.0, static_ratio: float = 0.1, moving_ratio: float = 0.6, bbox: tuple = PIRAEUS_BBOX, seed: int = 0):
+        """
+        n_vessels: The number of (distinct) vessels
+        rate: The (overall) number of reports per second
+        static_ratio: The ratio of static reports
+        moving_ratio: The ratio of moving (i.e., not anchored/moored) vessels
+        bbox: The area of the traffic (lon_min, lat_min, lon_max, lat_max)
+        seed: The seed of the (reproducible) traffic
+        """
+        self.n_vessels = n_vessels
+        self.rate = rate
+        self.static_ratio = static_ratio
+        self.bbox = bbox
+        self._rng = np.random.default_rng(seed)
+
+        self.mmsi = 237_000_000 + np.arange(n_vessels)    # Greek MID
+        self.lon = self._rng.uniform(bbox[0], bbox[2], n_vessels)
+        self.lat = self._rng.uniform(bbox[1], bbox[3], n_vessels)
+        self.speed = np.where(self._rng.random(n_vessels) < moving_ratio, self._rng.uniform(4, 22, n_vessels), 0.0)
+        self.heading = self._rng.uniform(0, 360, n_vessels)
+        self.ship_type = self._rng.choice(SHIP_TYPES, n_vessels)
+        self.last_ts = np.full(n_vessels, -1, dtype=np.int64)
+
+        self._next = 0    # The next vessel (round-robin) to report
+        self.n_records = 0
+
+    def _move(self, idx: int, now_ms: int):
+        dt = (now_ms - self.last_ts[idx]) / 1000 if self.last_ts[idx] >= 0 else 0
+        self.last_ts[idx] = now_ms
+
+        if self.speed[idx] == 0:
+            # Anchored/moored vessels drift (within a few meters) around their position
+            return self.lon[idx] + self._rng.normal(0, 2e-5), self.lat[idx] + self._rng.normal(0, 2e-5)
+
+        self.heading[idx] = (self.heading[idx] + self._rng.normal(0, 2)) % 360
+        step = self.speed[idx] * KNOTS_TO_DEG * dt
+        lon = self.lon[idx] + step * math.sin(math.radians(self.heading[idx])) / math.cos(math.radians(self.lat[idx]))
+        lat = self.lat[idx] + step * math.cos(math.radians(self.heading[idx]))
+
+        # Turn back at the area's borders
+        if not (self.bbox[0] <= lon <= self.bbox[2] and self.bbox[1] <= lat <= self.bbox[3]):
+            self.heading[idx] = (self.heading[idx] + 180) % 360
+            lon, lat = self.lon[idx], self.lat[idx]
+
+        self.lon[idx], self.lat[idx] = lon, lat
+        return lon, lat
+
+    def next_record(self, now_ms: int = None):
+        """
+        Return the (payload of the) next report; timestamped at ``now_ms`` (default: the current time).
+        """
+        now_ms = int(time.time_ns() // 1_000_000) if now_ms is None else now_ms
+        idx = self._next
+        self._next = (self._next + 1) % self.n_vessels
+        self.n_records += 1
+
+        if self._rng.random() < self.static_ratio:
+            return {'mmsi': str(self.mmsi[idx]), 'shipname': f'BENCHMARK {idx:05d}', 'shiptype': int(self.ship_type[idx])}
+
+        lon, lat = self._move(idx, now_ms)
+        return {
+            'mmsi': str(self.mmsi[idx]), 'timestamp': now_ms, 'longitude': round(float(lon), 6), 'latitude': round(float(lat), 6),
+            'speed': round(float(self.speed[idx]), 1), 'heading': round(float(self.heading[idx]), 1)
+        }
+
+    def stream(self, duration: float = None):
+        """
+        Yield reports at the generator's rate (i.e., paced in real time), for ``duration`` seconds (default: indefinitely).
+        """
+        start = time.perf_counter()
+        while duration is None or time.perf_counter() - start < duration:
+            due = int((time.perf_counter() - start) * self.rate) + 1
+            if self.n_records >= due:
+                time.sleep(min(1 / self.rate, 0.01))
+                continue
+            yield self.next_record()
+
+
+def produce(broker: str, topic: str, generator: AISGenerator, duration: float = None):
+    """
+    Publish the generator's reports to a (real) Kafka topic, i.e., a stand-in for the AIS stream.
+    """
+    from confluent_kafka import Producer
+
+    producer = Producer({'bootstrap.servers': broker, 'linger.ms': 5})
+    try:
+        for n, record in enumerate(generator.stream(duration), start=1):
+            producer.produce(topic, json.dumps({'payload': record}).encode('utf-8'), key=record['mmsi'], timestamp=int(time.time_ns() // 1_000_000))
+            if n % 1000 == 0:
+                producer.poll(0)
+    finally:
+        producer.flush()
+
+    return generator.n_records
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Synthetic AIS Traffic (stand-in Kafka producer)')
+    parser.add_argument('--broker', default='localhost:9092')
+    parser.add_argument('--topic', default='ais')
+    parser.add_argument('--vessels', type=int, default=1000)
+    parser.add_argument('--rate', type=float, default=200.0, help='Reports per second')
+    parser.add_argument('--static-ratio', type=float, default=0.1)
+    parser.add_argument('--moving-ratio', type=float, default=0.6)
+    parser.add_argument('--duration', type=float, default=None, help='Seconds (default: indefinitely)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    generator = AISGenerator(args.vessels, args.rate, args.static_ratio, args.moving_ratio, seed=args.seed)
+    print(f'Produced {produce(args.broker, args.topic, generator, args.duration)} reports to {args.topic}@{args.broker}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+"""Headless, Multi-Session, End-to-End Benchmark.
+
+   Starts the application (i.e., a Bokeh Server, in a subprocess) whose Kafka consumers are fed by the synthetic traffic (consult
+   ``fake_kafka``), opens ``--sessions`` headless client sessions (``bokeh.client.pull_session``) and reports, over the measured window:
+     * The throughput, i.e., the messages consumed (server-side, via the metrics endpoint) and the rows received (client-side) per second
+     * The ingest-to-client latency percentiles, i.e., from a report's timestamp to its arrival (as a patch or stream) at a client
+     * The server's RSS and CPU per session (i.e., their increase over the idle server, divided by the number of sessions)
+
+   Usage: python -m benchmarks.e2e --sessions 8 --vessels 2000 --rate 500 --duration 30 [--json results.json]
+"""
+
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+import multiprocessing
+from urllib.request import urlopen
+from urllib.error import URLError
+
+import numpy as np
+
+
+APP_NAME = 'unipi-ais'
+
+
+def proc_stats(pid: int):
+    # (RSS in bytes, CPU time in seconds) of a (Linux) process
+    with open(f'/proc/{pid}/status') as f:
+        rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith('VmRSS:'))
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return rss, (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def scrape_counter(url: str, name: str):
+    try:
+        for line in urlopen(url, timeout=5).read().decode('utf-8').splitlines():
+            if line.startswith(f'{name} '):
+                return float(line.split()[1])
+    except URLError:
+        pass
+    return None
+
+
+def serve(args):
+    # The benchmarked server: the application, whose Kafka consumers are replaced with fake ones (fed by the synthetic traffic)
+    from bokeh.command.util import build_single_handler_application
+    from bokeh.server.server import Server
+
+    from vessel_positions_json import settings, APP_ROOT
+    from vessel_metrics import metrics_patterns
+    from benchmarks import fake_kafka
+
+    fake_kafka.install(settings['kafka_topics'].split(','), n_vessels=args.vessels, rate=args.rate, static_ratio=args.static_ratio, seed=args.seed)
+
+    application = build_single_handler_application(APP_ROOT)
+    server = Server({f'/{APP_NAME}': application}, port=args.port, allow_websocket_origin=[f'localhost:{args.port}'], extra_patterns=metrics_patterns())
+    server.start()
+    server.io_loop.start()
+
+
+def drive_session(url: str, connected, measure_from, stop, results):
+    # A headless client session (i.e., in its own process, so that the clients neither share the GIL nor the Bokeh models' state)
+    from bokeh.client import pull_session
+
+    latencies, rows = [], [0]
+
+    def on_change(event):
+        # The flush pacer's ping is acknowledged (consult ``vessel_pacing``), as BokehJS does
+        if getattr(event, 'attr', None) == 'tags' and len(event.new) == 1:
+            event.model.tags = [event.new[0], 'ack']
+        if not measure_from.is_set():
+            return
+
+        now_ms = time.time_ns() // 1_000_000
+        event = getattr(event, 'hint', None) or event    # i.e., the ColumnsPatchedEvent (ColumnsStreamedEvent) of a ModelChangedEvent
+        if hasattr(event, 'patches'):
+            timestamps = [ts for _, ts in event.patches.get('ts', [])]
+            rows[0] += max((len(patch) for patch in event.patches.values()), default=0)
+        elif hasattr(event, 'data') and isinstance(event.data, dict):
+            timestamps = list(event.data.get('ts', []))
+            rows[0] += len(timestamps)
+        else:
+            return
+        latencies.extend(now_ms - int(ts) for ts in timestamps)
+
+    session = pull_session(url=url)
+    session.document.on_change(on_change)
+
+    # Models that are only referenced by a DataSpec's transform (e.g., the interpolation's clock) are not part of the Python client's
+    # document (unlike BokehJS'); their events are dropped
+    apply_json_patch = session.document.apply_json_patch
+
+    def apply_known_json_patch(patch, setter=None):
+        def known(event):
+            target = event.get('model') or event.get('column_source')
+            return not isinstance(target, dict) or session.document.get_model_by_id(target['id']) is not None
+
+        return apply_json_patch(dict(patch, events=[event for event in patch['events'] if known(event)]), setter)
+
+    session.document.apply_json_patch = apply_known_json_patch
+    connected.set()
+
+    # The Bokeh client handles every (next) message recursively (i.e., a frame per received message); a deep stack keeps it going
+    sys.setrecursionlimit(1_000_000)
+    threading.stack_size(512 * 2**20)
+
+    # ``loop_until_closed`` is private as of Bokeh 2.4
+    threading.Thread(target=getattr(session, 'loop_until_closed', None) or session._loop_until_closed, daemon=True).start()
+    stop.wait()
+    results.put((latencies, rows[0]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-End Benchmark of the AIS Stream Visualization')
+    parser.add_argument('--sessions', type=int, default=4)
+    parser.add_argument('--vessels', type=int, default=1000)
+    parser.add_argument('--rate', type=float, default=200.0, help='Reports per second (per session consumer)')
+    parser.add_argument('--static-ratio', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--warmup', type=float, default=10.0, help='Seconds before measuring')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds measured')
+    parser.add_argument('--port', type=int, default=5096)
+    parser.add_argument('--json', default=None, help='Write the results to a JSON file')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args)
+
+    argv = [sys.executable, '-m', 'benchmarks.e2e', '--serve', '--port', str(args.port), '--vessels', str(args.vessels), '--rate', str(args.rate),
+            '--static-ratio', str(args.static_ratio), '--seed', str(args.seed)]
+    server = subprocess.Popen(argv, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    app_url, metrics_url = f'http://localhost:{args.port}/{APP_NAME}', f'http://localhost:{args.port}/metrics'
+
+    try:
+        for _ in range(60):
+            if scrape_counter(metrics_url, 'unipi_ais_sessions') is not None:
+                break
+            time.sleep(0.5)
+        else:
+            raise RuntimeError('The benchmarked server did not start')
+
+        idle_rss, _ = proc_stats(server.pid)
+
+        # The sessions are opened one at a time
+        measure_from, stop, results = multiprocessing.Event(), multiprocessing.Event(), multiprocessing.Queue()
+        drivers = []
+        for _ in range(args.sessions):
+            connected = multiprocessing.Event()
+            drivers.append(multiprocessing.Process(target=drive_session, args=(app_url, connected, measure_from, stop, results), daemon=True))
+            drivers[-1].start()
+            if not connected.wait(timeout=30):
+                raise RuntimeError('A client session failed to connect')
+
+        time.sleep(args.warmup)
+        consumed_start = scrape_counter(metrics_url, 'unipi_ais_messages_consumed_total') or 0
+        _, cpu_start = proc_stats(server.pid)
+        measure_from.set()
+        start = time.perf_counter()
+
+        time.sleep(args.duration)
+        measure_from.clear()
+        elapsed = time.perf_counter() - start
+        consumed = (scrape_counter(metrics_url, 'unipi_ais_messages_consumed_total') or 0) - consumed_start
+        rss, cpu_end = proc_stats(server.pid)
+
+        stop.set()
+        sessions = [results.get(timeout=30) for _ in drivers]
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    latencies = np.array([latency for session_latencies, _ in sessions for latency in session_latencies], dtype=np.float64)
+    results = {
+        'sessions': args.sessions, 'vessels': args.vessels, 'rate': args.rate, 'duration_s': round(elapsed, 2),
+        'consumed_msgs_per_s': round(consumed / elapsed, 1),
+        'received_rows_per_s': round(sum(rows for _, rows in sessions) / elapsed, 1),
+        'latency_ms': {f'p{q}': round(float(np.percentile(latencies, q)), 1) for q in (50, 90, 99)} if len(latencies) else None,
+        'latency_samples': int(len(latencies)),
+        'rss_mb_per_session': round((rss - idle_rss) / 2**20 / args.sessions, 2),
+        'cpu_percent_per_session': round(100 * (cpu_end - cpu_start) / elapsed / args.sessions, 2),
+    }
+
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""In-process (Fake) Kafka Consumer, fed by the synthetic AIS traffic.
+
+   Stands in for ``confluent_kafka.Consumer`` at ``vessel_positions_json`` (consult ``install``), so that ``data_thread`` and the ingest
+   process consume the generator's reports (paced at its rate) without a broker. Every consumer (e.g., every session) replays the same
+   (seeded) traffic, i.e., as every session's consumer group does with the actual topic.
+"""
+
+
+import json
+import time
+
+from benchmarks.ais_generator import AISGenerator
+
+
+class FakeMessage:
+    def __init__(self, topic: str, partition: int, offset: int, value: bytes, timestamp_ms: int):
+        self._topic, self._partition, self._offset, self._value, self._timestamp_ms = topic, partition, offset, value, timestamp_ms
+
+    def error(self):
+        return None
+
+    def value(self):
+        return self._value
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+    def timestamp(self):
+        return 1, self._timestamp_ms    # i.e., TIMESTAMP_CREATE_TIME
+
+
+class _TopicMetadata:
+    def __init__(self, topics: list):
+        self.topics = {topic: type('TopicMetadata', (), {'partitions': {0: None}})() for topic in topics}
+
+
+class FakeConsumer:
+    def __init__(self, conf: dict, topics: list, generator_kwargs: dict):
+        self.conf = conf
+        self.topics = topics
+        self.generator = AISGenerator(**generator_kwargs)
+        self._start = None
+        self._offset = 0
+
+    def list_topics(self, timeout: float = None):
+        return _TopicMetadata(self.topics)
+
+    def subscribe(self, topics: list, on_assign=None):
+        self._start = time.perf_counter()
+
+    def assign(self, partitions):
+        self._start = time.perf_counter()
+
+    def assignment(self):
+        return []
+
+    def position(self, partitions):
+        return []
+
+    def _due(self):
+        # The number of reports that are due (i.e., at the generator's rate) since the subscription
+        return int((time.perf_counter() - self._start) * self.generator.rate) + 1 - self.generator.n_records
+
+    def _message(self):
+        record = self.generator.next_record()
+        now_ms = int(time.time_ns() // 1_000_000)
+        self._offset += 1
+        return FakeMessage(self.topics[0], 0, self._offset - 1, json.dumps({'payload': record}).encode('utf-8'), now_ms)
+
+    def consume(self, num_messages: int = 1, timeout: float = -1):
+        deadline = time.perf_counter() + max(timeout, 0)
+        while self._due() <= 0 and time.perf_counter() < deadline:
+            time.sleep(min(1 / self.generator.rate, 0.005))
+
+        return [self._message() for _ in range(max(min(self._due(), num_messages), 0))]
+
+    def poll(self, timeout: float = None):
+        messages = self.consume(1, timeout if timeout is not None else 1.0)
+        return messages[0] if messages else None
+
+    def close(self):
+        pass
+
+
+def install(topics: list, **generator_kwargs):
+    """
+    Replace the Kafka consumer of ``vessel_positions_json`` with a fake one (i.e., for every consumer created from now on).
+
+    topics: The topics that the fake broker reports as available (i.e., ``kafka_topics`` at server.ini)
+    generator_kwargs: The arguments of the ``AISGenerator`` (e.g., ``n_vessels``, ``rate``)
+    """
+    import vessel_positions_json
+
+    vessel_positions_json.Consumer = lambda conf: FakeConsumer(conf, topics, generator_kwargs)
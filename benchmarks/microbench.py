@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+
+"""Microbenchmarks of the VISIONS Data Preparation (``st_visualizer`` and ``geom_helper``).
+
+   Every case is run on (seeded) synthetic Piraeus-area datasets of ``--sizes`` coordinates, i.e., ``n`` points, ``n / 50`` lines
+   (of 50 vertices) or ``n / 20`` polygons (of 20 vertices), and reports its time (min. and median of ``--repeat`` runs) along with its
+   peak (Python-allocated, i.e., via tracemalloc -- including NumPy's, but not GEOS') memory, measured on a separate run.
+
+   The results are compared against a stored baseline (i.e., of a previous ``--save-baseline`` run on the same machine); cases slower (or
+   more memory-hungry) than ``--threshold`` times their baseline are reported as regressions (and the exit code is non-zero).
+
+   Usage: python -m benchmarks.microbench [--sizes 10k,100k,1M] [--cases prepare_data,getCoords] [--repeat 3] [--save-baseline]
+"""
+
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely.geometry
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'st_visions'))
+import geom_helper
+from st_visualizer import st_visualizer
+
+from benchmarks.ais_generator import PIRAEUS_BBOX
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'microbench.json')
+DEFAULT_SIZES = '10k,100k'
+LINE_VERTICES = 50
+POLYGON_VERTICES = 20
+
+Case = namedtuple('Case', ['name', 'kind', 'setup', 'run'])
+CASES = []
+
+
+def case(name, kind):
+    """
+    Register a benchmark case; ``setup(n)`` builds its (untimed) state, and the decorated ``run(state)`` is the timed call.
+    """
+    def register(setup):
+        def decorator(run):
+            CASES.append(Case(f'{name}[{kind}]', kind, setup, run))
+            return run
+        return decorator
+    return register
+
+
+# Datasets
+# --------
+def points_df(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'mmsi': rng.integers(0, max(n // 100, 1), n) + 237_000_000,
+        'ts': np.sort(rng.integers(1_600_000_000, 1_600_086_400, n)),
+        'lon': rng.uniform(PIRAEUS_BBOX[0], PIRAEUS_BBOX[2], n),
+        'lat': rng.uniform(PIRAEUS_BBOX[1], PIRAEUS_BBOX[3], n),
+        'speed': rng.uniform(0, 25, n).round(1)
+    })
+
+
+def points_gdf(n, seed=0):
+    return geom_helper.getGeoDataFrame_v2(points_df(n, seed), crs='epsg:4326')
+
+
+def lines_gdf(n, seed=0):
+    # Random walks (of ``LINE_VERTICES`` vertices) starting within the area
+    rng = np.random.default_rng(seed)
+    n_lines = max(n // LINE_VERTICES, 1)
+    start = np.column_stack([rng.uniform(PIRAEUS_BBOX[0], PIRAEUS_BBOX[2], n_lines), rng.uniform(PIRAEUS_BBOX[1], PIRAEUS_BBOX[3], n_lines)])
+    coords = start[:, None, :] + np.cumsum(rng.normal(0, 1e-3, (n_lines, LINE_VERTICES, 2)), axis=1)
+
+    return gpd.GeoDataFrame({'line_id': np.arange(n_lines)}, geometry=[shapely.geometry.LineString(line) for line in coords], crs='epsg:4326')
+
+
+def polygons_gdf(n, seed=0, multi=False):
+    # (Irregular) circles of ``POLYGON_VERTICES`` vertices; if ``multi``, pairs of them as MultiPolygons
+    rng = np.random.default_rng(seed)
+    n_polygons = max(n // POLYGON_VERTICES, 2)
+    center = np.column_stack([rng.uniform(PIRAEUS_BBOX[0], PIRAEUS_BBOX[2], n_polygons), rng.uniform(PIRAEUS_BBOX[1], PIRAEUS_BBOX[3], n_polygons)])
+    angles = np.linspace(0, 2 * np.pi, POLYGON_VERTICES - 1, endpoint=False)
+    radius = rng.uniform(5e-4, 5e-3, (n_polygons, 1)) * rng.uniform(0.8, 1.2, (n_polygons, len(angles)))
+    ring = center[:, None, :] + np.stack([radius * np.cos(angles), radius * np.sin(angles)], axis=-1)
+    polygons = [shapely.geometry.Polygon(shell) for shell in ring]
+
+    if multi:
+        polygons = [shapely.geometry.MultiPolygon(pair) for pair in zip(polygons[0::2], polygons[1::2])]
+
+    return gpd.GeoDataFrame({'area_id': np.arange(len(polygons))}, geometry=polygons, crs='epsg:4326')
+
+
+DATASETS = {'points': points_gdf, 'lines': lines_gdf, 'polygons': polygons_gdf, 'multipolygons': lambda n: polygons_gdf(n, multi=True)}
+
+
+def loaded_instance(gdf, limit=None):
+    vsn = st_visualizer(limit=len(gdf) if limit is None else limit)
+    vsn.set_data(gdf)
+    return vsn
+
+
+# Cases
+# -----
+@case('getGeoDataFrame_v2', 'points')(lambda n: points_df(n))
+def _(df):
+    geom_helper.getGeoDataFrame_v2(df, crs='epsg:4326')
+
+
+@case('set_data', 'points')(lambda n: (st_visualizer(limit=n), points_df(n)))
+def _(state):
+    vsn, df = state
+    vsn.set_data(df)
+
+
+for _kind in ('points', 'lines', 'polygons'):
+    @case('prepare_data', _kind)(lambda n, kind=_kind: loaded_instance(DATASETS[kind](n)))
+    def _(vsn):
+        vsn.prepare_data(suffix='_merc')
+
+
+for _kind in ('lines', 'polygons', 'multipolygons'):
+    @case('getCoords', _kind)(lambda n, kind=_kind: DATASETS[kind](n).geometry.values)
+    def _(geometries):
+        for dim in (0, 1):
+            [geom_helper.getCoords(geom, dim) for geom in geometries]
+
+
+@case('multiGeomHandler', 'multipolygons')(lambda n: DATASETS['multipolygons'](n).geometry.values)
+def _(geometries):
+    for dim in (0, 1):
+        [geom_helper.multiGeomHandler(geom, dim, 'MultiPolygon') for geom in geometries]
+
+
+@case('create_linestring_from_points', 'points')(lambda n: points_gdf(n))
+def _(gdf):
+    geom_helper.create_linestring_from_points(gdf, ['mmsi'], disable=True)
+
+
+@case('create_linestring_from_points_vectorized', 'points')(lambda n: points_gdf(n))
+def _(gdf):
+    geom_helper.create_linestring_from_points(gdf, ['mmsi'], vectorized=True, temporal_name='ts')
+
+
+@case('classify_area_proximity', 'points')(lambda n: (points_gdf(n), polygons_gdf(max(n // 10, POLYGON_VERTICES))))
+def _(state):
+    trajectories, areas = state
+    geom_helper.classify_area_proximity(trajectories, areas, verbose=False)
+
+
+@case('quadrat_cut_geometry', 'polygons')(lambda n: polygons_gdf(n).geometry)
+def _(geometry):
+    geom_helper.quadrat_cut_geometry(geometry, quadrat_width=(PIRAEUS_BBOX[2] - PIRAEUS_BBOX[0]) / 10)
+
+
+def filter_roundtrip_setup(n):
+    # A (headless) Canvas whose numerical filter is moved back and forth, i.e., filtering, ``prepare_data`` and the CDS update
+    vsn = loaded_instance(points_gdf(n))
+    vsn.create_canvas('Benchmark')
+    vsn.add_glyph()
+    vsn.add_numerical_filter(filter_mode='>=', numeric_name='speed', step=1)
+    return vsn.widgets[-1], [5.0, 10.0]
+
+
+@case('filter_roundtrip', 'points')(filter_roundtrip_setup)
+def _(state):
+    widget, values = state
+    values.reverse()
+    widget.trigger('value_throttled', None, values[0])
+
+
+# Runner
+# ------
+def parse_size(size):
+    size = size.strip().lower()
+    multiplier = {'k': 10**3, 'm': 10**6}.get(size[-1], 1)
+    return int(float(size.rstrip('km')) * multiplier)
+
+
+def measure(bench, n, repeat):
+    state = bench.setup(n)
+    bench.run(state)    # i.e., a warm-up run
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        bench.run(state)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        bench.run(state)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'min_s': min(times), 'median_s': float(np.median(times)), 'peak_mb': peak / 2**20}
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare the results against a baseline; returns the regressions (i.e., ``(key, metric, ratio)``).
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        for metric in ('min_s', 'peak_mb'):
+            # Negligible values (i.e., timer/allocator noise) are not compared
+            if baseline[key][metric] < {'min_s': 1e-3, 'peak_mb': 1.0}[metric]:
+                continue
+            ratio = result[metric] / baseline[key][metric]
+            if ratio > threshold:
+                regressions.append((key, metric, ratio))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmarks of the VISIONS Data Preparation')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Comma-separated dataset sizes (e.g., 10k,100k,1M)')
+    parser.add_argument('--cases', default=None, help='Comma-separated (substrings of) case names (default: every case)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='Store the results as the (new) baseline')
+    parser.add_argument('--threshold', type=float, default=1.25, help='The (time or memory) ratio to the baseline that is reported as a regression')
+    parser.add_argument('--json', default=None, help='Write the results to a JSON file')
+    args = parser.parse_args()
+
+    selected = [bench for bench in CASES if args.cases is None or any(name in bench.name for name in args.cases.split(','))]
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+    results = {}
+    print(f'{"case":<56} {"n":>9} {"min (ms)":>10} {"median (ms)":>12} {"peak (MB)":>10} {"vs. baseline":>13}')
+    for n in map(parse_size, args.sizes.split(',')):
+        for bench in selected:
+            key = f'{bench.name}@{n}'
+            results[key] = result = measure(bench, n, args.repeat)
+
+            ratio = f'{result["min_s"] / baseline[key]["min_s"]:.2f}x' if key in baseline else '-'
+            print(f'{bench.name:<56} {n:>9} {result["min_s"] * 1e3:>10.1f} {result["median_s"] * 1e3:>12.1f} {result["peak_mb"]:>10.1f} {ratio:>13}', flush=True)
+
+    report = {'machine': platform.platform(), 'python': platform.python_version(), 'results': results}
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({**report, 'results': {**baseline, **results}}, f, indent=2)
+        print(f'Baseline stored at {args.baseline}')
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    for key, metric, ratio in regressions:
+        print(f'REGRESSION: {key} ({metric}) is {ratio:.2f}x its baseline')
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -21,17 +21,30 @@ from bokeh.driving import linear
 import sys, os
 sys.path.append(os.path.join('.', 'st_visions'))
 
-from st_visualizer import st_visualizer
-import express as viz_express
-import geom_helper as viz_helper 
+from st_visualizer import st_visualizer, MERCATOR_TO_LON_JS, MERCATOR_TO_LAT_JS
+from trace_helper import TRACER
+from template_helper import get_template
 
-from vessel_positions_json import load_from_cache, data_thread, get_utc_timestamp, APP_ROOT
+from vessel_trails import VesselTrails
+from vessel_list import VesselList
+from vessel_pacing import FlushPacer, UpdateBuffer
+from vessel_dead_reckoning import DeadReckoning
+from vessel_report_filter import ReportFilter
+from vessel_metrics import SESSIONS, SessionStats, PURGE_SECONDS
+from vessel_positions_json import load_from_cache, data_thread, apply_updates, get_utc_timestamp, archive_records_to_columns, recode_vessels, APP_ROOT, ARCHIVE, METADATA, settings, get_shared_table, sync_from_table
+from vessel_metadata import MetadataFactors
 
 
 def main():
 
     moving_vessel_ttl = 720_000
     stationary_vessel_ttl = 1_800_000
+    playback_step_ms = 60_000
+    trail_length = 20 # Number of recent positions per vessel trail (0 disables the trails layer)
+    dead_reckoning_threshold = 50 # Tolerated error (in meters) of the browser-side interpolation of moving vessels (0 disables the interpolation mode)
+    table_sync_ms = 500 # Multi-process deployment: the (minimum) interval of syncing with the shared vessel table (consult serve.py)
+    flush_interval_ms = (100, 5000) # The range of the (adaptive, i.e., following the client's round trip) interval of flushing a session's updates
+    table_page_size = 50 # Rows per page of the (server-side sorted) vessel list (0 feeds the DataTable with every vessel, i.e., sorted browser-side)
     # Get Current Timestamp
     utc_time = get_utc_timestamp()
     sp_columns_xy = { 'x': 'lon', 'y': 'lat' }
@@ -48,7 +61,6 @@ def main():
     limit=10000
 
     datetime_strfmt = '%Y-%m-%d %H:%M:%S'
-    numeric_strfmt = "0.000"
 
     tooltips = [('Vessel MMSI','@mmsi'), ('Vessel Name','@vessel_name'), ('Vessel Type','@vessel_type'), ('Timestamp','@ts{%Y-%m-%d %H:%M:%S}'), 
                 ('Location (lon., lat.)','(@lon{0.00}, @lat{0.00})'), ('Heading (deg.)', '@heading'), ('Vessel is Moving', '@moving')]
@@ -59,6 +71,7 @@ def main():
         st_viz.figure.title.text = title.format(datetime.strftime(utc_time, datetime_strfmt))
 
     def purge_expired():
+        purge_start = time.perf_counter()
         with mmsi_index_lock:
             data = st_viz.source.data
             now_ms = int(time.time_ns() // 1_000_000)
@@ -75,6 +88,14 @@ def main():
                     for col, vals in data.items()
                 }
                 st_viz.source.data = new_data
+                if trails is not None:
+                    trails.compact(keep)
+                if dead_reckoning is not None:
+                    dead_reckoning.compact(keep)
+                if report_filter is not None:
+                    report_filter.compact(keep)
+                if vessel_list is not None:
+                    vessel_list.compact(keep)
 
                 mmsi_index.clear()
                 for idx, m in enumerate(st_viz.source.data['mmsi']):
@@ -86,107 +107,251 @@ def main():
                         new_idx = sum(keep[:old_idx + 1]) - 1
                         tracked_new.append(new_idx)
                 st_viz.source.selected.indices = tracked_new
-        
+        PURGE_SECONDS.observe(time.perf_counter() - purge_start)
 
     def on_session_kill(session_context):
         thread_stop_event.set()
+        SESSIONS.pop(session_context.id, None)
+
+    def sync_table():
+        nonlocal table_version
+        table_version = sync_from_table(table, table_version, source=st_viz.source, record_index=mmsi_index, index_lock=mmsi_index_lock, sp_cols=sp_columns_xy, mercator_suffix=mercator_column_suffix, trails=trails, dead_reckoning=dead_reckoning, factors=metadata_factors, vessel_list=vessel_list)
+
+    def flush_updates(limit):
+        apply_updates(update_buffer.drain(limit), source=st_viz.source, record_index=mmsi_index, index_lock=mmsi_index_lock, sp_cols=sp_columns_xy, mercator_suffix=mercator_column_suffix, trails=trails, dead_reckoning=dead_reckoning, factors=metadata_factors, report_filter=report_filter, stats=session_stats, vessel_list=vessel_list)
+
+    def update_playback():
+        start_ms, end_ms = (int(v) for v in playback_slider.value)
+        records = ARCHIVE.state_at(end_ms, moving_ttl=moving_vessel_ttl, stationary_ttl=stationary_vessel_ttl, start_ms=start_ms)
+
+        metadata_factors.sync()
+        st_viz.source.data = archive_records_to_columns(records, sp_cols=sp_columns_xy, mercator_suffix=mercator_column_suffix)
+        if vessel_list is not None:
+            vessel_list.rebuild()
+        st_viz.figure.title.text = title.format(datetime.strftime(datetime.fromtimestamp(end_ms / 1000, timezone.utc), datetime_strfmt))
+
+    def advance_playback():
+        start_ms, end_ms = (int(v) for v in playback_slider.value)
+        if end_ms >= playback_slider.end:
+            playback_toggle.active = False
+            return
+
+        step = min(playback_step_ms, playback_slider.end - end_ms)
+        playback_slider.value = (start_ms + step, end_ms + step)
+        update_playback()
+
+    def toggle_playback(attr, old, new):
+        if new:
+            playback_callbacks.append(doc.add_periodic_callback(TRACER.wrap('advance_playback', advance_playback), 1000))
+        elif playback_callbacks:
+            doc.remove_periodic_callback(playback_callbacks.pop())
 
     # Create ST_Visions Instance
     st_viz = st_visualizer(limit=limit)
-
-    st_viz.set_source(source=bokeh_models.ColumnDataSource(data={'mmsi':[], 'ts':[], f'{sp_columns_xy["x"]}':[], f'{sp_columns_xy["y"]}':[], 'moving':[], 'heading':[], 'vessel_name':[], 'vessel_type':[], 'TRCMP':[], 'DSCMP':[], f'{sp_columns_xy["x"]}{mercator_column_suffix}':[], f'{sp_columns_xy["y"]}{mercator_column_suffix}':[]}))
     st_viz.sp_columns = [sp_columns_xy["x"],sp_columns_xy["y"]]
+
+    metadata_factors = MetadataFactors(METADATA)
     mmsi_index = {}
-    ais_type_code_mappings = {}
+    ais_type_code_mappings = METADATA.code_mappings
     mmsi_index_lock  = threading.Lock()
     thread_stop_event = threading.Event()
 
-    load_from_cache(source=st_viz.source, record_index=mmsi_index, index_lock=mmsi_index_lock, code_mappings=ais_type_code_mappings,sp_cols=sp_columns_xy, mercator_suffix=mercator_column_suffix)
-
-    # Create Canvas
-    basic_tools = "tap,pan,wheel_zoom,save,reset" 
-    st_viz.create_canvas(using_dataframes=False, suffix=mercator_column_suffix, x_range=x_range, y_range=y_range, title=title.format(pd.to_datetime(utc_time).strftime(datetime_strfmt)), sizing_mode=sizing_mode, plot_width=plot_width, plot_height=plot_height, height_policy='max', tools=basic_tools, output_backend='webgl')
-
-    # Add Tooltips & Map Layer
-    st_viz.add_hover_tooltips(tooltips=tooltips, formatters={'@ts': 'datetime'}, mode="mouse", muted_policy='ignore')
-    st_viz.add_map_tile('CARTODBPOSITRON')
+    # Playback Mode (i.e., ``?mode=playback``) replays the positions' archive instead of the live stream
+    doc = bokeh_io.curdoc()
+    playback = ARCHIVE is not None and doc.session_context.request.arguments.get('mode', [b''])[0] == b'playback'
+
+    trails = VesselTrails(length=trail_length, sp_cols=sp_columns_xy, mercator_suffix=mercator_column_suffix) if trail_length > 0 and not playback else None
+    dead_reckoning = DeadReckoning(threshold_m=dead_reckoning_threshold) if dead_reckoning_threshold > 0 and not playback else None
+
+    # Multi-process Deployment: the vessels are synced from the shared table (written by the ingest process) instead of Redis and Kafka
+    table = get_shared_table() if not playback else None
+    table_version = 0
+
+    # Stale and duplicate reports are dropped at the ingest stage, i.e., either by the shared table or per session
+    report_filter = ReportFilter() if table is None and not playback else None
+
+    # Live sessions are updated at their client's pace, i.e., the Kafka thread buffers the (coalesced) updates that each flush applies
+    pacer = FlushPacer(min_interval_ms=flush_interval_ms[0] if table is None else table_sync_ms, max_interval_ms=flush_interval_ms[1]) if not playback else None
+    update_buffer = UpdateBuffer() if table is None and not playback else None
+
+    # The DataTable lists a (server-side sorted) page of the vessels, instead of the whole live source
+    table_columns = ['mmsi', 'ts', f'{sp_columns_xy["x"]}{mercator_column_suffix}', f'{sp_columns_xy["y"]}{mercator_column_suffix}', 'heading', 'moving', 'vessel_name_id', 'vessel_type_id']
+    vessel_list = VesselList(source=None, names=METADATA.names, columns=table_columns, page_size=table_page_size) if table_page_size > 0 else None
+
+    # The page's model graph, i.e., everything but the session's data and (Python) callbacks
+    def build_layout():
+        st_viz.set_source(source=bokeh_models.ColumnDataSource(data={'mmsi':[], 'ts':[], 'moving':[], 'heading':[], 'speed':[], 'vessel_name_id':[], 'vessel_type_id':[], f'{sp_columns_xy["x"]}{mercator_column_suffix}':[], f'{sp_columns_xy["y"]}{mercator_column_suffix}':[]}))
+
+        # Columns derived (browser-side) from the primitive ones, i.e., they are not sent over the wire with each update
+        st_viz.add_encoded_column('vessel_name', 'vessel_name_id', metadata_factors.names)
+        st_viz.add_encoded_column('vessel_type', 'vessel_type_id', metadata_factors.types)
+        st_viz.add_derived_column('TRCMP', 'heading', '-x')
+        st_viz.add_derived_column('DSCMP', 'heading', '270 - x')
+        st_viz.add_derived_column(sp_columns_xy["x"], f'{sp_columns_xy["x"]}{mercator_column_suffix}', MERCATOR_TO_LON_JS)
+        st_viz.add_derived_column(sp_columns_xy["y"], f'{sp_columns_xy["y"]}{mercator_column_suffix}', MERCATOR_TO_LAT_JS)
+        if vessel_list is not None:
+            vessel_list.map_source = st_viz.source
+
+        # Create Canvas
+        basic_tools = "tap,pan,wheel_zoom,save,reset" 
+        st_viz.create_canvas(using_dataframes=False, suffix=mercator_column_suffix, x_range=x_range, y_range=y_range, title=title.format(pd.to_datetime(utc_time).strftime(datetime_strfmt)), sizing_mode=sizing_mode, plot_width=plot_width, plot_height=plot_height, height_policy='max', tools=basic_tools, output_backend='webgl')
+
+        # Interpolation Mode: moving vessels are advanced (browser-side) between the reports that are sent
+        if dead_reckoning is not None:
+            st_viz.set_interpolation(temporal_name='ts', speed_name='speed', course_name='heading', horizon_ms=dead_reckoning.horizon_ms)
+
+        # Add Tooltips & Map Layer
+        st_viz.add_hover_tooltips(tooltips=tooltips, formatters={'@ts': 'datetime'}, mode="mouse", muted_policy='ignore')
+        st_viz.add_map_tile('CARTODBPOSITRON', tile_server=settings.get('tile_server_url'))
     
-    # Define Date and Time Formatters 
-    datefmt = bokeh.models.DateFormatter(format=datetime_strfmt)
-    hfmt = bokeh.models.NumberFormatter(format=numeric_strfmt)
-
-
-
-    # Add a tabular view for the data
-    columns = [
-        bokeh_models.TableColumn(field="mmsi", title="MMSI", default_sort='ascending', width=110),
-        bokeh_models.TableColumn(field="ts", title="Timestamp", default_sort='descending', formatter=datefmt, width=140),
-        bokeh_models.TableColumn(field="lon", title="Longitude", sortable=False, formatter=hfmt, width=90),
-        bokeh_models.TableColumn(field="lat", title="Latitude", sortable=False, formatter=hfmt, width=90),
-        bokeh_models.TableColumn(field="heading", title="Heading", sortable=False, width=90),
-        bokeh_models.TableColumn(field="moving", title="Moving", width=90),
-        bokeh_models.TableColumn(field="vessel_name", title="Vessel Name", width=130),
-        bokeh_models.TableColumn(field="vessel_type", title="Vessel Type", width=130),   
-    ]
-    data_table = bokeh_models.DataTable(source=st_viz.source, columns=columns, height_policy='max', width_policy='max', height=plot_height, width=plot_width, css_classes=['selected'], autosize_mode='none')
+        # Define Date and Time Formatters 
+        datefmt = bokeh.models.DateFormatter(format=datetime_strfmt)
+
+
+
+        # Add a tabular view for the data (sorted server-side, if paginated)
+        sortable = vessel_list is None
+        columns = [
+            bokeh_models.TableColumn(field="mmsi", title="MMSI", default_sort='ascending', sortable=sortable, width=110),
+            bokeh_models.TableColumn(field="ts", title="Timestamp", default_sort='descending', sortable=sortable, formatter=datefmt, width=140),
+            bokeh_models.TableColumn(field=f'{sp_columns_xy["x"]}{mercator_column_suffix}', title="Longitude", sortable=False, formatter=st_viz.get_derived_formatter(sp_columns_xy["x"]), width=90),
+            bokeh_models.TableColumn(field=f'{sp_columns_xy["y"]}{mercator_column_suffix}', title="Latitude", sortable=False, formatter=st_viz.get_derived_formatter(sp_columns_xy["y"]), width=90),
+            bokeh_models.TableColumn(field="heading", title="Heading", sortable=False, width=90),
+            bokeh_models.TableColumn(field="moving", title="Moving", sortable=sortable, width=90),
+            bokeh_models.TableColumn(field="vessel_name_id", title="Vessel Name", sortable=False, formatter=st_viz.get_derived_formatter('vessel_name'), width=130),
+            bokeh_models.TableColumn(field="vessel_type_id", title="Vessel Type", sortable=False, formatter=st_viz.get_derived_formatter('vessel_type'), width=130),   
+        ]
+        data_table = bokeh_models.DataTable(source=st_viz.source if vessel_list is None else vessel_list.source, columns=columns, height_policy='max', width_policy='max', height=plot_height, width=plot_width, css_classes=['selected'], autosize_mode='none')
     
-    # Add Application (inc. DataTable) CSS 
-    header = bokeh_models.Div(text=f"<link rel='stylesheet' type='text/css' href='{os.path.basename(APP_ROOT)}/static/css/styles.css'>")
-    data_table = bokeh_layouts.column(header, data_table)
+        # Add Application (inc. DataTable) CSS 
+        header = bokeh_models.Div(text=f"<link rel='stylesheet' type='text/css' href='{os.path.basename(APP_ROOT)}/static/css/styles.css'>")
+        hidden = [header] + ([pacer.pinger] if pacer is not None else [])
+        if vessel_list is None:
+            data_table = bokeh_layouts.column(*hidden, data_table)
+        else:
+            list_controls = bokeh_layouts.row(vessel_list.sort_select, vessel_list.order_buttons, vessel_list.previous_button, vessel_list.page_label, vessel_list.next_button)
+            data_table = bokeh_layouts.column(*hidden, list_controls, data_table)
 
 
 
-    # Add (Different) Glyphs for Moving and Statinonary Vessels
-    ves_moving = bokeh_models.CDSView(source=st_viz.source, filters=[bokeh_models.GroupFilter(column_name='moving', group='Y')])
-    ves_stat = bokeh_models.CDSView(source=st_viz.source, filters=[bokeh_models.GroupFilter(column_name='moving', group='N')])
+        # Add Vessel Trails (drawn below the vessels' glyphs)
+        if trails is not None:
+            _ = st_viz.add_line(line_type='multi_line', source=trails.source, line_color='steelblue', line_width=2, alpha=0.5, muted_alpha=0, legend_label='Trails')
 
-    ## Green Arrow for Moving Vessels
-    _ = st_viz.add_glyph(glyph_type='triangle', size=13, angle='TRCMP', angle_units='deg', color='forestgreen', alpha=1, nonselection_alpha=0, fill_alpha=0.5, muted_alpha=0, legend_label='Moving', view=ves_moving)
-    _ = st_viz.add_glyph(glyph_type='dash', size=13, angle='DSCMP', angle_units='deg', color='forestgreen', alpha=1, nonselection_alpha=0, line_width=3, line_cap='round', muted_alpha=0, legend_label='Moving', view=ves_moving)
-    
-    ## Red Circle for Stationary Vessels
-    _ = st_viz.add_glyph(glyph_type='circle', size=7, color='orangered', alpha=1, nonselection_alpha=0, fill_alpha=0.5, muted_alpha=0, legend_label='Stationary', view=ves_stat)
-
-
-    # Remove grid lines from Figure
-    st_viz.figure.xgrid.grid_line_color = None
-    st_viz.figure.ygrid.grid_line_color = None
-
-    # Customize Plot Legend
-    st_viz.figure.legend.title = 'Movement Status'
-    st_viz.figure.legend.title_text_font = 'Arial'
-    st_viz.figure.legend.title_text_font_style = 'bold'
-    st_viz.figure.legend.location = "top_left"
-    st_viz.figure.legend.click_policy = "mute"
-
-    # Customize Plot Toolbar
-    st_viz.figure.match_aspect = True
-    st_viz.figure.add_tools(bokeh_models.LassoSelectTool(select_every_mousemove=False))
-    st_viz.figure.add_tools(bokeh_models.BoxSelectTool(select_every_mousemove=False))
-    st_viz.figure.add_tools(bokeh_models.BoxZoomTool(match_aspect=True))
-
-    # Set Active Toolkits
-    st_viz.figure.toolbar.active_scroll = st_viz.figure.select_one(bokeh_models.WheelZoomTool)
-    st_viz.figure.toolbar.active_tap = st_viz.figure.select_one(bokeh_models.TapTool)
+        # Add (Different) Glyphs for Moving and Statinonary Vessels
+        ves_moving = bokeh_models.CDSView(source=st_viz.source, filters=[bokeh_models.GroupFilter(column_name='moving', group='Y')])
+        ves_stat = bokeh_models.CDSView(source=st_viz.source, filters=[bokeh_models.GroupFilter(column_name='moving', group='N')])
+
+        ## Green Arrow for Moving Vessels
+        _ = st_viz.add_glyph(glyph_type='triangle', size=13, angle='TRCMP', angle_units='deg', color='forestgreen', alpha=1, nonselection_alpha=0, fill_alpha=0.5, muted_alpha=0, legend_label='Moving', view=ves_moving)
+        _ = st_viz.add_glyph(glyph_type='dash', size=13, angle='DSCMP', angle_units='deg', color='forestgreen', alpha=1, nonselection_alpha=0, line_width=3, line_cap='round', muted_alpha=0, legend_label='Moving', view=ves_moving)
     
-    # Create Page Application
-    doc = bokeh_io.curdoc()
-    doc.title = 'Univ. Piraeus AIS Stream Visualization'
+        ## Red Circle for Stationary Vessels
+        _ = st_viz.add_glyph(glyph_type='circle', size=7, color='orangered', alpha=1, nonselection_alpha=0, fill_alpha=0.5, muted_alpha=0, legend_label='Stationary', view=ves_stat)
+
+
+        # Remove grid lines from Figure
+        st_viz.figure.xgrid.grid_line_color = None
+        st_viz.figure.ygrid.grid_line_color = None
+
+        # Customize Plot Legend
+        st_viz.figure.legend.title = 'Movement Status'
+        st_viz.figure.legend.title_text_font = 'Arial'
+        st_viz.figure.legend.title_text_font_style = 'bold'
+        st_viz.figure.legend.location = "top_left"
+        st_viz.figure.legend.click_policy = "mute"
+
+        # Customize Plot Toolbar
+        st_viz.figure.match_aspect = True
+        st_viz.figure.add_tools(bokeh_models.LassoSelectTool(select_every_mousemove=False))
+        st_viz.figure.add_tools(bokeh_models.BoxSelectTool(select_every_mousemove=False))
+        st_viz.figure.add_tools(bokeh_models.BoxZoomTool(match_aspect=True))
 
-    # Add DataStories Logo 
-    logo_height = 27
-    url = os.path.join(os.path.basename(APP_ROOT), 'static', 'logo.png')
-    app_logo = bokeh_models.Div(text=f'''<a href="http://www.datastories.org/" target="_blank"> <img src={url} height={logo_height}> </a>''', height_policy='min', height=logo_height, margin=(-5, 0, -5, 0))    # Margin-Top, Margin-Right, Margin-Bottom and Margin-Left, similar to CSS standards.
+        # Set Active Toolkits
+        st_viz.figure.toolbar.active_scroll = st_viz.figure.select_one(bokeh_models.WheelZoomTool)
+        st_viz.figure.toolbar.active_tap = st_viz.figure.select_one(bokeh_models.TapTool)
 
+        # Add DataStories Logo 
+        logo_height = 27
+        url = os.path.join(os.path.basename(APP_ROOT), 'static', 'logo.png')
+        app_logo = bokeh_models.Div(text=f'''<a href="http://www.datastories.org/" target="_blank"> <img src={url} height={logo_height}> </a>''', height_policy='min', height=logo_height, margin=(-5, 0, -5, 0))    # Margin-Top, Margin-Right, Margin-Bottom and Margin-Left, similar to CSS standards.
 
+        return app_logo, data_table
+
+    # Create Page Application
+    doc.title = 'Univ. Piraeus AIS Stream Visualization'
+
+    if playback:
+        app_logo, data_table = build_layout()
+
+        # Add Playback Controls, spanning the Archive's Temporal Extent
+        archive_start, archive_end = ARCHIVE.extent() or (int(utc_time.timestamp() * 1000),) * 2
+        playback_slider = bokeh_models.DateRangeSlider(start=archive_start, end=archive_end, value=(max(archive_start, archive_end - stationary_vessel_ttl), archive_end), step=playback_step_ms, format=datetime_strfmt, title='Playback Horizon (UTC)', sizing_mode='stretch_width')
+        playback_slider.on_change('value_throttled', lambda attr, old, new: update_playback())
+        playback_toggle = bokeh_models.Toggle(label='Play', button_type='success', width=90)
+        playback_toggle.on_change('active', toggle_playback)
+        playback_callbacks = []
+        if vessel_list is not None:
+            vessel_list.attach()
+
+        update_playback()
+        st_viz.show_figures([[app_logo], [bokeh_layouts.row(playback_toggle, playback_slider, sizing_mode='stretch_width')], [st_viz.figure, data_table]], notebook=False, toolbar_options=dict(logo=None), sizing_mode=sizing_mode, doc=doc, toolbar_location='right')
+        return
+
+    # Live sessions are created from a (process-wide) template of the page, i.e., the first one builds (and captures) it
+    template = get_template('live')
+    if template.ready:
+        models = template.instantiate(doc)
+        st_viz.set_template_models(models, suffix=mercator_column_suffix)
+        metadata_factors.names, metadata_factors.types = models['vessel_names'], models['vessel_types']
+        if trails is not None:
+            trails.source = models['trails']
+        if vessel_list is not None:
+            vessel_list.set_models(models, source=st_viz.source)
+        pacer.set_models(models)
+        update_page_time()
+    else:
+        app_logo, data_table = build_layout()
+        st_viz.show_figures([[app_logo], [st_viz.figure, data_table]], notebook=False, toolbar_options=dict(logo=None), sizing_mode=sizing_mode, doc=doc, toolbar_location='right')
+        template.capture(doc, **st_viz.get_template_models(), vessel_names=metadata_factors.names, vessel_types=metadata_factors.types, trails=trails.source if trails is not None else None, **(vessel_list.get_models() if vessel_list is not None else {}), **pacer.get_models())
+
+    # Load the (initial) vessels, i.e., from the shared table or the process-wide snapshot of the Redis cache
+    if table is not None:
+        sync_table()
+    else:
+        load_from_cache(source=st_viz.source, record_index=mmsi_index, index_lock=mmsi_index_lock, code_mappings=ais_type_code_mappings,sp_cols=sp_columns_xy, mercator_suffix=mercator_column_suffix, trails=trails, dead_reckoning=dead_reckoning, factors=metadata_factors, report_filter=report_filter)
+    while table is None and metadata_factors.sync():
+        recode_vessels(st_viz.source, mmsi_index_lock)
+    if trails is not None:
+        trails.flush()
+    if dead_reckoning is not None:
+        st_viz.sync_interpolation()
+    if vessel_list is not None:
+        vessel_list.attach()
+        vessel_list.rebuild()
 
     # Render Canvas and Instantiate Recurrent Function
-    st_viz.show_figures([[app_logo], [st_viz.figure, data_table]], notebook=False, toolbar_options=dict(logo=None), sizing_mode=sizing_mode, doc=doc, toolbar_location='right')
-    doc.add_periodic_callback(update_page_time, 1000) #period in ms
-    doc.add_periodic_callback(purge_expired, 10000)
+    doc.add_periodic_callback(TRACER.wrap('update_page_time', update_page_time), 1000) #period in ms
+    doc.add_periodic_callback(TRACER.wrap('purge_expired', purge_expired), 10000)
+    if trails is not None:
+        doc.add_periodic_callback(TRACER.wrap('trails_flush', trails.flush), 1000)
+    if vessel_list is not None:
+        doc.add_periodic_callback(TRACER.wrap('vessel_list_flush', vessel_list.flush), 1000)
+    if dead_reckoning is not None:
+        doc.add_periodic_callback(TRACER.wrap('sync_interpolation', st_viz.sync_interpolation), 10000)
     doc.on_session_destroyed(on_session_kill)
 
-    threading.Thread(target=data_thread, kwargs={'thread_stop': thread_stop_event, 'source': st_viz.source, 'record_index': mmsi_index, 'index_lock': mmsi_index_lock, 'code_mappings': ais_type_code_mappings, 'doc': doc, 'sp_cols': sp_columns_xy, 'mercator_suffix': mercator_column_suffix}, daemon=True).start()
+    # Instrumentation of the (live) session, e.g., its queue depth (consult vessel_metrics.py)
+    session_stats = SESSIONS[doc.session_context.id] = SessionStats(doc.session_context.id, st_viz.source)
+    session_stats.pacer = pacer
+    session_stats.buffer = update_buffer
+
+    if table is not None:
+        pacer.start(doc, TRACER.wrap('sync_table', lambda limit: sync_table()))
+        return
+
+    pacer.start(doc, TRACER.wrap('flush_updates', flush_updates))
+    threading.Thread(target=data_thread, kwargs={'thread_stop': thread_stop_event, 'record_index': mmsi_index, 'index_lock': mmsi_index_lock, 'code_mappings': ais_type_code_mappings, 'doc': doc, 'buffer': update_buffer, 'report_filter': report_filter, 'stats': session_stats}, daemon=True).start()
 
 
 main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+"""Multi-Process Launcher for the AIS Stream Visualization
+   Starts a single ingest process, which consumes (and archives) the AIS stream into a shared-memory vessel table, and forks
+   ``--num-procs`` Bokeh worker processes, whose sessions sync with the table (i.e., no worker runs its own Kafka consumer or Redis scan).
+   The launcher supervises both: the ingest process is restarted if it exits (at most ``ingest_max_restarts`` times in a row, i.e.,
+   unless it ran for at least ``ingest_restart_window`` seconds), whereas the workers are forked (and restarted) by a separate web
+   process, so that they neither inherit nor terminate the ingest process; the launcher exits if either cannot be kept running.
+   If ``tile_cache_dir`` is set at server.ini, the (caching) tile server is mounted at ``<prefix>/tiles`` of every worker (each one within
+   its share of ``tile_cache_max_mb``, i.e., the directory remains bounded by it; consult tile_cache.py); the (Prometheus)
+   metrics are mounted at ``<prefix>/metrics``; if ``tracing = yes``, every worker serves the tracing and profiling endpoints at
+   ``127.0.0.1:<debug_port + worker id>/debug`` (i.e., not at the public port).
+
+   Usage: python serve.py --num-procs 4 --port 5006 --prefix /unipi-ais --allow-websocket-origin <LOCAL_IP_ADDRESS_HERE>:5006
+"""
+
+
+import os
+import sys
+import time
+import signal
+import argparse
+import multiprocessing
+from multiprocessing.connection import wait
+
+from bokeh.command.util import build_single_handler_application
+from bokeh.server.server import Server
+from tornado.ioloop import IOLoop
+from tornado.process import task_id
+
+from vessel_positions_json import settings, ingest_process, APP_ROOT, PREFORK_ENV, TABLE_PATH
+from vessel_table import VesselTable, TABLE_DEFAULT_CAPACITY
+from tile_cache import TileCache, tile_cache_patterns, parse_bbox, parse_zooms, TILE_CACHE_MAX_BYTES
+from vessel_metrics import METRICS, metrics_patterns
+from vessel_tracing import enable_tracing, start_debug_server, DEBUG_DEFAULT_PORT
+
+
+def serve_workers(args):
+    # The web process: forks (and restarts) the Bokeh workers, within a process group of their own (i.e., they are terminated along with it)
+    os.setpgrp()
+    os.environ[PREFORK_ENV] = '1'
+    application = build_single_handler_application(APP_ROOT)
+
+    # Every worker serves its own (render) metrics along with the ingest process' ones at ``<prefix>/metrics``
+    extra_patterns, cache = metrics_patterns(registries=[METRICS], extra_paths=[f'{TABLE_PATH}.metrics']), None
+    tracing = settings.getboolean('tracing', False)
+    if tracing:
+        enable_tracing()
+    if settings.get('tile_cache_dir'):
+        # Built (i.e., the directory is scanned) once, before the workers are forked; each worker evicts within its own share of the budget
+        max_bytes = settings.getint('tile_cache_max_mb', TILE_CACHE_MAX_BYTES // 2**20) * 2**20
+        cache = TileCache(settings['tile_cache_dir'], max_bytes=max_bytes // max(args.num_procs or os.cpu_count(), 1))
+        extra_patterns.extend(tile_cache_patterns(cache))
+
+    server = Server(
+        {f'/{os.path.basename(APP_ROOT)}': application}, port=args.port, address=args.address, num_procs=args.num_procs, prefix=args.prefix,
+        allow_websocket_origin=args.allow_websocket_origin or None, use_xheaders=args.use_xheaders, extra_patterns=extra_patterns
+    )
+    server.start()
+    METRICS.labels['worker'] = str(task_id() or 0)    # i.e., once forked
+    if tracing:
+        start_debug_server(settings.getint('debug_port', DEBUG_DEFAULT_PORT) + (task_id() or 0))
+
+    # Prefetch the map tiles once (i.e., on the first worker)
+    if cache is not None and settings.get('tile_prefetch_bbox') and task_id() in (None, 0):
+        IOLoop.current().spawn_callback(cache.prefetch, settings.get('tile_prefetch_provider', 'CARTODBPOSITRON_RETINA'), parse_bbox(settings['tile_prefetch_bbox']), parse_zooms(settings.get('tile_prefetch_zooms', '8-14')))
+
+    print(f'Worker {task_id()} serving at :{args.port}{args.prefix}/{os.path.basename(APP_ROOT)}')
+    server.io_loop.start()
+
+
+def start_ingest():
+    # The ingest process is the (single) writer of the shared table
+    ingest = multiprocessing.Process(target=ingest_process, kwargs={'table_path': TABLE_PATH}, name='unipi-ais-ingest')
+    ingest.start()
+    return ingest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-Process Launcher for the AIS Stream Visualization')
+    parser.add_argument('--port', type=int, default=5006)
+    parser.add_argument('--address', default=None)
+    parser.add_argument('--num-procs', type=int, default=os.cpu_count(), help='The number of Bokeh worker processes (default: the number of CPUs)')
+    parser.add_argument('--prefix', default='')
+    parser.add_argument('--allow-websocket-origin', action='append', default=[])
+    parser.add_argument('--use-xheaders', action='store_true')
+    args = parser.parse_args()
+
+    max_restarts = settings.getint('ingest_max_restarts', 5)
+    restart_window = settings.getfloat('ingest_restart_window', 60.0)
+
+    VesselTable.create(TABLE_PATH, capacity=settings.getint('shared_table_capacity', TABLE_DEFAULT_CAPACITY))
+    ingest, started, n_restarts = start_ingest(), time.monotonic(), 0
+    web = multiprocessing.Process(target=serve_workers, args=(args,), name='unipi-ais-web')
+    web.start()
+
+    # i.e., the children are terminated along with the launcher (e.g., on ``docker stop``)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+    try:
+        while True:
+            wait([ingest.sentinel, web.sentinel])
+
+            if not web.is_alive():
+                sys.exit(f'Web process exited (exit code {web.exitcode}); exiting...')
+            if ingest.is_alive():
+                continue
+
+            n_restarts = 0 if time.monotonic() - started >= restart_window else n_restarts + 1
+            if n_restarts > max_restarts:
+                sys.exit(f'Ingest process exited (exit code {ingest.exitcode}) {n_restarts} times in a row; exiting...')
+
+            print(f'Ingest process exited (exit code {ingest.exitcode}); restarting...')
+            time.sleep(min(2 ** n_restarts, restart_window))
+            ingest, started = start_ingest(), time.monotonic()
+    finally:
+        if ingest.is_alive():
+            ingest.terminate()
+        try:
+            os.killpg(web.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        ingest.join()
+        web.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+"""Bokeh Server Lifecycle Hooks for the AIS Stream Visualization
+   Starts the process-wide services (i.e., the ones that are shared among sessions) once the server is loaded.
+"""
+
+
+from vessel_positions_json import start_archive_thread, settings, is_prefork_worker
+from tile_cache import TileCache, start_tile_server, parse_bbox, parse_zooms, TILE_CACHE_MAX_BYTES
+from vessel_metrics import start_metrics_server
+from vessel_tracing import enable_tracing, start_debug_server, DEBUG_DEFAULT_PORT
+
+
+def on_server_loaded(server_context):
+    # Multi-process Deployment: archiving, tile serving and metrics are handled by the launcher (consult serve.py)
+    if is_prefork_worker():
+        return
+
+    # Archive every kinematic report (if ``archive_dir`` is set at server.ini) for the playback mode
+    start_archive_thread()
+
+    # Serve (and cache) the map tiles locally (if ``tile_cache_dir`` is set at server.ini); point ``tile_server_url`` at it
+    if settings.get('tile_cache_dir'):
+        cache = TileCache(settings['tile_cache_dir'], max_bytes=settings.getint('tile_cache_max_mb', TILE_CACHE_MAX_BYTES // 2**20) * 2**20)
+        start_tile_server(
+            cache, settings.getint('tile_cache_port', 5007),
+            prefetch_provider=settings.get('tile_prefetch_provider', 'CARTODBPOSITRON_RETINA'),
+            prefetch_bbox=parse_bbox(settings['tile_prefetch_bbox']) if settings.get('tile_prefetch_bbox') else None,
+            prefetch_zooms=parse_zooms(settings.get('tile_prefetch_zooms', '8-14'))
+        )
+
+    # Serve the ingest and render metrics (Prometheus text format) if ``metrics_port`` is set at server.ini
+    if settings.get('metrics_port'):
+        start_metrics_server(settings.getint('metrics_port'))
+
+    # Serve the tracing and profiling endpoints (at ``127.0.0.1:<debug_port>`` only) if ``tracing = yes``
+    if settings.getboolean('tracing', False):
+        enable_tracing()
+        start_debug_server(settings.getint('debug_port', DEBUG_DEFAULT_PORT))
@@ -0,0 +1,241 @@
+"""Persistent (On-Disk) Cache of Prepared Datasets.
+
+   Prepared (i.e., projected) datasets are cached per source and projection. Each entry is a directory containing one ``.npy`` file per
+   column (memory-mappable, except for columns of arbitrary Python objects) along with a ``meta.json`` file that describes how to
+   reassemble the GeoDataFrame. Entries of files are invalidated once their source changes; sources that cannot be fingerprinted (e.g.,
+   SQL queries) are only cached if the caller invalidates them explicitly, i.e., via a version (part of the key) or a maximum age.
+"""
+
+
+import os
+import json
+import time
+import shutil
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+
+CACHE_FORMAT_VERSION = 1
+CACHE_META_FILENAME = 'meta.json'
+
+
+def get_source_fingerprint(source):
+    """
+    Fingerprint the state of a dataset's source. Files (or directories of files) are fingerprinted by their modification time and size,
+    while every other source (e.g., an SQL query) cannot be fingerprinted (None), i.e., its changes are not detected (consult ```load_dataset```).
+
+    Parameters
+    ----------
+    source: str
+        The path to the source file (or directory) or the query that fetched the dataset
+
+    Returns
+    -------
+    List
+    """
+    if not (isinstance(source, str) and os.path.exists(source)):
+        return None
+
+    if os.path.isdir(source):
+        stats = [os.stat(os.path.join(root, f)) for root, _, files in os.walk(source) for f in files]
+    else:
+        stats = [os.stat(source)]
+
+    return [max([s.st_mtime_ns for s in stats], default=0), sum(s.st_size for s in stats), len(stats)]
+
+
+def get_cache_key(source, proj, sp_columns, allow_complex_geometries, params=None):
+    """
+    Create the (deterministic) cache key of a prepared dataset.
+
+    Parameters
+    ----------
+    source: str
+        The path to the source file (or directory) or the query that fetched the dataset
+    proj: str
+        The CRS that the dataset was projected to
+    sp_columns: List
+        The (ordered) column names for the location of the spatial coordinates
+    allow_complex_geometries: boolean
+        Whether the polygons' inner voids were extracted along with their exterior
+    params: Dict (default: None)
+        Other parameters that affect the loaded dataset (e.g., the loader's predicates)
+
+    Returns
+    -------
+    str
+    """
+    key = json.dumps([CACHE_FORMAT_VERSION, os.path.abspath(source) if os.path.exists(source) else source, str(proj), list(sp_columns), bool(allow_complex_geometries), params], sort_keys=True, default=str)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _save_array(path, name, values):
+    """
+    Save a column as a ```.npy``` file and return its description. Numerical/temporal arrays and strings are saved as-is (i.e., they can be memory-mapped),
+    ragged sequences of numbers (e.g., the coordinates of LineStrings) are flattened to values and offsets, while anything else is pickled.
+    """
+    values = np.asarray(values) if not isinstance(values, np.ndarray) else values
+
+    if values.dtype.kind in 'biufcmM':
+        np.save(os.path.join(path, f'{name}.npy'), values)
+        return {'name': name, 'kind': 'array'}
+
+    if len(values) != 0 and all(isinstance(v, str) for v in values):
+        np.save(os.path.join(path, f'{name}.npy'), values.astype(str))
+        return {'name': name, 'kind': 'str'}
+
+    if len(values) != 0 and all(isinstance(v, np.ndarray) and v.ndim == 1 and v.dtype.kind in 'biuf' for v in values):
+        offsets = np.zeros(len(values) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(v) for v in values])
+        np.save(os.path.join(path, f'{name}.npy'), np.concatenate(values).astype(np.float64))
+        np.save(os.path.join(path, f'{name}.offsets.npy'), offsets)
+        return {'name': name, 'kind': 'ragged'}
+
+    np.save(os.path.join(path, f'{name}.npy'), np.array(list(values) + [None], dtype=object)[:-1], allow_pickle=True)
+    return {'name': name, 'kind': 'object'}
+
+
+def _load_array(path, desc, mmap_mode='r'):
+    """
+    Load a column saved via ```_save_array```.
+    """
+    filepath = os.path.join(path, f'{desc["name"]}.npy')
+
+    if desc['kind'] == 'array':
+        return np.load(filepath, mmap_mode=mmap_mode)
+    elif desc['kind'] == 'str':
+        return np.load(filepath, mmap_mode=mmap_mode).astype(object)
+    elif desc['kind'] == 'ragged':
+        values = np.load(filepath, mmap_mode=mmap_mode)
+        offsets = np.load(os.path.join(path, f'{desc["name"]}.offsets.npy'))
+        result = np.empty(len(offsets) - 1, dtype=object)
+        result[:] = [values[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+        return result
+    else:
+        return np.load(filepath, allow_pickle=True)
+
+
+def save_dataset(cache_dir, key, source, data, coords):
+    """
+    Save a prepared (projected) dataset to the cache. The entry is first written to a temporary directory, which then atomically replaces any previous entry.
+
+    Parameters
+    ----------
+    cache_dir: str
+        The cache's root directory
+    key: str
+        The dataset's cache key (consult ```get_cache_key```)
+    source: str
+        The path to the source file (or directory) or the query that fetched the dataset
+    data: GeoPandas GeoDataFrame
+        The prepared dataset
+    coords: List of Pandas Series
+        The extracted spatial coordinates of ```data```' geometries (one Series per dimension)
+    """
+    entry_path = os.path.join(cache_dir, key)
+    tmp_path = f'{entry_path}.tmp-{os.getpid()}'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    geom_name = data.geometry.name
+    meta = {
+        'version': CACHE_FORMAT_VERSION,
+        'source': source,
+        'fingerprint': get_source_fingerprint(source),
+        'created': time.time(),
+        'crs': data.crs.to_string() if data.crs is not None else None,
+        'geometry': geom_name,
+        'columns': [],
+        'coords': [],
+    }
+
+    meta['columns'] = [_save_array(tmp_path, f'col_{i}', data[col].values) for i, col in enumerate(data.columns) if col != geom_name]
+    for desc, col in zip(meta['columns'], [col for col in data.columns if col != geom_name]):
+        desc['label'] = col
+
+    meta['coords'] = [_save_array(tmp_path, f'coords_{dim}', coord.values) for dim, coord in enumerate(coords)]
+    meta['index'] = _save_array(tmp_path, 'index', data.index.values)
+    meta['index']['label'] = data.index.name
+
+    if len(data) != 0 and (data.geom_type == 'Point').all():
+        # Points are rebuilt from their (already extracted) coordinates
+        meta['geometry_kind'] = 'points'
+    else:
+        wkbs = [geom.wkb for geom in data.geometry.values]
+        offsets = np.zeros(len(wkbs) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(w) for w in wkbs])
+        np.save(os.path.join(tmp_path, 'geometry.npy'), np.frombuffer(b''.join(wkbs), dtype=np.uint8))
+        np.save(os.path.join(tmp_path, 'geometry.offsets.npy'), offsets)
+        meta['geometry_kind'] = 'wkb'
+
+    with open(os.path.join(tmp_path, CACHE_META_FILENAME), 'w') as f:
+        json.dump(meta, f, default=str)
+
+    shutil.rmtree(entry_path, ignore_errors=True)
+    os.replace(tmp_path, entry_path)
+
+
+def load_dataset(cache_dir, key, source, max_age=None):
+    """
+    Load a prepared (projected) dataset from the cache. Entries whose source has changed since they were saved (or that are older than
+    ```max_age```) are deleted.
+
+    Parameters
+    ----------
+    cache_dir: str
+        The cache's root directory
+    key: str
+        The dataset's cache key (consult ```get_cache_key```)
+    source: str
+        The path to the source file (or directory) or the query that fetched the dataset
+    max_age: float (default: None)
+        The maximum age (in seconds) of the entry, e.g., for sources whose changes are not detected (consult ```get_source_fingerprint```)
+
+    Returns
+    -------
+    Tuple (GeoPandas GeoDataFrame, List of Pandas Series) or None (if the entry does not exist, or is stale)
+    """
+    import geopandas as gpd
+    import shapely.wkb
+
+    entry_path = os.path.join(cache_dir, key)
+    meta_path = os.path.join(entry_path, CACHE_META_FILENAME)
+
+    if not os.path.exists(meta_path):
+        return None
+
+    with open(meta_path, 'r') as f:
+        meta = json.load(f)
+
+    expired = max_age is not None and time.time() - meta.get('created', 0) > max_age
+    if meta.get('version') != CACHE_FORMAT_VERSION or meta.get('fingerprint') != get_source_fingerprint(source) or expired:
+        shutil.rmtree(entry_path, ignore_errors=True)
+        return None
+
+    index = pd.Index(_load_array(entry_path, meta['index']), name=meta['index']['label'])
+    data = pd.DataFrame({desc['label']: _load_array(entry_path, desc) for desc in meta['columns']}, index=index)
+    coords = [pd.Series(_load_array(entry_path, desc), index=index) for desc in meta['coords']]
+
+    if meta['geometry_kind'] == 'points':
+        geometry = gpd.points_from_xy(coords[0].values, coords[1].values)
+    else:
+        values = np.load(os.path.join(entry_path, 'geometry.npy'), mmap_mode='r')
+        offsets = np.load(os.path.join(entry_path, 'geometry.offsets.npy'))
+        geometry = [shapely.wkb.loads(values[start:end].tobytes()) for start, end in zip(offsets[:-1], offsets[1:])]
+
+    data = gpd.GeoDataFrame(data.assign(**{meta['geometry']: geometry}), geometry=meta['geometry'], crs=meta['crs'])
+    return data, coords
+
+
+def clear_cache(cache_dir):
+    """
+    Delete every entry of the cache.
+
+    Parameters
+    ----------
+    cache_dir: str
+        The cache's root directory
+    """
+    shutil.rmtree(cache_dir, ignore_errors=True)
@@ -8,6 +8,8 @@
 import abc
 import bokeh.models as bokeh_mdl
 
+from trace_helper import TRACER
+
 
 class BokehFilters:
     __metaclass__ = abc.ABCMeta
@@ -30,10 +32,11 @@ class BokehFilters:
         if not self.vsn_instance.aquire_canvas_data:
             self.vsn_instance.aquire_canvas_data = self.widget.id
             
-            for widget in self.vsn_instance.widgets:
-                if not widget.id == self.widget.id:
-                    widget_callback_policy = list(widget._callbacks.keys())[0] 
-                    widget.trigger(widget_callback_policy, None, widget.value)
+            with TRACER.span('filter_data'):
+                for widget in self.vsn_instance.widgets:
+                    if not widget.id == self.widget.id:
+                        widget_callback_policy = list(widget._callbacks.keys())[0] 
+                        widget.trigger(widget_callback_policy, None, widget.value)
 
 
     def get_data(self):
@@ -58,13 +61,19 @@ class BokehFilters:
         self.vsn_instance.canvas_data = new_pts
 
         if ready_for_output:
-            self.vsn_instance.canvas_data = self.vsn_instance.prepare_data(self.vsn_instance.canvas_data)
+            # The rasterized layer (if any) represents every filtered point, i.e., prior to the instance's limit
+            with TRACER.span('refresh_raster'):
+                self.vsn_instance.refresh_raster(self.vsn_instance.canvas_data, loaded_subset=True)
+            with TRACER.span('prepare_data', rows=len(self.vsn_instance.canvas_data)):
+                self.vsn_instance.canvas_data = self.vsn_instance.prepare_data(self.vsn_instance.canvas_data, loaded_subset=True)
 
             if (self.vsn_instance.cmap is not None) and (isinstance(self.vsn_instance.cmap['transform'], bokeh_mdl.CategoricalColorMapper)):
                 factors = sorted(self.vsn_instance.canvas_data[self.vsn_instance.cmap['field']].unique().tolist())
                 self.vsn_instance.cmap['transform'].factors = factors
 
-            self.vsn_instance.source.data = self.vsn_instance.canvas_data.drop(self.vsn_instance.canvas_data.geometry.name, axis=1).to_dict(orient="list")
+            # Includes the serialization of the document patch (consult ```trace_helper.instrument_bokeh_server```)
+            with TRACER.span('update_source', rows=len(self.vsn_instance.canvas_data)):
+                self.vsn_instance.source.data = self.vsn_instance.canvas_data.drop(self.vsn_instance.canvas_data.geometry.name, axis=1).to_dict(orient="list")
 
             # print ('Releasing Lock...')
             self.vsn_instance.canvas_data = None
@@ -93,7 +93,7 @@ def plot_polygons_on_map(obj, tools=None, map_provider='CARTODBPOSITRON', polygo
 
 
 
-def plot_lines_on_map(obj, tools=None, map_provider='CARTODBPOSITRON', line_type='multi_line', line_color="royalblue", line_width=5, alpha=0.7, muted_alpha=0, legend_label='Moving Objects\' Trajectories', sizing_mode='scale_width', **kwargs):
+def plot_lines_on_map(obj, tools=None, map_provider='CARTODBPOSITRON', line_type='multi_line', line_color="royalblue", line_width=5, alpha=0.7, muted_alpha=0, legend_label='Moving Objects\' Trajectories', sizing_mode='scale_width', simplify=False, **kwargs):
     '''
         Visualize a (Multi)LineString Geometry Dataset on the map.
 
@@ -119,11 +119,16 @@ def plot_lines_on_map(obj, tools=None, map_provider='CARTODBPOSITRON', line_type
             The label that will represent the point geometries on the legend
         sizing_mode: str (default: scale_width)
             How the component should size itself. (allowed values: 'fixed', 'stretch_width', 'stretch_height', 'stretch_both', 'scale_width', 'scale_height', 'scale_both')
+        simplify: boolean (default: False)
+            Simplify the lines according to the Canvas' zoom level (consult ```st_visualizer.set_simplification```)
         **kwargs: dict
             Other parameters related to the Canvas creation
     '''
     basic_tools = "pan,box_zoom,wheel_zoom,save,reset" 
     extra_tools = f'{basic_tools},{",".join(tools)}' if tools is not None else basic_tools
+
+    if simplify:
+        obj.set_simplification()
         
     obj.create_canvas(title=f'Prototype Plot', sizing_mode=sizing_mode, plot_height=540, tools=extra_tools, **kwargs)
     obj.add_map_tile(map_provider)
@@ -9,10 +9,17 @@
 '''
 
 
+import os
+import tempfile
 import shapely
+import shapely.wkb
+import shapely.prepared
 import numpy as np
+import pandas as pd
 from tqdm import tqdm 
 import geopandas as gpd
+from pyproj import Transformer
+from concurrent.futures import ProcessPoolExecutor
 
 
 def concatPolyCoords(polyCoords):
@@ -79,7 +86,8 @@ def multiGeomHandler(multi_geometry, coord_index, geom_type, complex_geom=False)
 	
 	Bokeh documentation regarding the Multi-geometry issues can be found here (it is an open issue) - https://github.com/bokeh/bokeh/issues/2321
 	"""
-	for i, part in enumerate(multi_geometry):
+	# Multi-geometries are iterated via their ```geoms``` (i.e., as of Shapely 2.0)
+	for i, part in enumerate(getattr(multi_geometry, 'geoms', multi_geometry)):
 		# On the first part of the Multi-geometry initialize the coord_array (np.array)
 		if i == 0:
 			if geom_type == "MultiPoint":
@@ -152,7 +160,105 @@ def getCoords(geom, coord_index, complex_geom=False):
 		return np.array( multiGeomHandler(geom, coord_index, gtype) )
 
 
-def create_linestring_from_points(gdf, column_handlers, **kwargs):
+def points_to_line_buffers(gdf, column_handlers, temporal_name=None):
+	"""
+	Convert Point Geometries to flat coordinate buffers (one PolyLine per object), without creating any intermediate geometries.
+	The points are sorted once by (```column_handlers```, ```temporal_name```) and the PolyLines' boundaries are found where the primary key changes.
+
+	Parameters
+	----------
+	gdf: GeoPandas GeoDataFrame
+		Contains information about the Point Geometries
+	column_handlers: List 
+		The Columns that will Uniquely Identify each PolyLine (i.e., Primary Key(s))
+	temporal_name: str (default: None)
+		The column that orders the points of each PolyLine. If None, the points keep their order within ```gdf```.
+
+	Returns
+	-------
+	keys: Pandas DataFrame
+		The primary key(s) of each PolyLine
+	x, y: NumPy Array
+		The (flat) coordinates of the PolyLines. Single-point PolyLines have their point duplicated (similarly to ```create_linestring_from_points```).
+	offsets: NumPy Array
+		The start (and end) of each PolyLine's coordinates within ```x```, ```y``` (i.e., the i-th PolyLine is ```x[offsets[i]:offsets[i+1]]```)
+	"""
+	codes = [pd.factorize(gdf[col], sort=True)[0] for col in column_handlers]
+	valid = np.logical_and.reduce([code != -1 for code in codes])
+
+	# np.lexsort is stable, sorting by the last key first
+	sort_keys = ([] if temporal_name is None else [gdf[temporal_name].values]) + [code for code in codes[::-1]]
+	order = np.lexsort(sort_keys)
+	order = order[valid[order]]
+
+	if len(order) == 0:
+		return gdf[column_handlers].iloc[:0].reset_index(drop=True), np.empty(0), np.empty(0), np.zeros(1, dtype=np.int64)
+
+	key_changes = np.zeros(len(order) - 1, dtype=bool)
+	for code in codes:
+		key_changes |= np.diff(code[order]) != 0
+
+	starts = np.concatenate([[0], np.flatnonzero(key_changes) + 1])
+	sizes = np.diff(np.append(starts, len(order)))
+
+	repeats = np.ones(len(order), dtype=np.int64)
+	repeats[starts[sizes == 1]] = 2
+
+	x = np.repeat(gdf.geometry.x.values[order], repeats)
+	y = np.repeat(gdf.geometry.y.values[order], repeats)
+	offsets = np.concatenate([[0], np.cumsum(np.maximum(sizes, 2))])
+	keys = gdf[column_handlers].iloc[order[starts]].reset_index(drop=True)
+
+	return keys, x, y, offsets
+
+
+def linestrings_from_buffers(x, y, offsets):
+	"""
+	Create LineStrings (in bulk) from flat coordinate buffers (consult ```points_to_line_buffers```).
+
+	Returns
+	-------
+	NumPy Array or List of shapely LineStrings
+	"""
+	if hasattr(shapely, 'linestrings'):
+		# Shapely >= 2.0 creates all the geometries in a single (vectorized) call
+		return shapely.linestrings(x, y, indices=np.repeat(np.arange(len(offsets) - 1), np.diff(offsets)))
+
+	coords = np.column_stack([x, y])
+	return [shapely.geometry.LineString(coords[start:end]) for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+def create_multi_line_data(gdf, column_handlers, sp_columns=['lon', 'lat'], suffix='_merc', temporal_name=None):
+	"""
+	Create the data of a ```multi_line``` ColumnDataSource straight from Point Geometries (i.e., without creating any LineString).
+
+	Parameters
+	----------
+	gdf: GeoPandas GeoDataFrame
+		Contains information about the Point Geometries
+	column_handlers: List 
+		The Columns that will Uniquely Identify each PolyLine (i.e., Primary Key(s))
+	sp_columns: List (default: ```['lon', 'lat']```)
+		The (ordered) column names for the location of the spatial coordinates.
+	suffix: str (default: ```'_merc'```)
+		A suffix for the column name of the extracted spatial coordinates
+	temporal_name: str (default: None)
+		The column that orders the points of each PolyLine. If None, the points keep their order within ```gdf```.
+
+	Returns
+	-------
+	Dict
+	"""
+	keys, x, y, offsets = points_to_line_buffers(gdf, column_handlers, temporal_name=temporal_name)
+
+	data = keys.to_dict(orient='list')
+	data[f'{sp_columns[0]}{suffix}'] = np.split(x, offsets[1:-1])
+	data[f'{sp_columns[1]}{suffix}'] = np.split(y, offsets[1:-1])
+
+	return data
+
+
+def create_linestring_from_points(gdf, column_handlers, vectorized=False, temporal_name=None, **kwargs):
 	"""
 	Create LineStrings from Point Geometries.
 
@@ -162,6 +268,10 @@ def create_linestring_from_points(gdf, column_handlers, **kwargs):
 		Contains information about the Point Geometries
 	column_handlers: List 
 		The Columns that will Uniquely Identify each LineString (i.e., Primary Key(s))
+	vectorized: Boolean (default: False)
+		Create the LineStrings from flat coordinate buffers (consult ```points_to_line_buffers```) instead of a per-object ```groupby().apply()```
+	temporal_name: str (default: None)
+		The column that orders the points of each LineString (only if ```vectorized = True```). If None, the points keep their order within ```gdf```.
 	**kwargs: Dict
 		Other parameters related to tqdm.pandas
 	
@@ -169,6 +279,9 @@ def create_linestring_from_points(gdf, column_handlers, **kwargs):
 	-------
 	GeoPandas GeoDataFrame
 	"""
+	if vectorized:
+		keys, x, y, offsets = points_to_line_buffers(gdf, column_handlers, temporal_name=temporal_name)
+		return gpd.GeoDataFrame(keys.assign(geom=linestrings_from_buffers(x, y, offsets)), crs=gdf.crs, geometry='geom')
 
 	tqdm.pandas(**kwargs)
 
@@ -185,8 +298,7 @@ def getGeoDataFrame_v2(df, coordinate_columns=['lon', 'lat'], crs={'init':'epsg:
 	'''
 		Create a GeoDataFrame from a DataFrame in a much more generalized form.
 	'''
-	df = df.assign(geom=np.nan)
-	df.geom = df[coordinate_columns].apply(lambda x: shapely.geometry.Point(*x), axis=1)
+	df = df.assign(geom=gpd.points_from_xy(*[df[col] for col in coordinate_columns]))
 	
 	return gpd.GeoDataFrame(df, geometry='geom', crs=crs)
 
@@ -271,4 +383,167 @@ def quadrat_cut_geometry(geometry, quadrat_width, min_num=3, buffer_amount=1e-9)
 	quadrats = shapely.ops.unary_union(lines_buffered)
 	multipoly = geometry.difference(quadrats)
 
-	return multipoly
\ No newline at end of file
+	return multipoly
+
+
+# The (Multi)Polygon's parts that are being cut by each worker process of ```quadrat_cut_geometry_parallel```
+_QUADRAT_PARTS = None
+
+
+def _init_quadrat_worker(parts_wkb):
+	"""
+	Initializer of the worker processes of ```quadrat_cut_geometry_parallel```; loads (and prepares) the geometry's parts once per process.
+	"""
+	global _QUADRAT_PARTS
+	parts = [shapely.wkb.loads(part) for part in parts_wkb]
+	_QUADRAT_PARTS = [(part, shapely.prepared.prep(part)) for part in parts]
+
+
+def _quadrat_cut_cells(tasks):
+	"""
+	Intersect a chunk of quadrats with their candidate parts of the geometry. Returns the resulting polygons as WKB.
+	"""
+	pieces = []
+
+	for cell_bounds, part_indices in tasks:
+		cell = shapely.geometry.box(*cell_bounds)
+
+		for idx in part_indices:
+			part, prepared_part = _QUADRAT_PARTS[idx]
+
+			if prepared_part.contains(cell):
+				# The parts of a valid MultiPolygon do not overlap; no other part can intersect the quadrat's interior
+				pieces.append(cell)
+				break
+			if not prepared_part.intersects(cell):
+				continue
+
+			piece = part.intersection(cell)
+			if piece.geom_type == 'Polygon':
+				pieces.append(piece)
+			elif piece.geom_type in ('MultiPolygon', 'GeometryCollection'):
+				pieces.extend([geom for geom in piece.geoms if geom.geom_type == 'Polygon'])
+
+	return [piece.wkb for piece in pieces if not piece.is_empty]
+
+
+def quadrat_cut_geometry_parallel(geometry, quadrat_width, min_num=3, n_jobs=None, chunk_size=None):
+	"""
+	Split a Polygon or MultiPolygon up into sub-polygons of a specified size, using quadrats. Instead of subtracting the (buffered) grid lines
+	from the whole geometry (consult ```quadrat_cut_geometry```), each quadrat (grid cell) is intersected with the geometry's parts
+	whose bounding box intersects it (via a spatial index). Quadrats are processed in chunks on a pool of worker processes.
+		
+	Parameters
+	----------
+	geometry : shapely Polygon or MultiPolygon (or GeoPandas GeoSeries)
+		the geometry to split up into smaller sub-polygons
+	quadrat_width : numeric
+		the linear width of the quadrats with which to cut up the geometry (in the units the geometry is in)
+	min_num : int
+		the minimum number of linear quadrat lines (e.g., min_num=3 would produce a quadrat grid of 4 squares)
+	n_jobs : int (default: None)
+		the number of worker processes. If None, all the available CPUs are used; if 1, the quadrats are cut in the calling process.
+	chunk_size : int (default: None)
+		the number of quadrats per task. If None, the quadrats are split into 4 tasks per worker process.
+	
+	Returns
+	-------
+	shapely MultiPolygon
+	"""
+	if hasattr(geometry, 'total_bounds'):
+		geometry = geometry.unary_union
+
+	# create n evenly spaced points between the min and max x and y bounds (same grid as quadrat_cut_geometry)
+	west, south, east, north = geometry.bounds
+	x_num = int(np.ceil((east-west) / quadrat_width) + 1)
+	y_num = int(np.ceil((north-south) / quadrat_width) + 1)
+	x_points = np.linspace(west, east, num=max(x_num, min_num))
+	y_points = np.linspace(south, north, num=max(y_num, min_num))
+
+	parts = list(geometry.geoms) if geometry.geom_type == 'MultiPolygon' else [geometry]
+	sindex = gpd.GeoSeries(parts).sindex
+
+	# pick the candidate parts of every quadrat via a single (bulk) query of the spatial index; quadrats without candidates are dropped
+	cell_bounds = [(x_min, y_min, x_max, y_max) for x_min, x_max in zip(x_points[:-1], x_points[1:]) for y_min, y_max in zip(y_points[:-1], y_points[1:])]
+	cells = gpd.GeoSeries([shapely.geometry.box(*bounds) for bounds in cell_bounds])
+	# ``query`` accepts arrays of geometries as of Shapely 2 (i.e., GeoPandas >= 0.12); ``query_bulk`` before
+	cell_indices, part_indices = sindex.query(cells) if hasattr(shapely, 'linestrings') else sindex.query_bulk(cells)
+
+	order = np.lexsort((part_indices, cell_indices))
+	cell_indices, part_indices = cell_indices[order], part_indices[order]
+	cell_ids, starts = np.unique(cell_indices, return_index=True)
+	tasks = [(cell_bounds[cell_id], candidates.tolist()) for cell_id, candidates in zip(cell_ids, np.split(part_indices, starts[1:]))]
+
+	n_jobs = os.cpu_count() if n_jobs is None else n_jobs
+	parts_wkb = [part.wkb for part in parts]
+
+	if n_jobs == 1 or len(tasks) <= 1:
+		_init_quadrat_worker(parts_wkb)
+		pieces = _quadrat_cut_cells(tasks)
+	else:
+		chunk_size = max(1, int(np.ceil(len(tasks) / (n_jobs * 4)))) if chunk_size is None else chunk_size
+		chunks = [tasks[i:i+chunk_size] for i in range(0, len(tasks), chunk_size)]
+
+		with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_quadrat_worker, initargs=(parts_wkb,)) as executor:
+			pieces = [piece for chunk_pieces in executor.map(_quadrat_cut_cells, chunks) for piece in chunk_pieces]
+
+	return shapely.geometry.MultiPolygon([shapely.wkb.loads(piece) for piece in pieces])
+
+
+def _project_coordinates_chunk(args):
+	"""
+	Project (in-place) a chunk of the coordinates stored at the shared buffer of ```project_coordinates_parallel```.
+	"""
+	buffer_path, n_points, start, end, crs_from, crs_to = args
+
+	buffer = np.memmap(buffer_path, dtype=np.float64, mode='r+', shape=(2, n_points))
+	transformer = Transformer.from_crs(crs_from, crs_to, always_xy=True)
+	buffer[0, start:end], buffer[1, start:end] = transformer.transform(buffer[0, start:end], buffer[1, start:end])
+	buffer.flush()
+
+	return end - start
+
+
+def project_coordinates_parallel(x, y, crs_from, crs_to, n_jobs=None, chunks_per_job=4):
+	"""
+	Project coordinates on a pool of worker processes. The coordinates are exchanged via a memory-mapped buffer 
+	(on ```/dev/shm``` if available), so that only the chunks' boundaries are sent to (and from) the worker processes.
+
+	Parameters
+	----------
+	x, y: NumPy Array
+		The coordinates to be projected
+	crs_from: str or pyproj.CRS
+		The CRS of the coordinates
+	crs_to: str or pyproj.CRS
+		The CRS that the coordinates will be projected to
+	n_jobs: int (default: None)
+		The number of worker processes. If None, all the available CPUs are used.
+	chunks_per_job: int (default: 4)
+		The number of chunks that the coordinates are split into, per worker process
+
+	Returns
+	-------
+	Tuple of NumPy Arrays
+	"""
+	n_points = len(x)
+	if n_points == 0:
+		return np.empty(0), np.empty(0)
+
+	n_jobs = os.cpu_count() if n_jobs is None else n_jobs
+	crs_from, crs_to = str(crs_from), str(crs_to)
+
+	with tempfile.NamedTemporaryFile(dir='/dev/shm' if os.path.isdir('/dev/shm') else None, suffix='.coords') as f:
+		buffer = np.memmap(f.name, dtype=np.float64, mode='w+', shape=(2, n_points))
+		buffer[0], buffer[1] = x, y
+		buffer.flush()
+
+		bounds = np.unique(np.linspace(0, n_points, n_jobs * chunks_per_job + 1).astype(np.int64))
+		tasks = [(f.name, n_points, start, end, crs_from, crs_to) for start, end in zip(bounds[:-1], bounds[1:])]
+
+		with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+			list(executor.map(_project_coordinates_chunk, tasks))
+
+		projected = np.array(buffer)
+
+	return projected[0], projected[1]
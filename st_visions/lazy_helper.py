@@ -0,0 +1,41 @@
+"""Deferred (Lazy) Imports of VISIONS' Heavy Dependencies.
+
+   Modules such as GeoPandas, Shapely and pyproj (via ``geom_helper``) are executed on their first attribute access, so that instances
+   that do not load any (Geo)DataFrame (e.g., a streaming Canvas fed by its CDS) do not pay for them at import time.
+"""
+
+
+import sys
+import importlib
+import importlib.util
+
+
+def lazy_import(name):
+    """
+    Import a module lazily, i.e., execute it on its first attribute access (unless it is already imported).
+
+    Parameters
+    ----------
+    name: str
+        The (absolute) name of the module
+
+    Returns
+    -------
+    module
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        # Fail (i.e., raise ModuleNotFoundError) at import time, as a regular import would
+        return importlib.import_module(name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+
+    return module
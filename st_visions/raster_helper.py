@@ -0,0 +1,145 @@
+"""Server-side Rasterization of (Projected) Point Datasets.
+
+   Points are binned to the pixels of the Canvas and rendered into an RGBA image (suitable for Bokeh's ``image_rgba`` glyph), so that
+   the size of the rendered image depends only on the Canvas' dimensions, rather than on the number of points.
+"""
+
+
+import numpy as np
+import pandas as pd
+import bokeh.colors.named as named_colors
+
+
+def color_to_rgba(color, alpha=1.0):
+    """
+    Convert a color (hexadecimal, named or a Bokeh color) to a packed RGBA value (i.e., the format of ```image_rgba```).
+
+    Parameters
+    ----------
+    color: str or bokeh.colors instance
+        The color in hexadecimal format (e.g., ```'#4169e1'```), a CSS color name (e.g., ```'royalblue'```) or a ```bokeh.colors.Color``` (e.g., ```bokeh.colors.RGB(65, 105, 225)```)
+    alpha: float (values in [0,1] -- default: ```1.0```)
+        The color's alpha
+
+    Returns
+    -------
+    numpy.uint32
+    """
+    if hasattr(color, 'to_rgb'):
+        rgb = color.to_rgb()
+        r, g, b = rgb.r, rgb.g, rgb.b
+    elif color.startswith('#'):
+        color = color[1:]
+        if len(color) == 3:
+            color = ''.join(c * 2 for c in color)
+        r, g, b = int(color[0:2], 16), int(color[2:4], 16), int(color[4:6], 16)
+    else:
+        named = getattr(named_colors, color.lower())
+        r, g, b = named.r, named.g, named.b
+
+    return np.array([r, g, b, int(round(alpha * 255))], dtype=np.uint8).view(np.uint32)[0]
+
+
+def bin_points(x, y, x_range, y_range, width, height):
+    """
+    Map the points to the (flat) index of the pixel that contains them.
+
+    Parameters
+    ----------
+    x, y: NumPy Array
+        The points' coordinates
+    x_range, y_range: Tuple (start, end)
+        The Canvas' spatial horizon
+    width, height: int
+        The Canvas' dimensions (in pixels)
+
+    Returns
+    -------
+    pixels: NumPy Array
+        The (flat) pixel index of each point within the Canvas
+    mask: NumPy Array
+        The points that are within the Canvas' horizon
+    """
+    x_start, x_end = x_range
+    y_start, y_end = y_range
+
+    col = np.floor((x - x_start) / (x_end - x_start) * width).astype(np.int64)
+    row = np.floor((y - y_start) / (y_end - y_start) * height).astype(np.int64)
+    mask = (col >= 0) & (col < width) & (row >= 0) & (row < height)
+
+    # image_rgba draws the image's first row at the bottom of the Canvas
+    return row[mask] * width + col[mask], mask
+
+
+def rasterize_points(x, y, x_range, y_range, width, height, color='royalblue', alpha=0.8, values=None, cmap=None):
+    """
+    Rasterize Points to an RGBA image. If a colormap is set, the color of each pixel follows the colormap, i.e.:
+      * Categorical Colormap: The color of the most frequent category within the pixel
+      * Numerical Colormap: The color of the mean value within the pixel (```nan_color``` for pixels without any finite value)
+    Otherwise, every non-empty pixel is drawn with ```color``` and an alpha that grows (logarithmically) with the number of points within it.
+
+    Parameters
+    ----------
+    x, y: NumPy Array
+        The points' coordinates
+    x_range, y_range: Tuple (start, end)
+        The Canvas' spatial horizon
+    width, height: int
+        The Canvas' dimensions (in pixels)
+    color: str (default: ```'royalblue'```)
+        The points' color (if no colormap is set)
+    alpha: float (values in [0,1] -- default: ```0.8```)
+        The (maximum) alpha of the non-empty pixels
+    values: NumPy Array (default: None)
+        The values of the colormap's field for each point
+    cmap: bokeh.models.CategoricalColorMapper or bokeh.models.LinearColorMapper (default: None)
+        The colormap of the points (consult ```st_visualizer.add_categorical_colormap``` and ```st_visualizer.add_numerical_colormap```)
+
+    Returns
+    -------
+    NumPy Array (height x width) of numpy.uint32
+    """
+    n_pixels = width * height
+    pixels, mask = bin_points(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64), x_range, y_range, width, height)
+    counts = np.bincount(pixels, minlength=n_pixels)
+    image = np.zeros(n_pixels, dtype=np.uint32)
+
+    if cmap is None or values is None:
+        intensity = np.log1p(counts) / np.log1p(max(counts.max(), 1))
+        base = np.array([color_to_rgba(color, 1.0)], dtype=np.uint32).view(np.uint8)
+        rgba = np.zeros((n_pixels, 4), dtype=np.uint8)
+        rgba[counts > 0, :3] = base[:3]
+        rgba[:, 3] = np.round(alpha * 255 * np.where(counts > 0, 0.25 + 0.75 * intensity, 0)).astype(np.uint8)
+        return rgba.view(np.uint32).reshape(height, width)
+
+    values = np.asarray(values)[mask]
+    palette = np.array([color_to_rgba(c, alpha) for c in cmap.palette], dtype=np.uint32)
+
+    if hasattr(cmap, 'factors'):
+        factors = list(cmap.factors)
+        codes = pd.Categorical(values, categories=factors).codes.astype(np.int64)
+        known = codes != -1
+
+        votes = np.bincount(pixels[known] * len(factors) + codes[known], minlength=n_pixels * len(factors)).reshape(n_pixels, len(factors))
+        winners = votes.argmax(axis=1)
+        filled = votes.max(axis=1) > 0
+        image[filled] = palette[winners[filled] % len(palette)]
+    else:
+        values = values.astype(np.float64)
+        finite = np.isfinite(values)
+        sums = np.bincount(pixels[finite], weights=values[finite], minlength=n_pixels)
+        finite_counts = np.bincount(pixels[finite], minlength=n_pixels)
+
+        filled = finite_counts > 0
+        means = sums[filled] / finite_counts[filled]
+        low = np.nanmin(values) if cmap.low is None else cmap.low
+        high = np.nanmax(values) if cmap.high is None else cmap.high
+
+        # Similarly to Bokeh's LinearColorMapper, values outside [low, high] are clamped to the palette's ends
+        scaled = np.floor((means - low) / ((high - low) or 1) * len(palette)).astype(np.int64)
+        image[filled] = palette[np.clip(scaled, 0, len(palette) - 1)]
+
+        # Pixels with points but without (finite) values
+        image[(counts > 0) & ~filled] = color_to_rgba(cmap.nan_color, alpha)
+
+    return image.reshape(height, width)
@@ -6,26 +6,33 @@
 
 
 import sys, os
+import re
 import operator
 import numpy as np
 import pandas as pd
-import geopandas as gpd
-from tqdm import tqdm
 
 import bokeh
 import bokeh.io as bokeh_io
 import bokeh.plotting as bokeh_plt
 import bokeh.models as bokeh_mdl
-import bokeh.palettes as palettes
 
+import bokeh.events as bokeh_events
 from bokeh.tile_providers import get_provider, Vendors
 from bokeh.plotting import figure, output_file, reset_output, output_notebook, save, show
 from bokeh.models import ColumnDataSource, CDSView, HoverTool, WheelZoomTool, GroupFilter, BooleanFilter, CustomJS, Slider, DateSlider
 from bokeh.layouts import column, widgetbox, row
 
 # Importing Helper Libraries
-import geom_helper
 import callbacks
+from trace_helper import TRACER
+from lazy_helper import lazy_import
+
+# The (Geo)DataFrame machinery is imported on its first use, i.e., not by instances that are only fed via their CDS (e.g., streaming)
+gpd = lazy_import('geopandas')
+palettes = lazy_import('bokeh.palettes')
+geom_helper = lazy_import('geom_helper')
+cache_helper = lazy_import('cache_helper')
+raster_helper = lazy_import('raster_helper')
 
 
 # Defining Allowed Values (per use-case)
@@ -36,9 +43,13 @@ ALLOWED_FILTER_OPERATORS = {'==': operator.eq, '!=': operator.ne, '<': operator.
 ALLOWED_CATEGORICAL_COLOR_PALLETES = ['Accent', 'Blues', 'BrBG', 'BuGn', 'Category10', 'Category20', 'Category20b', 'Category20c', 'Cividis', 'Colorblind', 'Dark2', 'GnBu', 'Greens', 'Greys', 'Inferno', 'Magma','OrRd', 'Oranges', 'PRGn', 'Paired', 'Pastel1', 'Pastel2', 'PiYG', 'Plasma', 'PuBu', 'PuBuGn', 'PuOr', 'PuRd', 'Purples', 'RdBu', 'RdGy', 'RdPu', 'RdYlBu', 'RdYlGn', 'Reds', 'Set1', 'Set2', 'Set3', 'Spectral', 'Turbo', 'Viridis', 'YlGn', 'YlGnBu', 'YlOrBr', 'YlOrRd']
 ALLOWED_NUMERICAL_COLOR_PALETTES = ['Blues256', 'Greens256', 'Greys256', 'Inferno256', 'Magma256', 'Plasma256', 'Viridis256', 'Cividis256', 'Turbo256', 'Oranges256', 'Purples256', 'Reds256']
 
+# Browser-side (JavaScript) expressions of ```x``` for deriving WGS84 coordinates from Web Mercator ones (consult ```st_visualizer.add_derived_column```)
+MERCATOR_TO_LON_JS = 'x / 6378137 * 180 / Math.PI'
+MERCATOR_TO_LAT_JS = '(2 * Math.atan(Math.exp(x / 6378137)) - Math.PI / 2) * 180 / Math.PI'
+
 
 class st_visualizer:
-    def __init__(self, limit=30000, allow_complex_geometries=False, proj='epsg:3857'):
+    def __init__(self, limit=30000, allow_complex_geometries=False, proj='epsg:3857', cache_dir=None, n_jobs=None):
         """
         Constructor for creating a VISIONS Instance.
             
@@ -50,10 +61,16 @@ class st_visualizer:
             Choose to plot either the polygons' exterior (False) or along with its inner voids (True)
         proj: str (default: ```'epsg:3857'```)
             The CRS that the input geometries will be projected to prior to visualization.
+        cache_dir: str (default: None)
+            A directory for caching the loaded datasets after their projection and coordinate extraction. If None, no caching takes place.
+        n_jobs: int (default: None)
+            The number of worker processes for projecting (and extracting the coordinates of) Point datasets. If None (or 1), the datasets are prepared in the calling process.
         """
         self.limit = limit
         self.allow_complex_geometries = allow_complex_geometries
         self.proj = proj
+        self.cache_dir = cache_dir
+        self.n_jobs = n_jobs
 
         self.data = None
         self.canvas_data = None
@@ -66,11 +83,21 @@ class st_visualizer:
         self.widgets   = []
 
         self.cmap = None
+        self.derived_columns = {}
+        self.interpolation = None
         self.__suffix = None
+        self.__coords = None
+        self.__pyramid = None
+        self.__pixel_tolerance = None
+        self.__level = None
+        self.__prepared_index = None
+        self.__raster = None
+        self.__raster_data = None
+        self.__raster_loaded_subset = False
         self.aquire_canvas_data = None
     
 
-    def __set_data(self, data, columns):
+    def __set_data(self, data, columns, source=None, params=None):
         """
         Private Method for Saving the Dataset to the instance's attributes, along with the location of spatial coordinates.
             
@@ -80,11 +107,99 @@ class st_visualizer:
             The instance's loaded data
         columns: List 
             The (ordered) column names for the location of the spatial coordinates.
+        source: str (default: None)
+            The path to the source file or the query that fetched the data. If set (and the instance has a ```cache_dir```), the prepared data are cached.
+        params: Dict (default: None)
+            Other parameters that affect the loaded data (part of the cache key)
         """
-        data = data.to_crs(self.proj)
+        coords = None
+
+        if data.crs is not None and data.crs == self.proj:
+            pass
+        elif self.n_jobs is not None and self.n_jobs > 1 and data.crs is not None and len(data) != 0 and (data.geom_type == 'Point').all():
+            # Project the Points' coordinates on a pool of worker processes; the (projected) coordinates are reused by prepare_data
+            x, y = geom_helper.project_coordinates_parallel(data.geometry.x.values, data.geometry.y.values, crs_from=data.crs, crs_to=self.proj, n_jobs=self.n_jobs)
+            data = gpd.GeoDataFrame(data.assign(**{data.geometry.name: gpd.points_from_xy(x, y)}), geometry=data.geometry.name, crs=self.proj)
+            coords = [pd.Series(x, index=data.index), pd.Series(y, index=data.index)]
+        else:
+            data = data.to_crs(self.proj)
 
         self.data = data
         self.sp_columns = columns
+        self.__coords = coords
+        self.__pyramid = None
+        self.__raster_data = None
+        self.__prepared_index = None
+
+        if self.cache_dir is not None and source is not None:
+            self.__coords = self.__extract_coords(data) if coords is None else coords
+
+            key = cache_helper.get_cache_key(source, self.proj, columns, self.allow_complex_geometries, params)
+            cache_helper.save_dataset(self.cache_dir, key, source, data, self.__coords)
+
+
+    def __load_cached_data(self, columns, source, params=None, max_age=None):
+        """
+        Private Method for Loading a prepared Dataset from the instance's cache.
+
+        Parameters
+        ----------
+        columns: List
+            The (ordered) column names for the location of the spatial coordinates.
+        source: str
+            The path to the source file or the query that fetched the data.
+        params: Dict (default: None)
+            Other parameters that affect the loaded data (part of the cache key)
+        max_age: float (default: None)
+            The maximum age (in seconds) of the cached Dataset
+
+        Returns
+        -------
+        boolean
+            True if the Dataset was loaded from the cache, False otherwise.
+        """
+        if self.cache_dir is None or source is None:
+            return False
+
+        key = cache_helper.get_cache_key(source, self.proj, columns, self.allow_complex_geometries, params)
+        cached = cache_helper.load_dataset(self.cache_dir, key, source, max_age=max_age)
+
+        if cached is None:
+            return False
+
+        self.data, self.__coords = cached
+        self.sp_columns = columns
+        self.__pyramid = None
+        self.__raster_data = None
+        self.__prepared_index = None
+        return True
+
+
+    def __is_loaded_subset(self, data):
+        """
+        Private Method for Checking whether a GeoDataFrame, which the caller derived from the loaded dataset (e.g., filtered), is matched by index
+        to it. An index match alone does not imply the same data, i.e., unrelated GeoDataFrames must not be checked.
+        """
+        return self.data is not None and self.data.index.is_unique and data.index.isin(self.data.index).all()
+
+
+    def __extract_coords(self, data):
+        """
+        Private Method for Extracting the spatial coordinates of a GeoDataFrame's geometries.
+
+        Parameters
+        ----------
+        data: GeoPandas GeoDataFrame
+            The GeoDataFrame whose geometries' coordinates will be extracted
+
+        Returns
+        -------
+        List of Pandas Series (one per spatial dimension)
+        """
+        if len(data) != 0 and (data.geom_type == 'Point').all():
+            return [data.geometry.x, data.geometry.y]
+
+        return [data.geometry.apply(lambda l: geom_helper.getCoords(l, dim, self.allow_complex_geometries)) for dim in range(len(self.sp_columns))]
 
 
     def set_data(self, data, sp_columns=['lon', 'lat'], crs='epsg:4326'):
@@ -133,6 +248,34 @@ class st_visualizer:
         self.source = source
 
 
+    def get_template_models(self):
+        """
+        The instance's models that are needed per Document, if its Canvas is created from a template (consult ```template_helper``` and ```set_template_models```).
+
+        Returns
+        -------
+        Dict
+        """
+        return {'figure': self.figure, 'source': self.source, 'clock': self.interpolation['clock'] if self.interpolation is not None else None}
+
+
+    def set_template_models(self, models, suffix='_merc'):
+        """
+        Bind the instance to the models of a template's instantiation, instead of creating its Canvas (consult ```get_template_models```).
+
+        Parameters
+        ----------
+        models: Dict
+            The instantiated models (consult ```template_helper.DocumentTemplate.instantiate```)
+        suffix: str (default: ```'_merc'```)
+            A suffix for the column name of the extracted spatial coordinates
+        """
+        self.set_figure(models['figure'])
+        self.set_source(models['source'])
+        self.interpolation = {'clock': models['clock']} if models.get('clock') is not None else None
+        self.__suffix = suffix
+
+
     def get_data_csv(self, filepath, sp_columns=['lon', 'lat'], crs='epsg:4326', **kwargs):
         """
         Parse a CSV file as a GeoDataFrame.
@@ -148,13 +291,17 @@ class st_visualizer:
         **kwargs: Dict
             Other arguments related to parsing a CSV file (consult pandas.read_csv method)
         """
+        params = {'loader': 'csv', 'crs': crs, 'kwargs': kwargs}
+        if self.__load_cached_data(sp_columns, filepath, params):
+            return
+
         data = pd.read_csv(filepath, **kwargs)
         data = geom_helper.getGeoDataFrame_v2(data, coordinate_columns=sp_columns, crs=crs)
        
-        self.__set_data(data, sp_columns)
+        self.__set_data(data, sp_columns, filepath, params)
 
 
-    def get_data_postgres(self, sql, con, postgis=True, sp_columns=['lon', 'lat'], crs=None, **kwargs):
+    def get_data_postgres(self, sql, con, postgis=True, sp_columns=['lon', 'lat'], crs=None, cache_version=None, cache_max_age=None, **kwargs):
         """
         Parse a PostGIS SQL Result as a GeoDataFrame.
             
@@ -166,19 +313,124 @@ class st_visualizer:
             The (ordered) list of columns that contain the spatial coordinates
         crs: str (default: ```'epsg:4326'```)  
             The CRS of the Dataset's spatial coordinates
+        cache_version: str (default: None)
+            The version of the queried data (part of the cache key), e.g., bumped whenever the tables change
+        cache_max_age: float (default: None)
+            The maximum age (in seconds) of the cached SQL Result. The changes of the tables are not detected, i.e., the SQL Result is only cached 
+            (if the instance has a ```cache_dir```) if either ```cache_version``` or ```cache_max_age``` is set.
         **kwargs: Dict
             Other arguments related to parsing the SQL Result (consult geopandas.read_postgis method)
         """
+        source = sql if cache_version is not None or cache_max_age is not None else None
+        params = {'loader': 'postgres', 'postgis': postgis, 'crs': crs, 'cache_version': cache_version, 'kwargs': kwargs}
+        if self.__load_cached_data(sp_columns, source, params, max_age=cache_max_age):
+            return
+
         if postgis:
             data = gpd.read_postgis(sql, con, crs=crs, **kwargs)
         else:
             data = pd.read_sql_query(sql, con, **kwargs)
             data = geom_helper.getGeoDataFrame_v2(data, coordinate_columns=sp_columns, crs=crs)
 
-        self.__set_data(data, sp_columns)
+        self.__set_data(data, sp_columns, source, params)
+
+
+    def __get_data_arrow(self, filepath, file_format, sp_columns, crs, columns, bbox, temporal_name, temporal_range, merc_columns, filters):
+        """
+        Private Method for Parsing a columnar (Parquet/Feather) file as a GeoDataFrame. Only the requested columns are read,
+        while the spatial/temporal predicates are pushed down to the dataset scanner (i.e., row-groups that do not satisfy them are skipped).
+
+        Parameters
+        ----------
+        filepath: str
+            The path to the source file (or directory of files)
+        file_format: str (either ```'parquet'``` or ```'feather'```)
+            The format of the source file(s)
+
+        (For the rest of the parameters consult the ```get_data_parquet``` method)
+        """
+        try:
+            import pyarrow.dataset as ds
+        except ImportError:
+            raise ImportError('Reading Parquet/Feather files requires the pyarrow package (pip install pyarrow)')
+
+        params = {'loader': file_format, 'crs': crs, 'columns': columns, 'bbox': bbox, 'temporal_name': temporal_name, 'temporal_range': temporal_range, 'merc_columns': merc_columns, 'filters': filters}
+        if self.__load_cached_data(sp_columns, filepath, params):
+            return
+
+        coordinate_columns = sp_columns if merc_columns is None else merc_columns
+
+        if columns is not None:
+            extra_columns = [temporal_name] if temporal_name is not None else []
+            columns = list(dict.fromkeys([*columns, *coordinate_columns, *extra_columns]))
+
+        predicate = filters
+        if bbox is not None:
+            x_field, y_field = ds.field(coordinate_columns[0]), ds.field(coordinate_columns[1])
+            bbox_predicate = (x_field >= bbox[0]) & (y_field >= bbox[1]) & (x_field <= bbox[2]) & (y_field <= bbox[3])
+            predicate = bbox_predicate if predicate is None else predicate & bbox_predicate
+
+        if temporal_range is not None:
+            if temporal_name is None:
+                raise ValueError('temporal_name must be set in order to filter by temporal_range')
+            t_field = ds.field(temporal_name)
+            temporal_predicate = (t_field >= temporal_range[0]) & (t_field <= temporal_range[1])
+            predicate = temporal_predicate if predicate is None else predicate & temporal_predicate
+
+        data = ds.dataset(filepath, format=file_format).to_table(columns=columns, filter=predicate).to_pandas()
+
+        if merc_columns is None:
+            data = geom_helper.getGeoDataFrame_v2(data, coordinate_columns=sp_columns, crs=crs)
+        else:
+            # Coordinates are already projected; build the geometries straight into the instance's CRS.
+            data = geom_helper.getGeoDataFrame_v2(data, coordinate_columns=merc_columns, crs=self.proj)
+
+        self.__set_data(data, sp_columns, filepath, params)
+
+
+    def get_data_parquet(self, filepath, sp_columns=['lon', 'lat'], crs='epsg:4326', columns=None, bbox=None, temporal_name=None, temporal_range=None, merc_columns=None, filters=None):
+        """
+        Parse a Parquet file (or a directory of Parquet files) as a GeoDataFrame.
+
+        Parameters
+        ----------
+        filepath: str
+            The path to the Parquet source file(s)
+        sp_columns: List (default: ```['lon', 'lat']```)
+            The (ordered) list of columns that contain the spatial coordinates
+        crs: str (default: ```'epsg:4326'```)
+            The CRS of the Dataset's spatial coordinates
+        columns: List (default: None)
+            The columns to be read from the file. If None, all columns are read. The spatial (and temporal) columns are always included.
+        bbox: Tuple (minx, miny, maxx, maxy) (default: None)
+            Load only the records within the bounding box. The bounding box is expressed in the CRS of the coordinate columns that are read (i.e., ```merc_columns``` if set, otherwise ```sp_columns```)
+        temporal_name: str (default: None)
+            The column name that contains the temporal information
+        temporal_range: Tuple (start, end) (default: None)
+            Load only the records whose ```temporal_name``` value lies within the (inclusive) range. The values must be in the column's units.
+        merc_columns: List (default: None)
+            The (ordered) list of columns that contain precomputed coordinates in the instance's CRS (```proj```). If set, no projection takes place at load time.
+        filters: pyarrow.dataset.Expression (default: None)
+            Other predicates to be pushed down to the file scanner
+        """
+        self.__get_data_arrow(filepath, 'parquet', sp_columns, crs, columns, bbox, temporal_name, temporal_range, merc_columns, filters)
 
 
-    def prepare_data(self, data=None, suffix=None):
+    def get_data_feather(self, filepath, sp_columns=['lon', 'lat'], crs='epsg:4326', columns=None, bbox=None, temporal_name=None, temporal_range=None, merc_columns=None, filters=None):
+        """
+        Parse a Feather (Arrow IPC) file (or a directory of Feather files) as a GeoDataFrame.
+
+        Parameters
+        ----------
+        filepath: str
+            The path to the Feather source file(s)
+
+        (For the rest of the parameters consult the ```get_data_parquet``` method)
+        """
+        self.__get_data_arrow(filepath, 'feather', sp_columns, crs, columns, bbox, temporal_name, temporal_range, merc_columns, filters)
+
+
+    def prepare_data(self, data=None, suffix=None, loaded_subset=False):
         """
         Prepare the (loaded) data prior to rendering. 
 
@@ -188,6 +440,8 @@ class st_visualizer:
             Prepare either the loaded data (None) or another DataFrame
         suffix: str (default: None)
             A suffix for the column name of the extracted spatial coordinates
+        loaded_subset: boolean (default: False)
+            Whether ```data``` is derived from the loaded dataset (e.g., filtered), i.e., whether its coordinates extracted at load time are reused
 
 
         Returns
@@ -196,6 +450,7 @@ class st_visualizer:
         """
         if data is None:
             data = self.data.copy()
+            loaded_subset = True
         
         data = data.iloc[:self.limit].copy()
         
@@ -205,11 +460,105 @@ class st_visualizer:
         if (suffix is None or data is None):
             raise ValueError('You must either set a Dataset and/or set a Column suffix for extracted geometry coordinates.')
         
-        for dim, coord_name in enumerate(self.sp_columns):
-            data.loc[:, f'{coord_name}{suffix}'] = data.geometry.apply(lambda l: geom_helper.getCoords(l, dim, self.allow_complex_geometries))
+        loaded_subset = loaded_subset and (self.__coords is not None or self.__pyramid is not None) and self.__is_loaded_subset(data)
+
+        if self.__pyramid is not None and loaded_subset:
+            self.__level = self.__get_simplification_level()
+
+        if self.__pyramid is not None and loaded_subset and self.__level is not None:
+            # Use the simplified coordinates that correspond to the Canvas' current zoom level
+            coords = [coord.loc[data.index] for coord in self.__pyramid[self.__level][1]]
+        elif self.__coords is not None and loaded_subset:
+            # Reuse the coordinates extracted at load time (i.e., cached) if ```data``` is derived from the loaded dataset
+            coords = [coord.loc[data.index] for coord in self.__coords]
+        else:
+            coords = self.__extract_coords(data)
+
+        # Only the coordinates of the loaded dataset are simplified, i.e., other DataFrames are not switched between the pyramid's levels
+        self.__prepared_index = data.index if loaded_subset else None
+
+        for coord_name, coord in zip(self.sp_columns, coords):
+            data.loc[:, f'{coord_name}{suffix}'] = coord
 
         # print (data.head())
         return data
+
+
+    def set_simplification(self, tolerances=None, n_levels=8, pixel_tolerance=1.0):
+        """
+        Simplify the (loaded) geometries (Douglas-Peucker) according to the Canvas' zoom level. The simplified geometries are precomputed once
+        for a set of tolerances (i.e., a multi-resolution pyramid) and, on each zoom, the coarsest level whose tolerance does not exceed 
+        ```pixel_tolerance``` pixels is sent to the Canvas, so that the number of vertices remains proportional to the screen resolution.
+
+        Parameters
+        ----------
+        tolerances: List (default: None)
+            The tolerances (in the units of the instance's CRS) of the pyramid's levels. If None, ```n_levels``` tolerances are derived from the dataset's extent,
+            with the coarsest one corresponding to a single pixel when the whole dataset spans 512 pixels.
+        n_levels: int (default: 8)
+            The number of the pyramid's levels (if ```tolerances``` is None). Each level halves the tolerance of the previous one.
+        pixel_tolerance: float (default: 1.0)
+            The maximum allowed deviation (in pixels) of the simplified geometries
+        """
+        if self.data is None:
+            raise ValueError('You must set a DataFrame first.')
+
+        if tolerances is None:
+            west, south, east, north = self.data.total_bounds
+            max_tolerance = max(east - west, north - south) / 512
+            tolerances = [max_tolerance / 2**level for level in range(n_levels)]
+
+        geometry = self.data.geometry
+        self.__pyramid = [
+            (tolerance, self.__extract_coords(gpd.GeoDataFrame({'geom': geometry.simplify(tolerance, preserve_topology=False)}, geometry='geom', crs=self.data.crs)))
+            for tolerance in sorted(tolerances)
+        ]
+        self.__pixel_tolerance = pixel_tolerance
+        self.__level = None
+
+        # The full resolution (i.e., past the finest level) is served from the coordinates extracted at load time
+        if self.__coords is None:
+            self.__coords = self.__extract_coords(self.data)
+
+        if self.figure is not None:
+            self.__attach_simplification()
+
+
+    def __get_simplification_level(self):
+        """
+        Private Method for Selecting the pyramid's level that corresponds to the Canvas' current zoom level (None if no level is coarse enough).
+        """
+        if self.figure is None or self.figure.x_range.start is None or self.figure.x_range.end is None:
+            return None
+
+        width = getattr(self.figure, 'inner_width', None) or self.figure.plot_width or 600
+        pixel_size = abs(self.figure.x_range.end - self.figure.x_range.start) / width
+
+        levels = [level for level, (tolerance, _) in enumerate(self.__pyramid) if tolerance <= pixel_size * self.__pixel_tolerance]
+        return levels[-1] if levels else None
+
+
+    def __attach_simplification(self):
+        """
+        Private Method for Switching between the pyramid's levels whenever the Canvas' ranges are updated.
+        """
+        def on_ranges_update(*args):
+            level = self.__get_simplification_level()
+            if level == self.__level or self.__prepared_index is None or self.source is None or self.__suffix is None:
+                return
+            self.__level = level
+
+            index = self.__prepared_index
+            coords = self.__pyramid[level][1] if level is not None else self.__coords
+            coords = [coord.loc[index] for coord in coords]
+
+            # Both coordinates are sent as a single update, i.e., the browser never renders half-updated geometries
+            self.source.data.update({f'{coord_name}{self.__suffix}': coord.tolist() for coord_name, coord in zip(self.sp_columns, coords)})
+
+        if hasattr(bokeh_events, 'RangesUpdate'):
+            self.figure.on_event(bokeh_events.RangesUpdate, on_ranges_update)
+        else:
+            self.figure.x_range.on_change('end', on_ranges_update)
  
 
     def create_source(self, suffix='_merc'):
@@ -270,6 +619,9 @@ class st_visualizer:
         fig = figure(x_range=x_range, y_range=y_range, x_axis_type="mercator", y_axis_type="mercator", title=title, **kwargs)
         
         self.set_figure(fig)   
+
+        if self.__pyramid is not None:
+            self.__attach_simplification()
         
         if self.source is None:
             self.create_source(suffix)
@@ -354,6 +706,184 @@ class st_visualizer:
         return self.cmap
 
 
+    def add_derived_column(self, name, field, expression):
+        """
+        Declare a column that is derived (browser-side) from another column of the CDS, so that it does not need to be sent to the browser.
+        The derived column can then be used (by its name) as a Glyph's property (e.g., ```angle```) and within the Hover Tooltips, while 
+        its values can be displayed at a DataTable via ```get_derived_formatter```.
+            
+        Parameters
+        ----------
+        name: str
+            The derived column's name
+        field: str
+            The (existing) column of the CDS that the column is derived from
+        expression: str
+            A JavaScript expression of ```x``` (i.e., the value of ```field```; e.g., ```'270 - x'```) that computes the derived column's value
+        
+        Returns
+        -------
+        derived: Dict
+            The derived column (i.e., a Bokeh DataSpec using a CustomJSTransform)
+        """
+        func = f'x = Number(x); return ({expression});'
+        v_func = f'return Array.from(xs, (x) => {{ x = Number(x); return ({expression}); }});'
+
+        # The hovered value is the one of the derived column's field; its (numeric) format sets the number of decimal digits
+        hover_code = f'''const x = Number(value); const y = ({expression}); const d = (format || '').split('.')[1]; return d === undefined ? String(y) : y.toFixed(d.length);'''
+        template = f'<%= (function(x) {{{{ x = Number(x); return ({expression}); }}}})(value).toFixed({{decimals}}) %>'
+
+        self.derived_columns[name] = {'field': field, 'transform': bokeh_mdl.CustomJSTransform(func=func, v_func=v_func), 'hover': bokeh_mdl.CustomJSHover(code=hover_code), 'template': template}
+        return self.__get_derived_spec(name)
+
+
+    def add_encoded_column(self, name, field, factors):
+        """
+        Declare a (dictionary-encoded) categorical column, i.e., a column of the CDS (```field```) holds integer codes, which are mapped (browser-side) 
+        to their factors. Similarly to ```add_derived_column```, the decoded column can be used (by its name) as a Glyph's property and within the Hover Tooltips.
+            
+        Parameters
+        ----------
+        name: str
+            The decoded column's name
+        field: str
+            The (existing) column of the CDS that contains the codes
+        factors: bokeh.models.ColumnDataSource instance
+            A CDS whose ```'factor'``` column maps each code (i.e., row index) to its factor; it may be streamed (e.g., as new factors appear)
+        
+        Returns
+        -------
+        derived: Dict
+            The decoded column (i.e., a Bokeh DataSpec using a CustomJSTransform)
+        """
+        decode = "const f = factors.data['factor'][{0}]; return f === undefined ? '' : f;"
+        v_func = "const f = factors.data['factor']; return Array.from(xs, (x) => f[x] === undefined ? '' : f[x]);"
+
+        # DataTable formatters do not accept arguments; the factors' CDS is looked up (by id) among the page's documents
+        lookup = f"Bokeh.documents.map((doc) => doc.get_model_by_id('{factors.id}')).find((model) => model)"
+        template = f"<%= (function(x) {{{{ const f = {lookup}.data['factor'][x]; return f === undefined ? '' : f; }}}})(value) %>"
+
+        self.derived_columns[name] = {
+            'field': field, 
+            'transform': bokeh_mdl.CustomJSTransform(args={'factors': factors}, func=decode.format('x'), v_func=v_func), 
+            'hover': bokeh_mdl.CustomJSHover(args={'factors': factors}, code=decode.format('value')), 
+            'template': template
+        }
+        return self.__get_derived_spec(name)
+
+
+    def __get_derived_spec(self, name):
+        derived = self.derived_columns[name]
+        return {'field': derived['field'], 'transform': derived['transform']}
+
+
+    def __resolve_derived_columns(self, kwargs, glyph_type):
+        # Only the Glyph's DataSpecs are resolved (incl. their selection/hover/muted variants and the color/alpha aliases); other
+        # string arguments (e.g., ```legend_label```, ```name```) are passed as they are, even if they coincide with a derived column's name
+        glyph_class = getattr(bokeh_mdl, ''.join(part.capitalize() for part in glyph_type.split('_')), None)
+        if not isinstance(glyph_class, type):
+            glyph_class = bokeh_mdl.Scatter    # i.e., the markers' Glyph, as of Bokeh 2.4
+        dataspecs = glyph_class.dataspecs()
+
+        def is_dataspec(key):
+            key = re.sub(r'^(selection|nonselection|hover|muted)_', '', key)
+            return key in dataspecs or any(f'{visual}_{key}' in dataspecs for visual in ('fill', 'line', 'hatch'))
+
+        return {key: self.__get_derived_spec(value) if isinstance(value, str) and value in self.derived_columns and is_dataspec(key) else value for key, value in kwargs.items()}
+
+
+    def get_derived_formatter(self, name, decimals=3):
+        """
+        Create a DataTable formatter that displays a derived (or decoded) column (the respective TableColumn's field must be the column's ```field```).
+            
+        Parameters
+        ----------
+        name: str
+            The derived column's name (consult ```add_derived_column``` and ```add_encoded_column```)
+        decimals: int (default: 3)
+            The number of decimal digits to display (numeric derived columns only)
+        
+        Returns
+        -------
+        formatter: bokeh.models.HTMLTemplateFormatter instance
+        """
+        return bokeh_mdl.HTMLTemplateFormatter(template=self.derived_columns[name]['template'].format(decimals=decimals))
+
+
+    def set_interpolation(self, temporal_name='ts', speed_name='speed', course_name='heading', horizon_ms=600000, frame_ms=1000):
+        """
+        Animate the Glyphs between updates (browser-side) via dead reckoning, i.e., every ```frame_ms``` the position of each moving object is 
+        extrapolated from its last reported position, speed (knots) and course (deg.), for at most ```horizon_ms``` since its last report. 
+        The browser's clock is synchronized with the server's via ```sync_interpolation```. Must be called after ```create_canvas```.
+            
+        Parameters
+        ----------
+        temporal_name: str (default: ```'ts'```)
+            The column name of the CDS that contains the reports' timestamp (in ms)
+        speed_name: str (default: ```'speed'```)
+            The column name of the CDS that contains the speed (in knots)
+        course_name: str (default: ```'heading'```)
+            The column name of the CDS that contains the course (in deg.; values >= 360 denote an unavailable course)
+        horizon_ms: int (default: 600000 -- 10 min.)
+            The (maximum) time that a position is extrapolated for
+        frame_ms: int (default: 1000)
+            The (browser-side) interval between two frames of the animation
+        
+        Returns
+        -------
+        interpolation: Dict
+            The extrapolated (x, y) DataSpecs, along with the clock's CDS
+        """
+        x_name, y_name = [f'{col}{self.__suffix}' for col in self.sp_columns]
+        clock = ColumnDataSource(data={'now': [pd.Timestamp.now(tz='UTC').value // 10**6]})
+
+        # The browser's clock is anchored to the server's on the first frame and on every sync; the animation's timer is started on the first frame
+        js_init = f'''
+            if (clock._dr === undefined) {{
+                clock._dr = {{server: clock.data['now'][0], local: performance.now()}};
+                setInterval(() => source.change.emit(), {int(frame_ms)});
+            }}
+            const now = clock._dr.server + (performance.now() - clock._dr.local);
+            const ts = source.data['{temporal_name}'], speed = source.data['{speed_name}'], course = source.data['{course_name}'], ys = source.data['{y_name}'];
+        '''
+        js_loop = '''
+            const out = new Float64Array(xs.length);
+            for (let i = 0; i < xs.length; i++) {{
+                const v = Number(speed[i]), c = Number(course[i]);
+                if (!(v > 0 && c >= 0 && c < 360)) {{ out[i] = Number(xs[i]); continue; }}
+                const dt = Math.min(Math.max(now - ts[i], 0), {horizon}) / 1000;
+                const lat = 2 * Math.atan(Math.exp(ys[i] / 6378137)) - Math.PI / 2;
+                out[i] = Number(xs[i]) + v * 0.514444 * dt / Math.cos(lat) * Math.{func}(c * Math.PI / 180);
+            }}
+            return out;
+        '''
+        args = {'source': self.source, 'clock': clock}
+
+        self.interpolation = {
+            'clock': clock,
+            'x': {'field': x_name, 'transform': bokeh_mdl.CustomJSTransform(args=args, v_func=js_init + js_loop.format(horizon=int(horizon_ms), func='sin'))},
+            'y': {'field': y_name, 'transform': bokeh_mdl.CustomJSTransform(args=args, v_func=js_init + js_loop.format(horizon=int(horizon_ms), func='cos'))},
+        }
+        clock.js_on_change('data', CustomJS(args=args, code='''clock._dr = {server: clock.data['now'][0], local: performance.now()};'''))
+
+        return self.interpolation
+
+
+    def sync_interpolation(self, now_ms=None):
+        """
+        Synchronize the browser's animation clock with the server's (consult ```set_interpolation```).
+            
+        Parameters
+        ----------
+        now_ms: int (default: None)
+            The current timestamp (in ms). If None, the server's (UTC) clock is used.
+        """
+        if self.interpolation is None:
+            return
+
+        self.interpolation['clock'].data = {'now': [pd.Timestamp.now(tz='UTC').value // 10**6 if now_ms is None else now_ms]}
+
+
     def add_glyph(self, glyph_type='circle', size=10, color='royalblue', sec_color='lightslategray', alpha=0.7, muted_alpha=0, **kwargs):
         """
         Add a Glyph to the Canvas
@@ -373,7 +903,8 @@ class st_visualizer:
         muted_alpha:float (values in [0,1] -- default: ```0```)
             The Glyph's alpha when disabled from the legend
         **kwargs: Dict
-            Other arguments related to the creation of a Glyph
+            Other arguments related to the creation of a Glyph (the names of derived columns are resolved; consult ```add_derived_column```).
+            If the interpolation is set (consult ```set_interpolation```), the Glyph is placed at the extrapolated positions
         
         Returns
         -------
@@ -384,6 +915,9 @@ class st_visualizer:
             raise ValueError(f'glyph_type must be one of the following: {ALLOWED_BASIC_GLYPH_TYPES}')
 
         coordinates = [f'{col}{self.__suffix}' for col in self.sp_columns]
+        if self.interpolation is not None:
+            coordinates = [self.interpolation['x'], self.interpolation['y']]
+        kwargs = self.__resolve_derived_columns(kwargs, glyph_type)
 
         renderer = getattr(self.figure, glyph_type)(*coordinates, size=size, color=color, nonselection_fill_color=sec_color, alpha=alpha, muted_alpha=muted_alpha, source=self.source, **kwargs)
         self.renderers.append(renderer)
@@ -391,7 +925,7 @@ class st_visualizer:
         return renderer
 
     
-    def add_line(self, line_type='multi_line', line_color="royalblue", line_width=5, alpha=0.7, muted_alpha=0, **kwargs):
+    def add_line(self, line_type='multi_line', line_color="royalblue", line_width=5, alpha=0.7, muted_alpha=0, source=None, **kwargs):
         """
         Add a PolyLine to the Canvas
             
@@ -407,6 +941,8 @@ class st_visualizer:
             The PolyLine's alpha
         muted_alpha:float (values in [0,1] -- default: ```0```)
             The Polyline's alpha when disabled from the legend
+        source: bokeh.models.ColumnDataSource instance (default: None)
+            The CDS that contains the PolyLine's coordinates. If None, the instance's CDS is used.
         **kwargs: Dict
             Other arguments related to the creation of a PolyLine
         
@@ -420,7 +956,7 @@ class st_visualizer:
 
         coordinates = [f'{col}{self.__suffix}' for col in self.sp_columns]
 
-        renderer = getattr(self.figure, line_type)(*coordinates, source=self.source, line_color=line_color, line_width=line_width, alpha=alpha, muted_alpha=muted_alpha, **kwargs)
+        renderer = getattr(self.figure, line_type)(*coordinates, source=self.source if source is None else source, line_color=line_color, line_width=line_width, alpha=alpha, muted_alpha=muted_alpha, **kwargs)
         self.renderers.append(renderer)
 
         return renderer
@@ -472,7 +1008,100 @@ class st_visualizer:
         return renderer
         
     
-    def add_map_tile(self, provider, retina=True, level='underlay', **kwargs):
+    def add_raster(self, color='royalblue', alpha=0.8, level='glyph', **kwargs):
+        """
+        Render the (loaded) Points server-side, as a single RGBA image with the Canvas' dimensions. Unlike the glyphs, every point of the dataset is represented
+        (i.e., the instance's ```limit``` does not apply) and the size of the image sent to the Canvas depends only on the Canvas' dimensions. The image is 
+        re-rendered whenever the Canvas' ranges are updated or the data are filtered. If a colormap is set (via ```add_categorical_colormap``` or ```add_numerical_colormap```), 
+        the pixels are colored accordingly.
+            
+        Parameters
+        ----------
+        color: str or bokeh.colors instance (default: ```'royalblue'```)
+            The points' color (if no colormap is set)
+        alpha: float (values in [0,1] -- default: ```0.8```)
+            The (maximum) alpha of the non-empty pixels
+        level: str (default: ```'glyph'```)
+            The z-order of the rendered image
+        **kwargs: Dict
+            Other arguments related to the creation of the image (consult bokeh.plotting.figure.image_rgba method)
+        
+        Returns
+        -------
+        renderer: Bokeh image_rgba instance
+            The instance of the added image
+        """
+        if self.data is None or self.figure is None:
+            raise ValueError('You must set a DataFrame and create a Canvas first.')
+
+        if len(self.data) != 0 and not (self.data.geom_type == 'Point').all():
+            raise ValueError('Only Point geometries can be rasterized.')
+
+        if self.__coords is None:
+            self.__coords = self.__extract_coords(self.data)
+
+        source = ColumnDataSource(data={'image': [], 'x': [], 'y': [], 'dw': [], 'dh': []})
+        self.__raster = {'source': source, 'color': color, 'alpha': alpha}
+        self.__render_raster()
+
+        renderer = self.figure.image_rgba(image='image', x='x', y='y', dw='dw', dh='dh', source=source, level=level, **kwargs)
+        self.renderers.append(renderer)
+
+        if hasattr(bokeh_events, 'RangesUpdate'):
+            self.figure.on_event(bokeh_events.RangesUpdate, lambda event: self.__render_raster())
+        else:
+            self.figure.x_range.on_change('end', lambda attr, old, new: self.__render_raster())
+
+        return renderer
+
+
+    def refresh_raster(self, data=None, loaded_subset=False):
+        """
+        Re-render the rasterized Points (if ```add_raster``` has been called).
+
+        Parameters
+        ----------
+        data: GeoPandas GeoDataFrame (default: None)
+            The (e.g., filtered) Points to be rendered. If None, the latest rendered Points are used.
+        loaded_subset: boolean (default: False)
+            Whether ```data``` is derived from the loaded dataset (e.g., filtered), i.e., whether its coordinates extracted at load time are reused
+        """
+        if self.__raster is None:
+            return
+
+        if data is not None:
+            self.__raster_data = data
+            self.__raster_loaded_subset = loaded_subset
+
+        self.__render_raster()
+
+
+    def __render_raster(self):
+        """
+        Private Method for Rasterizing the current Points according to the Canvas' current ranges and dimensions.
+        """
+        data = self.data if self.__raster_data is None else self.__raster_data
+        loaded_subset = self.__raster_data is None or self.__raster_loaded_subset
+
+        if self.__coords is not None and loaded_subset and self.__is_loaded_subset(data):
+            x, y = [coord.loc[data.index].values for coord in self.__coords]
+        else:
+            x, y = [coord.values for coord in self.__extract_coords(data)] if len(data) != 0 else (np.empty(0), np.empty(0))
+
+        x_start, x_end = self.figure.x_range.start, self.figure.x_range.end
+        y_start, y_end = self.figure.y_range.start, self.figure.y_range.end
+        width = getattr(self.figure, 'inner_width', None) or self.figure.plot_width or 600
+        height = getattr(self.figure, 'inner_height', None) or self.figure.plot_height or 600
+
+        values, cmap = None, None
+        if self.cmap is not None:
+            values, cmap = data[self.cmap['field']].values, self.cmap['transform']
+
+        image = raster_helper.rasterize_points(x, y, (x_start, x_end), (y_start, y_end), width, height, color=self.__raster['color'], alpha=self.__raster['alpha'], values=values, cmap=cmap)
+        self.__raster['source'].data = {'image': [image], 'x': [x_start], 'y': [y_start], 'dw': [x_end - x_start], 'dh': [y_end - y_start]}
+
+
+    def add_map_tile(self, provider, retina=True, level='underlay', tile_server=None, **kwargs):
         """
         Add a Map Tile to the Canvas
             
@@ -484,6 +1113,8 @@ class st_visualizer:
             If True, tiles will be downloaded in Retina Resolution (some providers do not offer retina resolution)        
         level: str (default: ```'underlay'```)
             The z-order of the map tiles. 'underlay' means that the map tiles will be always at the back of the plot (i.e., z-order=0)
+        tile_server: str (default: None)
+            The base URL of a (local) caching tile server (e.g., ```'http://localhost:5007/tiles'```; consult ```tile_cache.py```). If None, tiles are downloaded from the provider
         **kwargs: Dict
             Other parameters related to the map tile creation
         """
@@ -499,6 +1130,9 @@ class st_visualizer:
             vendor = Vendors.STAMEN_TONER_LABELS
         
         tile_provider = get_provider(vendor)
+        if tile_server is not None:
+            tile_provider = bokeh_mdl.WMTSTileSource(url=f'{tile_server.rstrip("/")}/{vendor}/{{Z}}/{{X}}/{{Y}}.png', attribution=tile_provider.attribution)
+
         self.figure.add_tile(tile_provider, level=level, **kwargs)
 
     
@@ -509,12 +1143,24 @@ class st_visualizer:
         Parameters
         ----------
         tooltips: List
-            A list of tuples containing the label and the respective column name prefixed by ```@``` (e.g. [..., ('o_id', '@o_id_column'), ....])
+            A list of tuples containing the label and the respective column name prefixed by ```@``` (e.g. [..., ('o_id', '@o_id_column'), ....]).
+            Derived columns (consult ```add_derived_column``` and ```add_encoded_column```) are computed browser-side; the numeric format of derived columns (e.g., ```@lon{0.00}```) sets the number of decimal digits.
         **kwargs: Dict
             Other parameters related to the Hover Tool creation
         """
+        formatters = dict(kwargs.pop('formatters', {}))
+
+        for name, derived in self.derived_columns.items():
+            pattern = rf'@(?:{re.escape(name)}\b|\{{{re.escape(name)}\}})'
+            if not any(re.search(pattern, fmt) for _, fmt in tooltips):
+                continue
+
+            # The hovered value is the one of the derived column's field, which is transformed by the column's CustomJSHover
+            tooltips = [(label, re.sub(pattern, f'@{{{derived["field"]}}}', fmt)) for label, fmt in tooltips]
+            formatters[f'@{{{derived["field"]}}}'] = derived['hover']
+
         # Add the HoverTool to the figure
-        self.figure.add_tools(HoverTool(tooltips=tooltips, **kwargs))
+        self.figure.add_tools(HoverTool(tooltips=tooltips, formatters=formatters, **kwargs))
 
 
     def add_lasso_select(self, **kwargs):
@@ -585,7 +1231,7 @@ class st_visualizer:
                     self.callback_prepare_data(new_pts, self.widget.id==self.vsn_instance.aquire_canvas_data)
             callback_class = Callback
         
-        temp_filter.on_change(callback_policy, callback_class(self, temp_filter).callback)
+        temp_filter.on_change(callback_policy, TRACER.wrap('temporal_filter', callback_class(self, temp_filter).callback))
         self.widgets.append(temp_filter)
 
     
@@ -634,7 +1280,7 @@ class st_visualizer:
             
             callback_class = Callback
 
-        cat_filter.on_change('value', callback_class(self, cat_filter).callback)
+        cat_filter.on_change('value', TRACER.wrap('categorical_filter', callback_class(self, cat_filter).callback))
         self.widgets.append(cat_filter)
     
 
@@ -700,7 +1346,7 @@ class st_visualizer:
             
             callback_class = Callback
 
-        num_filter.on_change(callback_policy, callback_class(self, num_filter).callback)
+        num_filter.on_change(callback_policy, TRACER.wrap('numerical_filter', callback_class(self, num_filter).callback))
         self.widgets.append(num_filter)
     
 
@@ -0,0 +1,103 @@
+"""Per-Process Document Templates.
+
+   A model graph (e.g., a VISIONS Canvas along with its Glyphs, Tools and Widgets) is built once per process and serialized, so that
+   every (subsequent) session's Document is created by deserializing it instead of rebuilding it. Bokeh models cannot be shared among
+   Documents; every instantiation creates new models (with the template's IDs, which are unique within each Document). Python callbacks
+   are not part of the template, i.e., they must be attached per session.
+
+   Bokeh does not resolve the references within untyped (i.e., ``AnyRef``) properties upon deserialization (e.g., the ``args`` of a
+   ``CustomJS``/``CustomJSTransform``), nor keeps the models that are only referenced by them (e.g., the interpolation's clock); the
+   template deserializes its models (as ``Document.from_json`` does) and resolves them itself.
+"""
+
+
+import json
+
+from bokeh.document.util import instantiate_references_json, initialize_references_json
+
+
+def resolve_references(value, references):
+    """
+    Replace the (serialized) model references (i.e., ```{'id': ...}```) within a property's value with the (deserialized) models.
+    """
+    if isinstance(value, dict):
+        if set(value.keys()) == {'id'}:
+            return references.get(value['id'], value)
+        return {key: resolve_references(val, references) for key, val in value.items()}
+    if isinstance(value, list):
+        return [resolve_references(val, references) for val in value]
+    return value
+
+
+class DocumentTemplate:
+    def __init__(self):
+        '''
+        Constructor for the DocumentTemplate Class.
+        '''
+        self.spec = None
+        self.model_ids = {}
+
+
+    @property
+    def ready(self):
+        return self.spec is not None
+
+
+    def capture(self, doc, **models):
+        """
+        Serialize a (fully built) Document as the template. Must be called prior to attaching any per-session state (e.g., data) to it.
+
+        Parameters
+        ----------
+        doc: bokeh.document.Document
+            The Document to be captured
+        **models: Dict
+            The models that are needed per session (e.g., to attach callbacks or to update them), by name
+        """
+        self.spec = json.dumps(doc.to_json())
+        self.model_ids = {name: model.id for name, model in models.items() if model is not None}
+
+
+    def instantiate(self, doc):
+        """
+        Create (a copy of) the template's models at a Document, i.e., add the template's roots to it.
+
+        Parameters
+        ----------
+        doc: bokeh.document.Document
+            The (empty) Document of the session
+
+        Returns
+        -------
+        Dict (name -> model; consult ```capture```)
+        """
+        if not self.ready:
+            raise ValueError('The template must be captured first.')
+
+        spec = json.loads(self.spec)
+        references_json = spec['roots']['references']
+        references = instantiate_references_json(references_json, {})
+        initialize_references_json(references_json, references)
+
+        for model in references.values():
+            args = getattr(model, 'args', None)
+            if isinstance(args, dict):
+                model.args = resolve_references(args, references)
+
+        for root_id in spec['roots']['root_ids']:
+            doc.add_root(references[root_id])
+
+        models = {name: references[model_id] for name, model_id in self.model_ids.items()}
+
+        return models
+
+
+# The process-wide templates (e.g., one per page layout), by name
+TEMPLATES = {}
+
+
+def get_template(name):
+    """
+    Get (or create) the process-wide template of a page layout.
+    """
+    return TEMPLATES.setdefault(name, DocumentTemplate())
@@ -0,0 +1,282 @@
+"""Opt-in Tracing of the VISIONS Callbacks and of the Bokeh Server's Document Patches.
+
+   Spans (e.g., filtering, ``prepare_data``, source updates, and the patches' serialization and websocket writes) are kept in a bounded
+   ring buffer, exported as Chrome trace-event JSON (i.e., loadable at ``chrome://tracing`` or Perfetto), along with rolling per-span
+   duration windows (for percentiles). While disabled (the default), a span costs a single attribute lookup.
+"""
+
+
+import os
+import io
+import sys
+import time
+import pstats
+import cProfile
+import functools
+import threading
+from collections import deque, Counter
+
+import numpy as np
+
+
+TRACE_MAX_EVENTS = 100000
+TRACE_WINDOW = 1024
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer, name, args):
+        self.tracer, self.name, self.args = tracer, name, args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, self.start, time.perf_counter_ns() - self.start, self.args)
+        return False
+
+
+class Tracer:
+    def __init__(self, enabled=False, max_events=TRACE_MAX_EVENTS, window=TRACE_WINDOW):
+        '''
+        Constructor for the Tracer Class.
+          * enabled: Whether spans are recorded
+          * max_events: The (maximum) number of spans that are kept for the Chrome trace (the oldest are dropped once exceeded)
+          * window: The (maximum) number of durations per span name that the percentiles are computed on
+        '''
+        self.enabled = enabled
+        self.events = deque(maxlen=max_events)
+        self.window = window
+        self.durations = {}
+        self.origin_ns = time.perf_counter_ns()
+        self._profile = None
+
+
+    def span(self, name, **args):
+        """
+        Time a block of code (i.e., ```with tracer.span('prepare_data'): ...```).
+
+        Parameters
+        ----------
+        name: str
+            The span's name
+        **args: Dict
+            Other (JSON-serializable) information to be attached to the span's trace event
+
+        Returns
+        -------
+        A context manager
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+
+        return _Span(self, name, args)
+
+
+    def wrap(self, name, function):
+        """
+        Time every call of a function (e.g., a Bokeh callback); the wrapper retains the function's signature.
+
+        Parameters
+        ----------
+        name: str
+            The span's name
+        function: Callable
+            The function to be timed
+
+        Returns
+        -------
+        Callable
+        """
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with self.span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+
+    def record(self, name, start_ns, duration_ns, args=None):
+        """
+        Record a (finished) span; consult ```span```.
+        """
+        self.events.append((name, start_ns, duration_ns, threading.get_ident(), args))
+
+        window = self.durations.get(name)
+        if window is None:
+            window = self.durations.setdefault(name, deque(maxlen=self.window))
+        window.append(duration_ns)
+
+
+    def stats(self, percentiles=(50, 90, 99)):
+        """
+        The rolling percentiles (in ms) of every span's duration.
+
+        Parameters
+        ----------
+        percentiles: Tuple (default: ```(50, 90, 99)```)
+            The percentiles to be computed
+
+        Returns
+        -------
+        Dict (span name -> ```{'count': ..., 'p50': ..., ...}```)
+        """
+        stats = {}
+        for name, window in list(self.durations.items()):
+            durations = np.array(window, dtype=np.float64) / 1e6
+            if len(durations) == 0:
+                continue
+            stats[name] = {'count': len(durations), **{f'p{q}': float(value) for q, value in zip(percentiles, np.percentile(durations, percentiles))}}
+
+        return stats
+
+
+    def to_chrome_trace(self):
+        """
+        Export the recorded spans as Chrome trace-event JSON (i.e., complete -- ```'X'``` -- events, timestamped in μs).
+
+        Returns
+        -------
+        Dict
+        """
+        pid = os.getpid()
+        events = [
+            {'name': name, 'ph': 'X', 'ts': (start_ns - self.origin_ns) / 1e3, 'dur': duration_ns / 1e3, 'pid': pid, 'tid': tid, 'args': args or {}}
+            for name, start_ns, duration_ns, tid, args in list(self.events)
+        ]
+
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+    def clear(self):
+        self.events.clear()
+        self.durations.clear()
+
+
+    def start_profile(self):
+        """
+        Start profiling (via cProfile) the calling thread, e.g., the Bokeh Server's IOLoop; consult ```stop_profile```.
+        """
+        if self._profile is not None:
+            raise ValueError('A profile is already being captured')
+
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+
+    def stop_profile(self, sort='cumulative', limit=50):
+        """
+        Stop profiling, and return the profile's statistics (as text).
+
+        Parameters
+        ----------
+        sort: str (default: ```'cumulative'```)
+            The key that the functions are sorted by (consult ```pstats.Stats.sort_stats```)
+        limit: int (default: 50)
+            The number of functions to be reported
+
+        Returns
+        -------
+        str
+        """
+        profile, self._profile = self._profile, None
+        if profile is None:
+            raise ValueError('No profile is being captured')
+
+        profile.disable()
+        output = io.StringIO()
+        pstats.Stats(profile, stream=output).sort_stats(sort).print_stats(limit)
+
+        return output.getvalue()
+
+
+def sample_stacks(duration=5.0, interval=0.005, thread_id=None):
+    """
+    Sample the stacks of a running thread (or of every other thread) at a fixed interval (i.e., a statistical profile that does not slow
+    down the sampled code). Must be called from a thread other than the sampled one(s).
+
+    Parameters
+    ----------
+    duration: float (default: 5.0)
+        The duration (in seconds) of the sampling
+    interval: float (default: 0.005)
+        The interval (in seconds) between two samples
+    thread_id: int (default: None)
+        The identifier of the sampled thread (if None, every thread except for the calling one is sampled)
+
+    Returns
+    -------
+    collections.Counter (collapsed stack, i.e., ```'module:function;...'``` from the root frame -> number of samples; i.e., the input of flamegraph.pl)
+    """
+    own_id = threading.get_ident()
+    samples = Counter()
+    end = time.perf_counter() + duration
+
+    while time.perf_counter() < end:
+        for frame_thread_id, frame in sys._current_frames().items():
+            if frame_thread_id == own_id or (thread_id is not None and frame_thread_id != thread_id):
+                continue
+
+            stack = []
+            while frame is not None:
+                stack.append(f'{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}')
+                frame = frame.f_back
+            samples[';'.join(reversed(stack))] += 1
+
+        time.sleep(interval)
+
+    return samples
+
+
+def instrument_bokeh_server(tracer):
+    """
+    Trace the Bokeh Server's document patches, i.e., their serialization (```serialize_patch```) and their write to the websocket
+    (```websocket_write```). Instruments the (process-wide) ServerConnection class once.
+
+    Parameters
+    ----------
+    tracer: Tracer
+        The tracer that the spans are recorded to
+    """
+    from bokeh.server.connection import ServerConnection
+
+    if getattr(ServerConnection.send_patch_document, '_traced', False):
+        return
+
+    send_patch_document = ServerConnection.send_patch_document
+
+    async def write(pending, start_ns):
+        try:
+            return await pending
+        finally:
+            tracer.record('websocket_write', start_ns, time.perf_counter_ns() - start_ns)
+
+    @functools.wraps(send_patch_document)
+    def traced_send_patch_document(self, event):
+        if not tracer.enabled:
+            return send_patch_document(self, event)
+
+        with tracer.span('serialize_patch'):
+            pending = send_patch_document(self, event)
+
+        # The write is performed once the (pending) coroutine is awaited, i.e., after the document lock is released
+        return write(pending, time.perf_counter_ns()) if hasattr(pending, '__await__') else pending
+
+    traced_send_patch_document._traced = True
+    ServerConnection.send_patch_document = traced_send_patch_document
+
+
+TRACER = Tracer()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+
+"""Local (caching) Map Tile Server.
+
+   Serves ``/{provider}/{z}/{x}/{y}.png`` map tiles from a size-bounded (LRU) disk cache. Tiles that are not cached are fetched from
+   the provider's upstream server (once, even if they are requested concurrently by many sessions). Point ``add_map_tile`` at it
+   (via ``tile_server``) so that every session shares the same tiles, and the map still renders when the upstream is unreachable.
+
+   Several processes may share a cache directory (e.g., the workers of the multi-process deployment; consult serve.py): every process
+   indexes (and evicts) the tiles it has served within its own ``max_bytes`` (i.e., the directory is bounded by their sum), whereas the
+   tiles that other processes have cached are served from disk instead of being fetched again.
+
+   Usage (standalone): python tile_cache.py --cache-dir ./tiles --port 5007 --prefetch-bbox 23.3,37.8,23.8,38.1 --prefetch-zooms 8-14
+"""
+
+
+import os
+import re
+import math
+import asyncio
+import argparse
+from collections import OrderedDict
+from threading import Lock
+
+from tornado.web import Application, RequestHandler, HTTPError
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+from tornado.ioloop import IOLoop
+
+from bokeh.tile_providers import get_provider
+
+
+TILE_CACHE_MAX_BYTES = 512 * 2**20
+TILE_CACHE_PREFIX = '/tiles'
+TILE_PATH_PATTERN = r'/(?P<provider>[A-Z_]+)/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)\.png'
+TILE_CLIENT_MAX_AGE = 86400
+
+
+def lonlat_to_tile(lon: float, lat: float, zoom: int):
+    """
+    Return the (x, y) index of the (Web Mercator) tile that contains a WGS84 location at the given zoom level.
+    """
+    n = 2 ** zoom
+    lat = max(min(lat, 85.0511), -85.0511)
+
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tiles_in_bbox(bbox: tuple, zooms):
+    """
+    Yield the (z, x, y) index of every tile that intersects a WGS84 bbox (min_lon, min_lat, max_lon, max_lat), for every zoom level.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+
+    for z in zooms:
+        x0, y0 = lonlat_to_tile(min_lon, max_lat, z)
+        x1, y1 = lonlat_to_tile(max_lon, min_lat, z)
+
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield z, x, y
+
+
+def parse_zooms(zooms: str):
+    """
+    Parse a zoom range (e.g., ``'8-14'``) or a comma-separated list of zoom levels (e.g., ``'8,10,12'``).
+    """
+    if '-' in zooms:
+        low, high = zooms.split('-')
+        return list(range(int(low), int(high) + 1))
+
+    return [int(z) for z in zooms.split(',')]
+
+
+def parse_bbox(bbox: str):
+    return tuple(float(v) for v in bbox.split(','))
+
+
+class TileCache:
+    def __init__(self, root: str, max_bytes: int = TILE_CACHE_MAX_BYTES, upstreams: dict = None, timeout: float = 10.0):
+        """
+        root: The directory where the tiles are cached
+        max_bytes: The (maximum) size of the cache; the least recently used tiles are evicted once exceeded
+        upstreams: URL templates (``{z}``, ``{x}``, ``{y}``) that override the providers' upstream servers (e.g., a stand-in upstream)
+        timeout: The timeout (in sec.) of every upstream request
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.upstreams = dict(upstreams or {})
+        self.timeout = timeout
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()    # path -> size; least recently used first
+        self._size = 0
+        self._lock = Lock()
+        self._pending = {}               # (provider, z, x, y) -> upstream request in-flight
+
+        os.makedirs(root, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        # The modification time of a tile is updated on every hit, so that the LRU order survives restarts
+        tiles = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if re.search(r'\.tmp(-\d+)?$', filename):
+                    os.remove(path)
+                    continue
+                stat = os.stat(path)
+                tiles.append((stat.st_mtime_ns, path, stat.st_size))
+
+        for _, path, size in sorted(tiles):
+            self._entries[path] = size
+            self._size += size
+
+        with self._lock:
+            self._evict()
+
+    @property
+    def size(self):
+        return self._size
+
+    def _path(self, provider: str, z: int, x: int, y: int):
+        return os.path.join(self.root, provider, str(z), str(x), f'{y}.png')
+
+    def upstream_url(self, provider: str, z: int, x: int, y: int):
+        template = self.upstreams[provider] if provider in self.upstreams else get_provider(provider).url
+        values = {'z': str(z), 'x': str(x), 'y': str(y)}
+
+        # Older Bokeh versions use uppercase placeholders (i.e., {Z}/{X}/{Y})
+        return re.sub(r'\{([xyzXYZ])\}', lambda m: values[m.group(1).lower()], template)
+
+    def get_cached(self, provider: str, z: int, x: int, y: int):
+        path = self._path(provider, z, x, y)
+
+        with self._lock:
+            if path in self._entries:
+                self._entries.move_to_end(path)
+            else:
+                # i.e., cached by another process that shares the directory
+                try:
+                    size = os.stat(path).st_size
+                except FileNotFoundError:
+                    return None
+                self._entries[path] = size
+                self._size += size
+                self._evict()
+
+        try:
+            with open(path, 'rb') as f:
+                tile = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._size -= self._entries.pop(path, 0)
+            return None
+
+        return tile
+
+    def put(self, provider: str, z: int, x: int, y: int, tile: bytes):
+        path = self._path(provider, z, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # The temporary file is per process, i.e., processes that share the directory may write the same tile concurrently
+        tmp_path = f'{path}.tmp-{os.getpid()}'
+        with open(tmp_path, 'wb') as f:
+            f.write(tile)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._size += len(tile) - self._entries.pop(path, 0)
+            self._entries[path] = len(tile)
+            self._evict()
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._entries:
+            path, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def is_cached(self, provider: str, z: int, x: int, y: int):
+        path = self._path(provider, z, x, y)
+        return path in self._entries or os.path.exists(path)
+
+    async def _fetch(self, provider: str, z: int, x: int, y: int):
+        response = await AsyncHTTPClient().fetch(self.upstream_url(provider, z, x, y), request_timeout=self.timeout)
+        self.put(provider, z, x, y, response.body)
+        return response.body
+
+    async def get(self, provider: str, z: int, x: int, y: int):
+        """
+        Return a tile, either from the cache or from the upstream server. Raises ``ValueError`` for unknown providers,
+        and ``tornado.httpclient.HTTPClientError`` (or ``OSError``) if the upstream request fails.
+        """
+        tile = self.get_cached(provider, z, x, y)
+        if tile is not None:
+            self.hits += 1
+            return tile
+
+        self.misses += 1
+        key = (provider, z, x, y)
+
+        request = self._pending.get(key)
+        if request is None:
+            request = self._pending[key] = asyncio.ensure_future(self._fetch(provider, z, x, y))
+            request.add_done_callback(lambda _: self._pending.pop(key, None))
+
+        return await asyncio.shield(request)
+
+    async def prefetch(self, provider: str, bbox: tuple, zooms, concurrency: int = 8):
+        """
+        Cache every (not already cached) tile that intersects a WGS84 bbox (min_lon, min_lat, max_lon, max_lat), for every zoom level.
+        Returns the number of tiles that were fetched.
+        """
+        tiles = [tile for tile in tiles_in_bbox(bbox, zooms) if not self.is_cached(provider, *tile)]
+        fetched = 0
+
+        for i in range(0, len(tiles), concurrency):
+            results = await asyncio.gather(*[self.get(provider, *tile) for tile in tiles[i:i + concurrency]], return_exceptions=True)
+            failed = [r for r in results if isinstance(r, Exception)]
+            fetched += len(results) - len(failed)
+
+            if failed:
+                print(f'Tile prefetch: {len(failed)} tile(s) failed ({failed[0]})')
+
+        print(f'Tile prefetch: {fetched} tile(s) of {provider} cached ({self._size / 2**20:.1f} MB)')
+        return fetched
+
+
+class TileHandler(RequestHandler):
+    def initialize(self, cache: TileCache):
+        self.cache = cache
+
+    async def get(self, provider: str, z: str, x: str, y: str):
+        try:
+            tile = await self.cache.get(provider, int(z), int(x), int(y))
+        except ValueError:
+            raise HTTPError(404, f'Unknown tile provider {provider}')
+        except HTTPClientError as e:
+            raise HTTPError(404 if e.code == 404 else 502, f'Upstream error: {e}')
+        except OSError as e:
+            raise HTTPError(502, f'Upstream unreachable: {e}')
+
+        self.set_header('Content-Type', 'image/png' if tile.startswith(b'\x89PNG') else 'image/jpeg')
+        self.set_header('Cache-Control', f'public, max-age={TILE_CLIENT_MAX_AGE}')
+        self.set_header('Access-Control-Allow-Origin', '*')
+        self.write(tile)
+
+
+def tile_cache_patterns(cache: TileCache, prefix: str = TILE_CACHE_PREFIX):
+    """
+    Return the URL patterns of the tile server (e.g., to be mounted as ``extra_patterns`` of a Bokeh Server).
+    """
+    return [(f'{prefix}{TILE_PATH_PATTERN}', TileHandler, {'cache': cache})]
+
+
+def start_tile_server(cache: TileCache, port: int, prefix: str = TILE_CACHE_PREFIX, prefetch_provider: str = None, prefetch_bbox: tuple = None, prefetch_zooms=()):
+    """
+    Start serving the tiles on the current IOLoop (e.g., the Bokeh Server's) and, optionally, prefetch a bbox/zoom range in the background.
+    """
+    app = Application(tile_cache_patterns(cache, prefix))
+    app.listen(port)
+    print(f'Tile server: serving {cache.root} at :{port}{prefix}')
+
+    if prefetch_provider and prefetch_bbox:
+        IOLoop.current().spawn_callback(cache.prefetch, prefetch_provider, prefetch_bbox, prefetch_zooms)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local (caching) Map Tile Server')
+    parser.add_argument('--cache-dir', required=True, help='The directory where the tiles are cached')
+    parser.add_argument('--port', type=int, default=5007)
+    parser.add_argument('--prefix', default=TILE_CACHE_PREFIX)
+    parser.add_argument('--max-mb', type=int, default=TILE_CACHE_MAX_BYTES // 2**20, help='The (maximum) size of the cache (in MB)')
+    parser.add_argument('--upstream', action='append', default=[], metavar='PROVIDER=URL', help='Override the upstream server of a provider (e.g., CARTODBPOSITRON_RETINA=http://localhost:8000/{z}/{x}/{y}.png)')
+    parser.add_argument('--prefetch-provider', default='CARTODBPOSITRON_RETINA')
+    parser.add_argument('--prefetch-bbox', type=parse_bbox, default=None, metavar='MIN_LON,MIN_LAT,MAX_LON,MAX_LAT')
+    parser.add_argument('--prefetch-zooms', type=parse_zooms, default=[], metavar='MIN-MAX')
+    args = parser.parse_args()
+
+    upstreams = dict(upstream.split('=', 1) for upstream in args.upstream)
+    cache = TileCache(args.cache_dir, max_bytes=args.max_mb * 2**20, upstreams=upstreams)
+
+    start_tile_server(cache, args.port, args.prefix, args.prefetch_provider, args.prefetch_bbox, args.prefetch_zooms)
+    IOLoop.current().start()
+
+
+if __name__ == '__main__':
+    main()
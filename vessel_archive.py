@@ -0,0 +1,182 @@
+"""Time-partitioned, memory-mapped archive of historical AIS positions.
+
+   Every partition holds the positions of a fixed time span (default: 1 hr.) as fixed-width binary records. Partitions that are still
+   being appended to (``.open``) are kept in arrival order, while closed partitions are sealed (``.bin``), i.e., sorted by timestamp,
+   so that any time window can be located via binary search without loading the archive into memory.
+"""
+
+
+import os
+import glob
+import time
+from threading import Lock
+
+import numpy as np
+
+
+ARCHIVE_RECORD_DTYPE = np.dtype([('mmsi', '<u4'), ('ts', '<i8'), ('x', '<f8'), ('y', '<f8'), ('speed', '<f4'), ('heading', '<f4')])
+ARCHIVE_PARTITION_MS = 3_600_000
+ARCHIVE_OPEN_SUFFIX = '.open'
+ARCHIVE_SEALED_SUFFIX = '.bin'
+
+
+class VesselArchive:
+    def __init__(self, root: str, partition_ms: int = ARCHIVE_PARTITION_MS, buffer_size: int = 4096):
+        """
+        root: The directory where the archive's partitions are stored
+        partition_ms: The time span (in ms) covered by each partition
+        buffer_size: The number of records that are buffered in memory before being appended to disk
+        """
+        self.root = root
+        self.partition_ms = partition_ms
+
+        self._buffer = np.zeros(buffer_size, dtype=ARCHIVE_RECORD_DTYPE)
+        self._buffered = 0
+        self._lock = Lock()
+
+        os.makedirs(root, exist_ok=True)
+
+    def _partition_path(self, start_ms: int, suffix: str):
+        return os.path.join(self.root, f'{start_ms:016d}{suffix}')
+
+    def append(self, mmsi: int, ts: int, x: float, y: float, speed: float, heading: float):
+        with self._lock:
+            self._buffer[self._buffered] = (mmsi, ts, x, y, speed, heading)
+            self._buffered += 1
+
+            if self._buffered == len(self._buffer):
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._buffered == 0:
+            return
+
+        records = self._buffer[:self._buffered]
+        partitions = records['ts'] - (records['ts'] % self.partition_ms)
+
+        for start_ms in np.unique(partitions):
+            sealed_path = self._partition_path(start_ms, ARCHIVE_SEALED_SUFFIX)
+            if os.path.exists(sealed_path):
+                # Late record for an already sealed partition; re-open it (it is going to be re-sealed)
+                os.replace(sealed_path, self._partition_path(start_ms, ARCHIVE_OPEN_SUFFIX))
+
+            with open(self._partition_path(start_ms, ARCHIVE_OPEN_SUFFIX), 'ab') as f:
+                f.write(records[partitions == start_ms].tobytes())
+
+        self._buffered = 0
+
+    def seal(self, now_ms: int = None, grace_ms: int = 60_000):
+        """
+        Sort (by timestamp) every open partition that ended at least ``grace_ms`` ago.
+        """
+        now_ms = int(time.time_ns() // 1_000_000) if now_ms is None else now_ms
+
+        with self._lock:
+            self._flush()
+
+            for start_ms, path in self._list_partitions(ARCHIVE_OPEN_SUFFIX):
+                if start_ms + self.partition_ms + grace_ms > now_ms:
+                    continue
+
+                records = np.fromfile(path, dtype=ARCHIVE_RECORD_DTYPE)
+                records = records[np.argsort(records['ts'], kind='stable')]
+
+                sealed_path = self._partition_path(start_ms, ARCHIVE_SEALED_SUFFIX)
+                records.tofile(f'{sealed_path}.tmp')
+                os.replace(f'{sealed_path}.tmp', sealed_path)
+                os.remove(path)
+
+    def _list_partitions(self, suffix: str = None):
+        partitions = {}
+
+        for path in glob.glob(os.path.join(self.root, '*')):
+            name, ext = os.path.splitext(os.path.basename(path))
+            if ext not in (ARCHIVE_OPEN_SUFFIX, ARCHIVE_SEALED_SUFFIX) or (suffix is not None and ext != suffix):
+                continue
+            # A partition that is being sealed may momentarily exist in both forms; the sealed one takes precedence
+            if ext == ARCHIVE_OPEN_SUFFIX and int(name) in partitions:
+                continue
+            partitions[int(name)] = path
+
+        return sorted(partitions.items())
+
+    @staticmethod
+    def _open_partition(path: str):
+        n_records = os.path.getsize(path) // ARCHIVE_RECORD_DTYPE.itemsize
+        if n_records == 0:
+            return None
+
+        return np.memmap(path, dtype=ARCHIVE_RECORD_DTYPE, mode='r', shape=(n_records,))
+
+    def extent(self):
+        """
+        Return the (min, max) timestamp of the archive, or None if the archive is empty.
+        """
+        bounds = []
+
+        for _, path in self._list_partitions():
+            try:
+                records = self._open_partition(path)
+            except FileNotFoundError:
+                continue
+            if records is None:
+                continue
+
+            if path.endswith(ARCHIVE_SEALED_SUFFIX):
+                bounds.extend([records['ts'][0], records['ts'][-1]])
+            else:
+                bounds.extend([records['ts'].min(), records['ts'].max()])
+
+        return (int(min(bounds)), int(max(bounds))) if bounds else None
+
+    def query(self, start_ms: int, end_ms: int):
+        """
+        Return (a copy of) the records whose timestamp lies within [start_ms, end_ms]. Only the partitions that overlap with the window are touched.
+        """
+        chunks = []
+
+        for partition_start, path in self._list_partitions():
+            if partition_start > end_ms or partition_start + self.partition_ms <= start_ms:
+                continue
+
+            try:
+                records = self._open_partition(path)
+            except FileNotFoundError:
+                continue
+            if records is None:
+                continue
+
+            if path.endswith(ARCHIVE_SEALED_SUFFIX):
+                lo = np.searchsorted(records['ts'], start_ms, side='left')
+                hi = np.searchsorted(records['ts'], end_ms, side='right')
+                chunks.append(np.array(records[lo:hi]))
+            else:
+                ts = records['ts']
+                chunks.append(np.array(records[(ts >= start_ms) & (ts <= end_ms)]))
+
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=ARCHIVE_RECORD_DTYPE)
+
+    def state_at(self, ts_ms: int, moving_ttl: int, stationary_ttl: int, start_ms: int = None):
+        """
+        Return the latest record (per MMSI) at instant ``ts_ms``. Similarly to the live map, records of moving (stationary) vessels older than
+        ``moving_ttl`` (``stationary_ttl``) ms are considered expired. If ``start_ms`` is set, records older than it are also ignored.
+        """
+        window_start = ts_ms - max(moving_ttl, stationary_ttl)
+        window_start = window_start if start_ms is None else max(window_start, start_ms)
+
+        records = self.query(window_start, ts_ms)
+        if len(records) == 0:
+            return records
+
+        records = records[np.lexsort((records['ts'], records['mmsi']))]
+        latest = np.append(records['mmsi'][1:] != records['mmsi'][:-1], True)
+        records = records[latest]
+
+        age = ts_ms - records['ts']
+        alive = np.where(records['speed'] > 0, age <= moving_ttl, age <= stationary_ttl)
+
+        return records[alive]
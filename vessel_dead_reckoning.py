@@ -0,0 +1,85 @@
+"""Server-side Dead Reckoning of the Vessels' Positions.
+
+   Mirrors the browser-side interpolation (consult ``st_visualizer.set_interpolation``): the position of a moving vessel is extrapolated
+   from the last report that was sent to the browser, using its speed (knots) and heading (deg.). A new report is only sent when the
+   extrapolated position deviates from the reported one by more than ``threshold_m`` meters, when the vessel's movement status changes,
+   or when ``max_interval_ms`` have elapsed since the last report that was sent.
+"""
+
+
+import math
+
+import numpy as np
+
+
+EARTH_RADIUS = 6378137.0
+KNOTS_TO_MS = 0.514444
+
+
+def dead_reckon(ts: float, x: float, y: float, speed: float, heading: float, now_ms: float, horizon_ms: float):
+    """
+    Extrapolate a (Web Mercator) position to instant ``now_ms``. Vessels without a valid heading (i.e., >= 360) or speed are not extrapolated.
+    """
+    if not (speed > 0 and 0 <= heading < 360):
+        return x, y
+
+    dt = min(max(now_ms - ts, 0), horizon_ms) / 1000
+    lat = 2 * math.atan(math.exp(y / EARTH_RADIUS)) - math.pi / 2
+    distance = speed * KNOTS_TO_MS * dt / math.cos(lat)    # Web Mercator distances are inflated by 1/cos(lat)
+
+    return x + distance * math.sin(math.radians(heading)), y + distance * math.cos(math.radians(heading))
+
+
+class DeadReckoning:
+    def __init__(self, threshold_m: float = 50.0, max_interval_ms: int = 60_000, horizon_ms: int = 600_000, capacity: int = 1024):
+        """
+        threshold_m: The (maximum) tolerated error (in meters) between the extrapolated and the reported position
+        max_interval_ms: The (maximum) time between two reports of the same vessel that are sent to the browser
+        horizon_ms: The (maximum) time that a position is extrapolated for; must match the browser-side interpolation
+        capacity: The initial number of vessels; doubled whenever exceeded
+        """
+        self.threshold_m = threshold_m
+        self.max_interval_ms = max_interval_ms
+        self.horizon_ms = horizon_ms
+
+        # The last report (per vessel) that was sent to the browser
+        self._sent = np.zeros(capacity, dtype=[('ts', 'i8'), ('x', 'f8'), ('y', 'f8'), ('speed', 'f8'), ('heading', 'f8'), ('valid', '?')])
+
+        self.sent = 0
+        self.suppressed = 0
+
+    def _ensure_capacity(self, idx: int):
+        capacity = len(self._sent)
+        if idx < capacity:
+            return
+
+        self._sent = np.concatenate([self._sent, np.zeros(max(capacity, idx + 1 - capacity), dtype=self._sent.dtype)])
+
+    def should_send(self, idx: int, ts: int, x: float, y: float, speed: float, heading: float):
+        """
+        Decide whether a (kinematic) report of the vessel at row ``idx`` needs to be sent to the browser; if so, it is recorded as sent.
+        """
+        self._ensure_capacity(idx)
+        last = self._sent[idx]
+
+        if last['valid'] and (last['speed'] > 0) == (speed > 0) and ts - last['ts'] < self.max_interval_ms:
+            pred_x, pred_y = dead_reckon(last['ts'], last['x'], last['y'], last['speed'], last['heading'], ts, self.horizon_ms)
+            lat = 2 * math.atan(math.exp(y / EARTH_RADIUS)) - math.pi / 2
+
+            if math.hypot(pred_x - x, pred_y - y) * math.cos(lat) <= self.threshold_m:
+                self.suppressed += 1
+                return False
+
+        self._sent[idx] = (ts, x, y, speed, heading, True)
+        self.sent += 1
+        return True
+
+    def compact(self, keep: list):
+        """
+        Drop the purged vessels, so as to remain aligned with the (compacted) live ColumnDataSource.
+        """
+        self._ensure_capacity(len(keep) - 1)
+        rows = np.flatnonzero(keep)
+
+        self._sent[:len(rows)] = self._sent[rows]
+        self._sent[len(rows):] = np.zeros(len(self._sent) - len(rows), dtype=self._sent.dtype)
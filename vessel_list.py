@@ -0,0 +1,190 @@
+"""Server-side Paginated and Sorted Vessel List (i.e., the DataTable's rows).
+
+   Instead of the whole live ColumnDataSource (which the browser would hold, sort and re-render on every patch), the DataTable is fed
+   by a (per-session) page source of ``page_size`` rows. The rows of the live ColumnDataSource are kept sorted (server-side) by MMSI,
+   timestamp and vessel name, i.e., one sorted list of ``(key, row)`` per sort key, which is maintained incrementally for the rows that
+   changed since the last flush. Only the page's rows (cells) that changed are patched to the page source.
+"""
+
+
+import math
+from bisect import bisect_left, insort
+
+from bokeh.models import ColumnDataSource, Select, RadioButtonGroup, Button, Div
+
+
+SORT_KEYS = [('ts', 'Timestamp'), ('mmsi', 'MMSI'), ('vessel_name', 'Vessel Name')]
+SORT_ORDERS = ['Ascending', 'Descending']
+
+
+class VesselList:
+    def __init__(self, source: ColumnDataSource, names: list, columns: list, page_size: int = 50, sort_by: str = 'ts', ascending: bool = False):
+        """
+        source: The live ColumnDataSource, i.e., the rows to be listed
+        names: The (append-only) vessel names, by code (consult ``vessel_metadata.VesselMetadata``)
+        columns: The columns of the live ColumnDataSource that are listed
+        page_size: The number of rows per page
+        """
+        self.map_source = source
+        self.names = names
+        self.columns = columns
+        self.page_size = page_size
+        self.sort_by = sort_by
+        self.ascending = ascending
+        self.page = 0
+
+        self._keys = {key: [] for key, _ in SORT_KEYS}      # The (current) sort keys, per row of the live ColumnDataSource ...
+        self._orders = {key: [] for key, _ in SORT_KEYS}    # ... and the rows, sorted by each key (i.e., as (key, row) tuples)
+        self._dirty = set()
+        self._rows = []                                     # The rows (of the live ColumnDataSource) of the page source
+        self._syncing_selection = False
+
+        self.source = ColumnDataSource(data={col: [] for col in columns})
+        self.sort_select = Select(title='Sort by', value=sort_by, options=SORT_KEYS, width=130)
+        self.order_buttons = RadioButtonGroup(labels=SORT_ORDERS, active=int(not ascending), width=170)
+        self.previous_button = Button(label='◀', width=40)
+        self.next_button = Button(label='▶', width=40)
+        self.page_label = Div(text='', width=150)
+
+    def get_models(self):
+        """
+        The models that are needed per Document, if the page is created from a template (consult ``template_helper``).
+        """
+        return {'list_source': self.source, 'list_sort_select': self.sort_select, 'list_order_buttons': self.order_buttons,
+                'list_previous_button': self.previous_button, 'list_next_button': self.next_button, 'list_page_label': self.page_label}
+
+    def set_models(self, models: dict, source: ColumnDataSource):
+        """
+        Bind the list to the models of a template's instantiation (consult ``get_models``), along with the (instantiated) live ColumnDataSource.
+        """
+        self.map_source = source
+        self.source, self.sort_select, self.order_buttons = models['list_source'], models['list_sort_select'], models['list_order_buttons']
+        self.previous_button, self.next_button, self.page_label = models['list_previous_button'], models['list_next_button'], models['list_page_label']
+
+    def attach(self):
+        """
+        Attach the (Python) callbacks of the controls and of the selection, i.e., per session.
+        """
+        self.sort_select.on_change('value', lambda attr, old, new: self.set_view(sort_by=new, page=0))
+        self.order_buttons.on_change('active', lambda attr, old, new: self.set_view(ascending=new == 0, page=0))
+        self.previous_button.on_click(lambda: self.set_view(page=self.page - 1))
+        self.next_button.on_click(lambda: self.set_view(page=self.page + 1))
+        self.source.selected.on_change('indices', self._on_page_selection)
+        self.map_source.selected.on_change('indices', lambda attr, old, new: self._sync_selection())
+
+    def _row_keys(self, data: dict, idx: int):
+        name_code = data['vessel_name_id'][idx]
+        return {'ts': data['ts'][idx], 'mmsi': int(data['mmsi'][idx]), 'vessel_name': self.names[name_code] if name_code < len(self.names) else ''}
+
+    def touch(self, idx: int):
+        """
+        Mark a row of the live ColumnDataSource as changed (or appended); its sort keys are updated on the next flush.
+        """
+        self._dirty.add(idx)
+
+    def rebuild(self):
+        """
+        Re-sort every row, e.g., once the live ColumnDataSource is replaced (loaded, compacted or played back), and render the page.
+        """
+        data = self.map_source.data
+        rows = [self._row_keys(data, idx) for idx in range(len(data['mmsi']))]
+
+        for key, _ in SORT_KEYS:
+            self._keys[key] = [row[key] for row in rows]
+            self._orders[key] = sorted(zip(self._keys[key], range(len(rows))))
+
+        self._dirty.clear()
+        self.render()
+
+    def compact(self, keep: list):
+        """
+        Drop the purged vessels, so as to remain aligned with the (compacted) live ColumnDataSource.
+        """
+        self.rebuild()
+
+    def flush(self, force: bool = False):
+        if not self._dirty and not force:
+            return
+
+        data = self.map_source.data
+        n_rows = len(data['mmsi'])
+
+        for idx in sorted(self._dirty):
+            if idx >= n_rows:
+                continue
+
+            keys = self._row_keys(data, idx)
+            for key, _ in SORT_KEYS:
+                values, order = self._keys[key], self._orders[key]
+                if idx < len(values):
+                    if values[idx] == keys[key]:
+                        continue
+                    del order[bisect_left(order, (values[idx], idx))]
+                    values[idx] = keys[key]
+                else:
+                    values.append(keys[key])
+                insort(order, (keys[key], idx))
+
+        self._dirty.clear()
+        self.render()
+
+    def set_view(self, sort_by: str = None, ascending: bool = None, page: int = None):
+        if sort_by is not None:
+            self.sort_by = sort_by
+        if ascending is not None:
+            self.ascending = ascending
+        if page is not None:
+            self.page = page
+
+        self.flush(force=True)
+
+    def render(self):
+        """
+        Update the page source to the current page, i.e., patch the cells that changed (or replace its data, if its length changed).
+        """
+        order = self._orders[self.sort_by]
+        n_pages = max(math.ceil(len(order) / self.page_size), 1)
+        self.page = min(max(self.page, 0), n_pages - 1)
+
+        start = self.page * self.page_size
+        if self.ascending:
+            rows = [idx for _, idx in order[start:start + self.page_size]]
+        else:
+            rows = [idx for _, idx in reversed(order[max(len(order) - start - self.page_size, 0):len(order) - start])]
+
+        data = self.map_source.data
+        page = {col: [data[col][idx] for idx in rows] for col in self.columns}
+
+        if len(rows) != len(self._rows):
+            self.source.data = page
+        else:
+            current = self.source.data
+            patches = {col: [(i, value) for i, (value, old) in enumerate(zip(page[col], current[col])) if value != old] for col in self.columns}
+            patches = {col: patch for col, patch in patches.items() if patch}
+            if patches:
+                self.source.patch(patches)
+        self._rows = rows
+
+        page_text = f'Page {self.page + 1} of {n_pages} ({len(order)} vessels)'
+        if self.page_label.text != page_text:
+            self.page_label.text = page_text
+
+        self._sync_selection()
+
+    def _sync_selection(self):
+        # The (listed) vessels that are selected at the map are selected at the page too
+        selected = set(self.map_source.selected.indices)
+        indices = [i for i, idx in enumerate(self._rows) if idx in selected]
+
+        if indices != list(self.source.selected.indices):
+            self._syncing_selection = True
+            try:
+                self.source.selected.indices = indices
+            finally:
+                self._syncing_selection = False
+
+    def _on_page_selection(self, attr, old, new):
+        # The vessels that are selected at the page are selected at the map
+        if self._syncing_selection:
+            return
+        self.map_source.selected.indices = [self._rows[i] for i in new if i < len(self._rows)]
@@ -0,0 +1,239 @@
+"""Process-wide (i.e., shared among sessions) Cache of the Vessels' Static Information.
+
+   Vessel names and types are dictionary-encoded: every distinct name (type) is assigned an integer code, and sessions send the codes
+   instead of the strings, along with the (append-only) list of factors that maps them back (browser-side). Static reports are cached
+   per MMSI (bounded LRU), regardless of whether the vessel has been positioned yet, so that its first position is displayed along with
+   its static information. Once the factors outgrow ``factor_capacity``, they are compacted to the ones of the cached vessels (i.e., the
+   codes are assigned anew, and the factors of the evicted vessels are released); every such compaction starts a new generation.
+"""
+
+
+import os
+import json
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from bokeh.models import ColumnDataSource
+
+
+class VesselMetadata:
+    def __init__(self, capacity: int = 100_000, factor_capacity: int = None):
+        """
+        capacity: The (maximum) number of vessels whose static information is cached; the least recently updated are evicted once exceeded
+        factor_capacity: The (maximum) number of names (types) before the factors are compacted; ``2 * capacity`` if None
+        """
+        self.capacity = capacity
+        self.factor_capacity = 2 * capacity if factor_capacity is None else factor_capacity
+        self.generation = 0              # i.e., the number of compactions (or, for the readers, of the writer's compactions that were adopted)
+        self.code_mappings = {}          # AIS (ship type) code -> description; loaded once (consult ``vessel_positions_json.load_from_cache``)
+
+        self.names = ['']                # Code 0 stands for an unknown name (type)
+        self.types = ['']
+        self._name_codes = {'': 0}
+        self._type_codes = {'': 0}
+
+        self._vessels = OrderedDict()    # mmsi -> (name code, type code)
+        self._lock = Lock()
+
+        self._listeners = []
+
+        self._journal = None             # Multi-process deployment: the writer appends every new factor to the journal ...
+        self._journal_offset = 0         # ... which the readers follow, so that codes are consistent among processes
+        self._journal_id = None          # The journal's (writer and generation) header; a new one is written on every compaction
+
+    def _encode(self, value: str, factors: list, codes: dict):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(factors)
+            factors.append(value)
+
+            if self._journal is not None:
+                self._journal.write(json.dumps([factors is self.names, value]) + '\n')
+                self._journal.flush()
+
+        return code
+
+    def _compact(self):
+        # Keep (and re-code) the factors of the cached vessels only; returns the mappings of the former codes to the current ones
+        remaps = []
+        for i, (factors, codes) in enumerate(((self.names, self._name_codes), (self.types, self._type_codes))):
+            kept = sorted({vessel_codes[i] for vessel_codes in self._vessels.values()} - {0})
+            remap = [0] * len(factors)
+            for code, former in enumerate(kept, start=1):
+                remap[former] = code
+
+            factors[:] = [''] + [factors[former] for former in kept]    # In place, i.e., the lists may be referenced (e.g., by ``VesselList``)
+            codes.clear()
+            codes.update((value, code) for code, value in enumerate(factors))
+            remaps.append(remap)
+
+        name_remap, type_remap = remaps
+        for mmsi, (name_code, type_code) in self._vessels.items():
+            self._vessels[mmsi] = (name_remap[name_code], type_remap[type_code])
+
+        self.generation += 1
+        if self._journal is not None:
+            self._write_journal(self._journal.name)
+
+        return name_remap, type_remap
+
+    def _write_journal(self, path: str):
+        # (Re)write the journal atomically, i.e., the readers either follow the former generation or start over from the new one's header
+        self._journal_id = [os.getpid(), time.time_ns(), self.generation]
+        with open(f'{path}.tmp', 'w') as f:
+            f.write(json.dumps(self._journal_id) + '\n')
+            for is_name, factors in ((True, self.names), (False, self.types)):
+                for value in factors[1:]:
+                    f.write(json.dumps([is_name, value]) + '\n')
+        os.replace(f'{path}.tmp', path)
+
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(path, 'a')
+
+    def on_compact(self, callback):
+        """
+        Call ``callback(name_remap, type_remap)`` on every compaction, i.e., with the current code of every former one (writer only).
+        """
+        self._listeners.append(callback)
+
+    def set_journal(self, path: str):
+        """
+        Journal every (current and future) factor to ``path`` (writer only; consult ``follow``).
+        """
+        with self._lock:
+            self._write_journal(path)
+
+    def follow(self, path: str):
+        """
+        Adopt the factors that were journaled (to ``path``) by the writer since the last call.
+        """
+        with self._lock:
+            try:
+                with open(path, 'rb') as f:
+                    header = f.readline()
+                    if not header.endswith(b'\n'):
+                        return
+                    journal_id = json.loads(header.decode('utf-8'))
+                    if journal_id != self._journal_id:
+                        # The writer compacted the factors (or was restarted), i.e., they are adopted from scratch
+                        self._journal_id, self._journal_offset = journal_id, len(header)
+                        self.names[:], self.types[:] = [''], ['']
+                        self._name_codes, self._type_codes = {'': 0}, {'': 0}
+                        self.generation += 1
+                    f.seek(self._journal_offset)
+                    lines = f.readlines()
+            except FileNotFoundError:
+                return
+
+            for line in lines:
+                if not line.endswith(b'\n'):
+                    break    # Partially written; read again on the next call
+                is_name, value = json.loads(line.decode('utf-8'))
+                factors, codes = (self.names, self._name_codes) if is_name else (self.types, self._type_codes)
+                codes.setdefault(value, len(factors))
+                factors.append(value)
+                self._journal_offset += len(line)
+
+    def restore(self, factors: dict, mmsis, name_codes, type_codes):
+        """
+        Adopt the factors (and the vessels' codes) of a snapshot; must precede any other update (consult ``vessel_snapshot``). The factors
+        are journaled, i.e., the journal must be set first, so that the readers never see a code that it lacks.
+        """
+        with self._lock:
+            for key, current, codes in (('names', self.names, self._name_codes), ('types', self.types, self._type_codes)):
+                for value in factors.get(key, [''])[len(current):]:
+                    codes.setdefault(value, len(current))
+                    current.append(value)
+                    if self._journal is not None:
+                        self._journal.write(json.dumps([key == 'names', value]) + '\n')
+
+            if self._journal is not None:
+                self._journal.flush()
+
+            for mmsi, name_code, type_code in zip(mmsis, name_codes, type_codes):
+                self._vessels[str(mmsi)] = (int(name_code), int(type_code))
+
+    def factors(self):
+        """
+        Return (a copy of) the factor lists, e.g., for a snapshot.
+        """
+        with self._lock:
+            return {'names': list(self.names), 'types': list(self.types)}
+
+    def factors_since(self, generation: int, n_names: int, n_types: int):
+        """
+        Return the generation along with the factors that were added after the first ``n_names`` (``n_types``) of ``generation``, or
+        every factor if the factors were compacted since.
+        """
+        with self._lock:
+            if generation != self.generation:
+                n_names = n_types = 0
+            return self.generation, self.names[n_names:], self.types[n_types:]
+
+    def update(self, mmsi: str, vessel_name: str = None, vessel_type: str = None):
+        """
+        Cache (a static report of) a vessel and return its (name, type) codes. Unset (i.e., None) fields retain their cached value.
+        """
+        mmsi = str(mmsi)
+        remaps = None
+
+        with self._lock:
+            name_code, type_code = self._vessels.pop(mmsi, (0, 0))
+
+            if vessel_name is not None:
+                name_code = self._encode(vessel_name.strip(), self.names, self._name_codes)
+            if vessel_type is not None:
+                type_code = self._encode(vessel_type, self.types, self._type_codes)
+
+            self._vessels[mmsi] = (name_code, type_code)
+            if len(self._vessels) > self.capacity:
+                self._vessels.popitem(last=False)
+
+            if len(self.names) > self.factor_capacity or len(self.types) > self.factor_capacity:
+                remaps = self._compact()
+                name_code, type_code = self._vessels[mmsi]
+
+        if remaps is not None:
+            for callback in self._listeners:
+                callback(*remaps)
+
+        return name_code, type_code
+
+    def lookup(self, mmsi: str):
+        """
+        Return the (name, type) codes of a vessel (i.e., ``(0, 0)`` if its static information is unknown).
+        """
+        with self._lock:
+            return self._vessels.get(str(mmsi), (0, 0))
+
+    def __len__(self):
+        return len(self._vessels)
+
+
+class MetadataFactors:
+    def __init__(self, metadata: VesselMetadata):
+        """
+        The (per-session) factor lists of a ``VesselMetadata`` cache, i.e., the mapping of codes to names (types) at the browser.
+        """
+        self.metadata = metadata
+        self.generation, names, types = metadata.factors_since(None, 0, 0)
+        self.names = ColumnDataSource(data={'factor': names})
+        self.types = ColumnDataSource(data={'factor': types})
+
+    def sync(self):
+        """
+        Stream the factors that were added to the cache since the last sync; must precede any update that uses their codes. Returns
+        whether the factors were compacted since (i.e., they are replaced, and the codes of the session's vessels must be looked up anew).
+        """
+        generation, names, types = self.metadata.factors_since(self.generation, len(self.names.data['factor']), len(self.types.data['factor']))
+        compacted, self.generation = generation != self.generation, generation
+
+        for source, factors in ((self.names, names), (self.types, types)):
+            if compacted:
+                source.data = {'factor': factors}
+            elif factors:
+                source.stream({'factor': factors})
+
+        return compacted
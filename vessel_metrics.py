@@ -0,0 +1,224 @@
+"""Ingest and Render Metrics (Prometheus Text Exposition Format).
+
+   Counters and histograms are plain in-process aggregates (i.e., an addition per observation, under a per-metric lock, since they are
+   observed by the Kafka threads and the sessions alike; no background work), and gauges (e.g., the number of sessions, or their queue
+   depth) are only evaluated when scraped. Observations that are costly to take (e.g., the serialized size of a patch) are only taken
+   while the endpoint is being scraped (consult ``MetricsRegistry.is_scraped``).
+
+   The ingest metrics (``INGEST_METRICS``) and the render ones (``METRICS``) are kept in separate registries. The multi-process deployment
+   mounts the endpoint at ``<prefix>/metrics`` of every worker (consult ``serve.py``), which reports its own sessions (labeled by its
+   ``worker`` id) along with the ingest metrics of the ingest process (dumped next to the shared vessel table); otherwise, both registries
+   are served at ``metrics_port`` (server.ini).
+"""
+
+
+import os
+import time
+from bisect import bisect_left
+from threading import Lock
+
+from tornado.web import Application, RequestHandler
+
+
+METRICS_PREFIX = '/metrics'
+METRICS_SCRAPE_TTL = 300    # Costly observations are taken for (up to) 5 minutes since the last scrape
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROWS_BUCKETS = (1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+def _format_labels(labels: dict):
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}' if labels else ''
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name, self.documentation, self.type = name, documentation, 'counter'
+        self.value = 0
+        self._lock = Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self):
+        yield self.name, {}, self.value
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.documentation, self.type = name, documentation, 'histogram'
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)    # The last one stands for ``+Inf``
+        self.sum = 0
+        self._lock = Lock()
+
+    def observe(self, value: float):
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.sum += value
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{self.name}_bucket', {'le': bound}, cumulative
+        yield f'{self.name}_sum', {}, self.sum
+        yield f'{self.name}_count', {}, cumulative
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str, function):
+        """
+        function: Evaluated on scrape; returns either a value or a dict of (label dict as a tuple of pairs) -> value
+        """
+        self.name, self.documentation, self.type = name, documentation, 'gauge'
+        self.function = function
+
+    def samples(self):
+        value = self.function()
+        if not isinstance(value, dict):
+            yield self.name, {}, value
+            return
+        for labels, label_value in value.items():
+            yield self.name, dict(labels), label_value
+
+
+class MetricsRegistry:
+    def __init__(self, namespace: str = 'unipi_ais', labels: dict = None):
+        """
+        labels: The labels of every sample, e.g., the worker's id, so that the samples of different processes do not collide
+        """
+        self.namespace = namespace
+        self.labels = {} if labels is None else labels
+        self.metrics = []
+        self.last_scrape = 0
+
+    def _register(self, metric):
+        metric.name = f'{self.namespace}_{metric.name}'
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str):
+        return self._register(Counter(name, documentation))
+
+    def histogram(self, name: str, documentation: str, buckets: tuple = LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, buckets))
+
+    def gauge(self, name: str, documentation: str, function):
+        return self._register(Gauge(name, documentation, function))
+
+    def is_scraped(self):
+        """
+        Whether the endpoint has been scraped recently, i.e., whether costly observations should be taken.
+        """
+        return time.time() - self.last_scrape < METRICS_SCRAPE_TTL
+
+    def render(self, namespace: str = None):
+        """
+        namespace: Renames the metrics' namespace, e.g., so that the metrics of another process do not collide with the local ones
+        """
+        lines = []
+        rename = (lambda name: namespace + name[len(self.namespace):]) if namespace else (lambda name: name)
+
+        for metric in self.metrics:
+            lines.append(f'# HELP {rename(metric.name)} {metric.documentation}')
+            lines.append(f'# TYPE {rename(metric.name)} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{rename(name)}{_format_labels({**self.labels, **labels})} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path: str, namespace: str = None):
+        """
+        Write the metrics to ``path`` (atomically), e.g., for a process that does not serve them itself.
+        """
+        tmp_path = f'{path}.tmp-{os.getpid()}'
+        with open(tmp_path, 'w') as f:
+            f.write(self.render(namespace))
+        os.replace(tmp_path, path)
+
+
+class SessionStats:
+    def __init__(self, session_id: str, source=None):
+        """
+        The (per-session) queue depth, i.e., the updates that were scheduled (by the Kafka thread) but not applied (or superseded) yet,
+        along with the session's (adaptive) pacing, if any (consult vessel_pacing.py).
+        """
+        self.session_id = session_id
+        self.source = source
+        self.scheduled = 0    # Written by the Kafka thread ...
+        self.applied = 0      # ... and by the session's callbacks, respectively
+        self.pacer = None
+        self.buffer = None    # The session's ``UpdateBuffer``, which counts the superseded updates (under its lock)
+
+    @property
+    def queue_depth(self):
+        return self.scheduled - self.applied - (self.buffer.superseded if self.buffer is not None else 0)
+
+    @property
+    def vessels(self):
+        return len(self.source.data['mmsi']) if self.source is not None else 0
+
+
+METRICS = MetricsRegistry()
+INGEST_METRICS = MetricsRegistry()
+SESSIONS = {}    # session id -> SessionStats
+
+MESSAGES = INGEST_METRICS.counter('messages_consumed_total', 'Kafka messages consumed')
+DECODE_SECONDS = INGEST_METRICS.counter('decode_seconds_total', 'Time spent decoding (i.e., parsing and projecting) the consumed messages')
+STALE_REPORTS = INGEST_METRICS.counter('stale_reports_total', 'Kinematic reports dropped for being older than the vessel\'s latest position')
+DUPLICATE_REPORTS = INGEST_METRICS.counter('duplicate_reports_total', 'Kinematic reports dropped for being as old as the vessel\'s latest position')
+EXPIRE_SECONDS = INGEST_METRICS.histogram('expire_seconds', 'Duration of expiring the vessels of the shared table')
+
+INGEST_TO_PATCH = METRICS.histogram('ingest_to_patch_seconds', 'Time from the Kafka (message) timestamp to the patch of a session')
+FLUSH_ROWS = METRICS.histogram('flush_rows', 'Rows per session update (patch and stream)', ROWS_BUCKETS)
+FLUSH_BYTES = METRICS.histogram('flush_bytes', 'Serialized bytes per session update (patch and stream); only observed while scraped', BYTES_BUCKETS)
+PURGE_SECONDS = METRICS.histogram('purge_seconds', 'Duration of purging the expired vessels of a session')
+
+METRICS.gauge('sessions', 'Active sessions', lambda: len(SESSIONS))
+METRICS.gauge('session_queue_depth', 'Updates scheduled for a session but not applied yet', lambda: {(('session', s.session_id),): s.queue_depth for s in list(SESSIONS.values())})
+METRICS.gauge('session_flush_interval_seconds', 'The (adaptive) flush interval of a session', lambda: {(('session', s.session_id),): s.pacer.interval_ms / 1000 for s in list(SESSIONS.values()) if s.pacer is not None})
+METRICS.gauge('session_round_trip_seconds', 'The (smoothed) round trip of a session\'s client, i.e., from a flush to its acknowledgement', lambda: {(('session', s.session_id),): s.pacer.rtt_ms / 1000 for s in list(SESSIONS.values()) if s.pacer is not None and s.pacer.rtt_ms is not None})
+METRICS.gauge('session_vessels', 'Vessels displayed by a session', lambda: {(('session', s.session_id),): s.vessels for s in list(SESSIONS.values())})
+
+
+class MetricsHandler(RequestHandler):
+    def initialize(self, registries: list, extra_paths: list = ()):
+        self.registries = registries
+        self.extra_paths = extra_paths
+
+    def get(self):
+        self.set_header('Content-Type', METRICS_CONTENT_TYPE)
+        for registry in self.registries:
+            registry.last_scrape = time.time()
+            self.write(registry.render())
+
+        # The metrics of other processes (e.g., the ingest process), if dumped
+        for path in self.extra_paths:
+            try:
+                with open(path) as f:
+                    self.write(f.read())
+            except FileNotFoundError:
+                continue
+
+
+def metrics_patterns(registries: list = (METRICS, INGEST_METRICS), prefix: str = METRICS_PREFIX, extra_paths: list = ()):
+    """
+    The URL patterns of the endpoint, e.g., for the ``extra_patterns`` of a Bokeh Server.
+    """
+    return [(prefix, MetricsHandler, {'registries': list(registries), 'extra_paths': list(extra_paths)})]
+
+
+def start_metrics_server(port: int, registries: list = (METRICS, INGEST_METRICS), prefix: str = METRICS_PREFIX, extra_patterns: list = ()):
+    """
+    Start serving the metrics (and, optionally, other endpoints; e.g., ``vessel_tracing``) on the current IOLoop (e.g., the Bokeh Server's).
+    """
+    app = Application(metrics_patterns(registries, prefix) + list(extra_patterns))
+    app.listen(port)
+    print(f'Metrics: serving at :{port}{prefix}')
+
+    return app
@@ -0,0 +1,127 @@
+"""Adaptive (per-session) Pacing of the Updates, based on the Client's Round Trip.
+
+   Updates are not applied (i.e., patched) as soon as they arrive, but buffered per session and flushed periodically. Every flush is
+   followed by a ping (i.e., a change of a hidden model's tags, which BokehJS acknowledges by changing them back); since the client
+   handles the server's messages in order, the acknowledgement's latency reflects the client's (network and rendering) backlog. The
+   flush interval follows the (smoothed) round trip, and the batch size (i.e., the updates applied per flush) follows the interval; a
+   slow client gets fewer, larger updates, whereas the buffer is bounded by the number of vessels (i.e., updates are coalesced per vessel).
+"""
+
+
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from bokeh.models import Div, CustomJS
+
+
+class UpdateBuffer:
+    def __init__(self):
+        """
+        The (coalescing) buffer of a session's updates, i.e., written by the Kafka thread and drained by the session's flushes.
+        """
+        self._updates = OrderedDict()    # (mmsi, update type) -> update; in the order of their (first) arrival
+        self._lock = Lock()
+        self.superseded = 0              # i.e., the updates that were never applied (consult ``SessionStats``)
+
+    def __len__(self):
+        return len(self._updates)
+
+    def put(self, key: tuple, update: dict):
+        """
+        Buffer an update; returns whether it superseded a buffered one (i.e., of the same vessel and type, which keeps its position).
+        """
+        with self._lock:
+            buffered = self._updates.get(key)
+            if buffered is not None:
+                self.superseded += 1
+                if update.get('ts', 0) < buffered.get('ts', 0):
+                    return True    # i.e., the buffered update is newer
+            self._updates[key] = update
+            return buffered is not None
+
+    def drain(self, limit: int = None):
+        with self._lock:
+            n_updates = len(self._updates) if limit is None else min(limit, len(self._updates))
+            return [self._updates.popitem(last=False)[1] for _ in range(n_updates)]
+
+
+class FlushPacer:
+    def __init__(self, min_interval_ms: int = 100, max_interval_ms: int = 5000, min_batch: int = 500, max_batch: int = 20_000, headroom: float = 2.0, smoothing: float = 0.25):
+        """
+        min_interval_ms: The flush interval of a client whose round trip is (at most) ``min_interval_ms / headroom``
+        max_interval_ms: The (maximum) flush interval of a slow client
+        min_batch: The (maximum) updates per flush at ``min_interval_ms``; scaled along with the interval, up to ``max_batch``
+        headroom: The ratio of the flush interval to the round trip
+        smoothing: The weight of a round trip's sample to the (exponentially) smoothed one
+        """
+        self.min_interval_ms = min_interval_ms
+        self.max_interval_ms = max_interval_ms
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.headroom = headroom
+        self.smoothing = smoothing
+
+        self.interval_ms = min_interval_ms
+        self.batch_size = min_batch
+        self.rtt_ms = None
+
+        self._doc = None
+        self._flush = None
+        self._seq = 0
+        self._sent = None    # The (perf. counter) time of the outstanding ping, if any
+
+        # The ping's model; it is placed in the page's layout (hidden), so that BokehJS syncs it
+        self.pinger = Div(visible=False, tags=[0])
+        self.pinger.js_on_change('tags', CustomJS(code='''if (cb_obj.tags.length == 1) { cb_obj.tags = [cb_obj.tags[0], 'ack']; }'''))
+
+    def get_models(self):
+        """
+        The models that are needed per Document, if the page is created from a template (consult ``template_helper``).
+        """
+        return {'pacer_pinger': self.pinger}
+
+    def set_models(self, models: dict):
+        self.pinger = models['pacer_pinger']
+
+    def start(self, doc, flush):
+        """
+        Start flushing a session's updates, i.e., ``flush(batch_size)`` is called at the (adaptive) interval.
+        """
+        self._doc, self._flush = doc, flush
+        self.pinger.on_change('tags', self._on_ack)
+        doc.add_timeout_callback(self._tick, self.interval_ms)
+
+    def _tick(self):
+        try:
+            self._flush(self.batch_size)
+
+            now = time.perf_counter()
+            if self._sent is None:
+                self._seq += 1
+                self._sent = now
+                self.pinger.tags = [self._seq]
+            else:
+                # The outstanding ping's age is a lower bound of the round trip, i.e., the pacing slows down without waiting for it
+                self._observe((now - self._sent) * 1000, outstanding=True)
+        finally:
+            # i.e., a failed flush (logged by Bokeh) does not stop the session's flushes
+            self._doc.add_timeout_callback(self._tick, int(self.interval_ms))
+
+    def _on_ack(self, attr, old, new):
+        if len(new) != 2 or new[0] != self._seq or self._sent is None:
+            return
+
+        self._observe((time.perf_counter() - self._sent) * 1000)
+        self._sent = None
+
+    def _observe(self, rtt_ms: float, outstanding: bool = False):
+        if outstanding:
+            if self.rtt_ms is not None and rtt_ms <= self.rtt_ms:
+                return
+            self.rtt_ms = rtt_ms
+        else:
+            self.rtt_ms = rtt_ms if self.rtt_ms is None else (1 - self.smoothing) * self.rtt_ms + self.smoothing * rtt_ms
+
+        self.interval_ms = min(max(self.headroom * self.rtt_ms, self.min_interval_ms), self.max_interval_ms)
+        self.batch_size = int(min(self.min_batch * self.interval_ms / self.min_interval_ms, self.max_batch))
@@ -4,131 +4,285 @@ import configparser
 import time
 import json
 
+import numpy as np
 from redis import Redis, ConnectionError
-from confluent_kafka import Consumer, KafkaException, KafkaError
-from pyproj import Transformer
-from threading import Lock, Event
+from confluent_kafka import Consumer, KafkaException, KafkaError, TopicPartition
+from threading import Lock, Event, Thread
+from queue import Queue, Empty
 
 from bokeh.models import ColumnDataSource
 from bokeh.document import Document
 # import logging
 
+from vessel_archive import VesselArchive
+from vessel_trails import VesselTrails
+from vessel_list import VesselList
+from vessel_pacing import UpdateBuffer
+from vessel_dead_reckoning import DeadReckoning
+from vessel_report_filter import ReportFilter
+from vessel_metadata import VesselMetadata, MetadataFactors
+from vessel_table import VesselTable, TABLE_DEFAULT_PATH
+from vessel_snapshot import write_snapshot, read_snapshot
+from vessel_metrics import METRICS, INGEST_METRICS, SessionStats, MESSAGES, DECODE_SECONDS, STALE_REPORTS, DUPLICATE_REPORTS, EXPIRE_SECONDS, INGEST_TO_PATCH, FLUSH_ROWS, FLUSH_BYTES
+
 
 # Define Global Variables
-APP_ROOT = os.path.dirname(__file__)
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
 # DATETIME_OFFSET_SEC = 2*3600 if time.daylight else 3*3600
 
 CONFIG = configparser.ConfigParser()
 CONFIG.read('server.ini')
 settings = CONFIG['datastories.org']
 
-coord_transformer = Transformer.from_crs(crs_from="EPSG:4326", crs_to="EPSG:3857", always_xy = True)
+_coord_transformer = None
+
+# Process-wide (historical) positions archive; enabled by setting ``archive_dir`` at server.ini
+ARCHIVE = VesselArchive(settings['archive_dir']) if settings.get('archive_dir') else None
+# Process-wide (dictionary-encoded) static information of the vessels
+METADATA = VesselMetadata(capacity=int(settings.get('metadata_capacity', 100_000)))
+_archive_thread_lock = Lock()
+_archive_thread_started = False
+
+# Process-wide (initial) vessel snapshot of the (single-process) sessions, i.e., the Redis cache is scanned once per ``session_snapshot_ttl`` seconds
+SESSION_SNAPSHOT_TTL = float(settings.get('session_snapshot_ttl', 5.0))
+_session_snapshot = None
+_session_snapshot_lock = Lock()
+
+# Multi-process deployment (consult serve.py): the workers read the vessels' state from a shared-memory table, written by a single ingest process
+PREFORK_ENV = 'UNIPI_AIS_PREFORK'
+TABLE_PATH = settings.get('shared_table', TABLE_DEFAULT_PATH)
+_shared_table = None
 
 def get_utc_timestamp():
     return datetime.now(timezone.utc)
 
-def load_from_cache(source: ColumnDataSource, record_index: dict, index_lock: Lock, code_mappings: dict, sp_cols: dict = {'x': 'lon', 'y': 'lat'}, mercator_suffix: str = '_merc'):
-    
+def get_coord_transformer():
+    # Built (along with pyproj) on first use, i.e., never by the workers of the multi-process deployment (they are fed already projected positions)
+    global _coord_transformer
+    if _coord_transformer is None:
+        from pyproj import Transformer
+        _coord_transformer = Transformer.from_crs(crs_from="EPSG:4326", crs_to="EPSG:3857", always_xy = True)
+    return _coord_transformer
+
+def scan_session_snapshot(code_mappings: dict, sp_cols: dict = {'x': 'lon', 'y': 'lat'}, mercator_suffix: str = '_merc'):
+    # Scan the Redis cache into the columns of a session's ColumnDataSource; None if Redis is unreachable
     redis_client = Redis(host=settings['redis_host'], port=settings['redis_port'], db=settings['redis_db'], decode_responses=True)
     try:
         _pong = redis_client.ping()
     except ConnectionError as e:
         print(f'Redis connection failed: {e}. Check config. Exiting...')
-        return
+        return None
 
-    code_mappings.update(redis_client.hgetall('ais_code_descriptions'))
+    # The AIS code descriptions are shared among sessions (i.e., loaded once)
+    if not code_mappings:
+        code_mappings.update(redis_client.hgetall('ais_code_descriptions'))
 
+    # SCAN may return a key more than once
+    vessels = {}
     for mmsi in redis_client.scan_iter(match='*', count=1000):
         if redis_client.type(mmsi) != 'hash':
             continue
         data = redis_client.hgetall(mmsi)
         if 'timestamp' in data:
-            lon_merc, lat_merc = coord_transformer.transform(data['longitude'], data['latitude'])
-            with index_lock:
-                source.stream({
-                    'mmsi' : [mmsi],
-                    'ts': [int(data.get('timestamp'))],
-                    f'{sp_cols["x"]}': [data.get('longitude')],
-                    f'{sp_cols["y"]}': [data.get('latitude')],
-                    'moving': [data.get('moving')],
-                    'heading': [data.get('heading', "0")],
-                    'vessel_name': [data.get('vessel_name', data.get('shipname', ''))],
-                    'vessel_type': [data.get('vessel_type', code_mappings.get(data.get('shiptype', ''), '').split(',')[0])], 
-                    'TRCMP': [-float(data.get('heading', 0))],
-                    'DSCMP': [270 - float(data.get('heading', 0))],
-                    f'{sp_cols["x"]}{mercator_suffix}': [lon_merc],
-                    f'{sp_cols["y"]}{mercator_suffix}': [lat_merc]
-                    })
-                record_index[mmsi] = len(source.data['mmsi']) - 1
-
+            vessels[mmsi] = data
     redis_client.connection_pool.disconnect()
 
-def on_record_arrival(record: dict, source: ColumnDataSource, record_index: dict, index_lock: Lock, code_mappings: dict, doc: Document, sp_cols: dict = {'x': 'lon', 'y': 'lat'}, mercator_suffix: str = '_merc'):
-    
+    x_col, y_col = f'{sp_cols["x"]}{mercator_suffix}', f'{sp_cols["y"]}{mercator_suffix}'
+    columns = {col: [] for col in ('mmsi', 'ts', 'moving', 'heading', 'speed', 'vessel_name_id', 'vessel_type_id', x_col, y_col)}
+    if not vessels:
+        return columns
+
+    # Project the positions at once
+    xs, ys = get_coord_transformer().transform(np.array([float(data['longitude']) for data in vessels.values()]), np.array([float(data['latitude']) for data in vessels.values()]))
+
+    for (mmsi, data), x, y in zip(vessels.items(), xs.tolist(), ys.tolist()):
+        name_code, type_code = METADATA.update(mmsi, data.get('vessel_name', data.get('shipname', '')), data.get('vessel_type', code_mappings.get(data.get('shiptype', ''), '').split(',')[0]))
+        for col, value in zip(columns.keys(), (mmsi, int(data.get('timestamp')), data.get('moving'), data.get('heading', "0"), float(data.get('speed', 0)), name_code, type_code, x, y)):
+            columns[col].append(value)
+
+    return columns
+
+def get_session_snapshot(code_mappings: dict, sp_cols: dict = {'x': 'lon', 'y': 'lat'}, mercator_suffix: str = '_merc', max_age: float = SESSION_SNAPSHOT_TTL):
+    # The process-wide snapshot of the Redis cache; rescanned once older than ``max_age`` seconds (i.e., sessions opened in bursts share a scan)
+    global _session_snapshot
+
+    key = (sp_cols['x'], sp_cols['y'], mercator_suffix)
+    with _session_snapshot_lock:
+        if _session_snapshot is not None and _session_snapshot[1] == key and time.monotonic() - _session_snapshot[0] <= max_age:
+            return _session_snapshot[2:]
+
+        generation = METADATA.generation
+        columns = scan_session_snapshot(code_mappings, sp_cols=sp_cols, mercator_suffix=mercator_suffix)
+        if columns is not None:
+            # i.e., the codes of a snapshot are valid as long as the factors are not compacted (consult ``VesselMetadata``)
+            _session_snapshot = (time.monotonic(), key, columns, generation if generation == METADATA.generation else None)
+        return _session_snapshot[2:] if columns is not None else (None, None)
+
+def lookup_codes(mmsis: list):
+    # The (name, type) code columns of a set of vessels, as currently cached
+    codes = [METADATA.lookup(mmsi) for mmsi in mmsis]
+    return [code[0] for code in codes], [code[1] for code in codes]
+
+def recode_vessels(source: ColumnDataSource, index_lock: Lock, vessel_list: VesselList = None):
+    # Look the codes of every vessel up anew, i.e., once the factors are compacted (consult ``MetadataFactors.sync``)
+    with index_lock:
+        name_codes, type_codes = lookup_codes(source.data['mmsi'])
+        source.data.update({'vessel_name_id': name_codes, 'vessel_type_id': type_codes})
+    if vessel_list is not None:
+        vessel_list.rebuild()
+
+def load_from_cache(source: ColumnDataSource, record_index: dict, index_lock: Lock, code_mappings: dict, sp_cols: dict = {'x': 'lon', 'y': 'lat'}, mercator_suffix: str = '_merc', trails: VesselTrails = None, dead_reckoning: DeadReckoning = None, factors: MetadataFactors = None, report_filter: ReportFilter = None, max_age: float = SESSION_SNAPSHOT_TTL):
+    columns, generation = get_session_snapshot(code_mappings, sp_cols=sp_cols, mercator_suffix=mercator_suffix, max_age=max_age)
+    if columns is None:
+        return
+
+    x_col, y_col = f'{sp_cols["x"]}{mercator_suffix}', f'{sp_cols["y"]}{mercator_suffix}'
+    with index_lock:
+        # The session's CDS is set at once (i.e., from copies of the snapshot's columns)
+        data = {col: list(values) for col, values in columns.items()}
+        if generation != METADATA.generation:
+            data['vessel_name_id'], data['vessel_type_id'] = lookup_codes(data['mmsi'])
+        source.data = data
+        record_index.clear()
+        for idx, (mmsi, ts, x, y) in enumerate(zip(columns['mmsi'], columns['ts'], columns[x_col], columns[y_col])):
+            record_index[mmsi] = idx
+            if trails is not None:
+                trails.push(idx, x, y)
+            if dead_reckoning is not None:
+                dead_reckoning.should_send(idx, ts, x, y, columns['speed'][idx], float(columns['heading'][idx]))
+            if report_filter is not None:
+                report_filter.accept(idx, ts)
+
+    while factors is not None and factors.sync():
+        recode_vessels(source, index_lock)
+
+def on_record_arrival(record: dict, record_index: dict, index_lock: Lock, code_mappings: dict, buffer: UpdateBuffer, report_filter: ReportFilter = None, stats: SessionStats = None, kafka_ms: int = None):
+    # Decode (and project) a report off the session's thread, and buffer it for the session's next flush (consult ``apply_updates``)
     record_type = 'kinematic' if len(record) > 4 else 'static'
 
     mmsi = record.get('mmsi')
 
     if record_type == 'kinematic':
         ts = int(record.get('timestamp'))
-        lon = record.get('longitude')
-        lat = record.get('latitude')
-        moving = 'Y' if float(record.get('speed', 0)) > 0 else 'N'
-        heading = record.get('heading', "0")
-        TRCMP = -float(record.get('heading', 0)) # -0 is valid as far as Python is concerned
-        DSCMP = 270 - float(record.get('heading', 0))
-        lon_merc, lat_merc = coord_transformer.transform(lon, lat)
+
+        # Stale (i.e., older than the applied report) and duplicate reports are dropped before they are projected (or scheduled)
+        if report_filter is not None:
+            with index_lock:
+                if mmsi in record_index and not report_filter.accept(record_index[mmsi], ts):
+                    return
+
+        speed = float(record.get('speed', 0))
+        lon_merc, lat_merc = get_coord_transformer().transform(record.get('longitude'), record.get('latitude'))
+        update = {'type': record_type, 'mmsi': mmsi, 'ts': ts, 'moving': 'Y' if speed > 0 else 'N', 'heading': record.get('heading', "0"), 'speed': speed, 
+                  'x': lon_merc, 'y': lat_merc, 'kafka_ms': kafka_ms}
     else:
         vessel_type = code_mappings.get(str(record.get('shiptype', '')), '').split(',')[0]
         vessel_name = record.get('shipname', '')
+        # Cached process-wide, i.e., also for vessels that have not been positioned yet; the codes are looked up once applied
+        METADATA.update(mmsi, vessel_name, vessel_type)
+        update = {'type': record_type, 'mmsi': mmsi, 'kafka_ms': kafka_ms}
+
+    if stats is not None:
+        stats.scheduled += 1
+    # A vessel's buffered update (of the same type) is superseded, i.e., it is never applied (counted by the buffer)
+    buffer.put((mmsi, record_type), update)
+
+def apply_updates(updates: list, source: ColumnDataSource, record_index: dict, index_lock: Lock, sp_cols: dict = {'x': 'lon', 'y': 'lat'}, mercator_suffix: str = '_merc', trails: VesselTrails = None, dead_reckoning: DeadReckoning = None, factors: MetadataFactors = None, report_filter: ReportFilter = None, stats: SessionStats = None, vessel_list: VesselList = None):
+    # Apply a batch of (buffered) updates as a single patch (and stream); returns the number of updates
+    if not updates:
+        return 0
+
+    if stats is not None:
+        stats.applied += len(updates)
+
+    x_col, y_col = f'{sp_cols["x"]}{mercator_suffix}', f'{sp_cols["y"]}{mercator_suffix}'
+    kinematic_cols = ['ts', 'moving', 'heading', 'speed', x_col, y_col]
+    patches = {col: [] for col in kinematic_cols + ['vessel_name_id', 'vessel_type_id']}
+    new_rows = {col: [] for col in ['mmsi'] + kinematic_cols + ['vessel_name_id', 'vessel_type_id']}
+    coded = {}    # row -> mmsi, i.e., the rows whose (name, type) codes are sent along with the batch
+    recoded = False
+
+    with index_lock:
+        n_rows = len(source.data['mmsi'])
+
+        for update in updates:
+            mmsi = update['mmsi']
+            idx = record_index.get(mmsi)
 
-    def update_source():
-        with index_lock:
-            if mmsi in record_index:
-                idx = record_index[mmsi]
-                if record_type == 'kinematic':
-                    source.patch({
-                        'ts': [(idx, ts)],
-                        f'{sp_cols["x"]}': [(idx, lon)],
-                        f'{sp_cols["y"]}': [(idx, lat)],
-                        'moving': [(idx, moving)],
-                        'heading': [(idx, heading)],
-                        'TRCMP': [(idx, TRCMP)],
-                        'DSCMP': [(idx, DSCMP)],
-                        f'{sp_cols["x"]}{mercator_suffix}': [(idx, lon_merc)],
-                        f'{sp_cols["y"]}{mercator_suffix}': [(idx, lat_merc)]
-                        })
-                else:
-                    source.patch({
-                        'vessel_type': [(idx, vessel_type)],
-                        'vessel_name': [(idx, vessel_name)]
-                        })
+            if update['type'] == 'kinematic':
+                ts, speed, heading, x, y = update['ts'], update['speed'], update['heading'], update['x'], update['y']
+                values = {'ts': ts, 'moving': update['moving'], 'heading': heading, 'speed': speed, x_col: x, y_col: y}
+
+                if idx is None:
+                    idx = record_index[mmsi] = n_rows + len(new_rows['mmsi'])
+                    for col, value in zip(new_rows.keys(), [mmsi] + list(values.values()) + [0, 0]):
+                        new_rows[col].append(value)
+                    coded[idx] = mmsi
+                    if dead_reckoning is not None:
+                        dead_reckoning.should_send(idx, ts, x, y, speed, float(heading))
+                    if report_filter is not None:
+                        report_filter.accept(idx, ts)
+                    if vessel_list is not None:
+                        vessel_list.touch(idx)
+                # In the interpolation mode, reports that the browser can already extrapolate (within tolerance) are not sent
+                elif dead_reckoning is None or dead_reckoning.should_send(idx, ts, x, y, speed, float(heading)):
+                    for col, value in values.items():
+                        patches[col].append((idx, value))
+                    if vessel_list is not None:
+                        vessel_list.touch(idx)
+
+                if trails is not None:
+                    trails.push(idx, x, y)
+            elif idx is not None:
+                coded[idx] = mmsi
+                if vessel_list is not None:
+                    vessel_list.touch(idx)
+
+        # The codes are looked up before the factors are synced, i.e., the session's factors include every code of the batch; if they
+        # were compacted in the meantime, the session's vessels (and the batch) are re-coded, and the (new) factors are synced again
+        codes = {idx: METADATA.lookup(mmsi) for idx, mmsi in coded.items()}
+        while factors is not None and factors.sync():
+            name_codes, type_codes = lookup_codes(source.data['mmsi'])
+            source.data.update({'vessel_name_id': name_codes, 'vessel_type_id': type_codes})
+            codes = {idx: METADATA.lookup(mmsi) for idx, mmsi in coded.items()}
+            recoded = True
+
+        for idx, (name_code, type_code) in codes.items():
+            if idx >= n_rows:
+                # i.e., a vessel that is streamed along with this batch
+                new_rows['vessel_name_id'][idx - n_rows], new_rows['vessel_type_id'][idx - n_rows] = name_code, type_code
             else:
-                if record_type == 'kinematic':
-                    source.stream({
-                        'mmsi': [mmsi],
-                        'ts': [ts],
-                        f'{sp_cols["x"]}': [lon],
-                        f'{sp_cols["y"]}': [lat],
-                        'moving': [moving],
-                        'heading': [heading],
-                        'TRCMP': [TRCMP],
-                        'DSCMP': [DSCMP],
-                        f'{sp_cols["x"]}{mercator_suffix}': [lon_merc],
-                        f'{sp_cols["y"]}{mercator_suffix}': [lat_merc],
-                        'vessel_name': [''],
-                        'vessel_type': ['']
-                        })
-                    record_index[mmsi] = len(source.data['mmsi']) - 1
-
-    doc.add_next_tick_callback(update_source)
-
-def data_thread(thread_stop: Event, source: ColumnDataSource, record_index: dict, index_lock: Lock, code_mappings: dict, doc: Document, sp_cols: dict = {'x': 'lon', 'y': 'lat'}, mercator_suffix: str = '_merc'):
+                patches['vessel_name_id'].append((idx, name_code))
+                patches['vessel_type_id'].append((idx, type_code))
 
-    print(f"Kafka thread starting for session '{doc.session_context.id}', subscribing to topics: {settings['kafka_topics'].split(',')}")
+        patches = {col: patch for col, patch in patches.items() if patch}
+        if patches:
+            source.patch(patches)
+        if new_rows['mmsi']:
+            source.stream(new_rows)
+
+    if recoded and vessel_list is not None:
+        vessel_list.rebuild()
+
+    if patches or new_rows['mmsi']:
+        n_rows = max((len(patch) for patch in patches.values()), default=0) + len(new_rows['mmsi'])
+        kafka_ms = min((update['kafka_ms'] for update in updates if update.get('kafka_ms')), default=None)
+        observe_flush({'patches': patches, 'new_rows': new_rows}, n_rows=n_rows, kafka_ms=kafka_ms)
+
+    return len(updates)
+
+def observe_flush(update: dict, n_rows: int = 1, kafka_ms: int = None):
+    # Flush size (in rows; and in bytes, only while the metrics are scraped) and ingest-to-patch latency of a session update
+    FLUSH_ROWS.observe(n_rows)
+    if kafka_ms and kafka_ms > 0:
+        INGEST_TO_PATCH.observe(max(time.time_ns() // 1_000_000 - kafka_ms, 0) / 1000)
+    if METRICS.is_scraped():
+        FLUSH_BYTES.observe(len(json.dumps(update, default=str)))
+
+def create_consumer(group_id: str, offsets: dict = None):
     conf = {
             'bootstrap.servers': settings['kafka_broker'],
-            'group.id': doc.session_context.id,
+            'group.id': group_id,
             'auto.offset.reset': 'latest'
             }
     consumer = Consumer(conf)
@@ -140,9 +294,29 @@ def data_thread(thread_stop: Event, source: ColumnDataSource, record_index: dict
                 raise KafkaException(err)   
     except KafkaException as e:
         print(f'Broker connection failed: {e}. Check config. Exiting...')
-        return
+        consumer.close()
+        return None
+
+    def on_assign(consumer, partitions):
+        # Resume from the offsets that a snapshot reflects ('<topic>:<partition>' -> offset); only on the first assignment
+        for partition in partitions:
+            offset = offsets.pop(f'{partition.topic}:{partition.partition}', None)
+            if offset is not None:
+                partition.offset = offset
+        consumer.assign(partitions)
+
+    if offsets:
+        consumer.subscribe(settings['kafka_topics'].split(','), on_assign=on_assign)
+    else:
+        consumer.subscribe(settings['kafka_topics'].split(','))
+    return consumer
 
-    consumer.subscribe(settings['kafka_topics'].split(','))
+def data_thread(thread_stop: Event, record_index: dict, index_lock: Lock, code_mappings: dict, doc: Document, buffer: UpdateBuffer, report_filter: ReportFilter = None, stats: SessionStats = None):
+
+    print(f"Kafka thread starting for session '{doc.session_context.id}', subscribing to topics: {settings['kafka_topics'].split(',')}")
+    consumer = create_consumer(doc.session_context.id)
+    if consumer is None:
+        return
 
     try:
         while not thread_stop.is_set():
@@ -158,9 +332,395 @@ def data_thread(thread_stop: Event, source: ColumnDataSource, record_index: dict
                 time.sleep(0.1) 
                 continue
 
+            MESSAGES.inc()
+            decode_start = time.perf_counter()
             record = json.loads(msg.value().decode('utf-8'))
-            on_record_arrival(record=record['payload'], source=source, record_index=record_index, index_lock=index_lock, code_mappings=code_mappings, doc=doc)
+            on_record_arrival(record=record['payload'], record_index=record_index, index_lock=index_lock, code_mappings=code_mappings, buffer=buffer, report_filter=report_filter, stats=stats, kafka_ms=msg.timestamp()[1])
+            DECODE_SECONDS.inc(time.perf_counter() - decode_start)
     finally:
         consumer.close()
 
 
+
+
+def archive_thread(thread_stop: Event, archive: VesselArchive, flush_interval: float = 1.0, seal_interval: float = 60.0):
+
+    print(f"Kafka archive thread starting, subscribing to topics: {settings['kafka_topics'].split(',')}")
+    consumer = create_consumer(settings.get('archive_group_id', 'unipi-ais-archive'))
+    if consumer is None:
+        return
+
+    last_flush = last_seal = time.time()
+    try:
+        while not thread_stop.is_set():
+            if time.time() - last_flush >= flush_interval:
+                archive.flush()
+                last_flush = time.time()
+            if time.time() - last_seal >= seal_interval:
+                archive.seal()
+                last_seal = time.time()
+
+            msg = consumer.poll(timeout=1.0)
+            if msg is None or msg.error():
+                continue
+
+            record = json.loads(msg.value().decode('utf-8'))['payload']
+            if len(record) <= 4:
+                continue
+
+            x, y = get_coord_transformer().transform(record.get('longitude'), record.get('latitude'))
+            archive.append(int(record.get('mmsi')), int(record.get('timestamp')), x, y, float(record.get('speed', 0)), float(record.get('heading', 0)))
+    finally:
+        archive.flush()
+        consumer.close()
+
+def start_archive_thread(thread_stop: Event = None):
+    global _archive_thread_started
+
+    if ARCHIVE is None:
+        return
+
+    with _archive_thread_lock:
+        if _archive_thread_started:
+            return
+        _archive_thread_started = True
+
+    Thread(target=archive_thread, kwargs={'thread_stop': Event() if thread_stop is None else thread_stop, 'archive': ARCHIVE}, daemon=True).start()
+
+def archive_records_to_columns(records: np.ndarray, sp_cols: dict = {'x': 'lon', 'y': 'lat'}, mercator_suffix: str = '_merc'):
+    heading = records['heading'].astype(float)
+    vessel_codes = [METADATA.lookup(str(mmsi)) for mmsi in records['mmsi']]
+
+    return {
+        'mmsi': records['mmsi'].astype(str).tolist(),
+        'ts': records['ts'].tolist(),
+        'moving': np.where(records['speed'] > 0, 'Y', 'N').tolist(),
+        'heading': heading.tolist(),
+        'speed': records['speed'].astype(float).tolist(),
+        'vessel_name_id': [codes[0] for codes in vessel_codes],
+        'vessel_type_id': [codes[1] for codes in vessel_codes],
+        f'{sp_cols["x"]}{mercator_suffix}': records['x'].tolist(),
+        f'{sp_cols["y"]}{mercator_suffix}': records['y'].tolist()
+        }
+
+def is_prefork_worker():
+    return os.environ.get(PREFORK_ENV) == '1'
+
+def get_shared_table():
+    global _shared_table
+
+    if _shared_table is None and is_prefork_worker():
+        _shared_table = VesselTable(TABLE_PATH)
+
+    return _shared_table
+
+def load_code_mappings():
+    # The AIS code descriptions (i.e., the only Redis key that a Kafka warm-up still depends on); empty if Redis is unreachable
+    redis_client = Redis(host=settings['redis_host'], port=settings['redis_port'], db=settings['redis_db'], decode_responses=True)
+    try:
+        return redis_client.hgetall('ais_code_descriptions')
+    except ConnectionError as e:
+        print(f'Redis connection failed: {e}. AIS code descriptions are unavailable...')
+        return {}
+    finally:
+        redis_client.connection_pool.disconnect()
+
+def scan_table_cache():
+    # Scan the Redis cache into (mmsi, ts, x, y, speed, heading, vessel_name, vessel_type) tuples; None if Redis is unreachable
+    redis_client = Redis(host=settings['redis_host'], port=settings['redis_port'], db=settings['redis_db'], decode_responses=True)
+    try:
+        _pong = redis_client.ping()
+    except ConnectionError as e:
+        print(f'Redis connection failed: {e}. Check config. Exiting...')
+        return None
+
+    code_mappings = METADATA.code_mappings
+    if not code_mappings:
+        code_mappings.update(redis_client.hgetall('ais_code_descriptions'))
+
+    rows = []
+    for mmsi in redis_client.scan_iter(match='*', count=1000):
+        if redis_client.type(mmsi) != 'hash':
+            continue
+        data = redis_client.hgetall(mmsi)
+        if 'timestamp' in data and mmsi.isdigit():
+            x, y = get_coord_transformer().transform(data['longitude'], data['latitude'])
+            vessel_type = data.get('vessel_type', code_mappings.get(data.get('shiptype', ''), '').split(',')[0])
+            rows.append((int(mmsi), int(data['timestamp']), x, y, float(data.get('speed', 0)), float(data.get('heading', 0)), data.get('vessel_name', data.get('shipname', '')), vessel_type))
+
+    redis_client.connection_pool.disconnect()
+    return rows
+
+def load_table_from_cache(table: VesselTable, rows: list = None, newer_only: bool = False):
+    # Upsert the (scanned) Redis cache to the table; if ``newer_only``, vessels are only updated if the cache holds a newer position (i.e., reconciliation)
+    rows = scan_table_cache() if rows is None else rows
+    if rows is None:
+        return 0
+
+    n_updated = 0
+    with table.batch():
+        for mmsi, ts, x, y, speed, heading, vessel_name, vessel_type in rows:
+            latest_ts = table.latest_ts(mmsi) if newer_only else None
+            if latest_ts is not None and latest_ts >= ts:
+                continue
+            name_code, type_code = METADATA.update(mmsi, vessel_name, vessel_type)
+            table.upsert(mmsi, ts, x, y, speed, heading, name_code, type_code)
+            n_updated += 1
+
+    return n_updated
+
+def load_table_from_snapshot(table: VesselTable, path: str):
+    # Restore the table (and the metadata factors) from a snapshot; returns the Kafka offsets it reflects, or None if there is no (valid) snapshot
+    snapshot = read_snapshot(path)
+    if snapshot is None:
+        return None
+
+    columns, header = snapshot
+    METADATA.restore(header['factors'], columns['mmsi'].tolist(), columns['name_code'].tolist(), columns['type_code'].tolist())
+    with table.batch():
+        table.restore(columns)
+
+    print(f"Restored {len(table)} vessels from snapshot {path} ({(time.time_ns() // 1_000_000 - header['created_ms']) / 1000:.1f}s old)")
+    return {key: int(offset) for key, offset in header['offsets'].items()}
+
+def snapshot_thread(table_columns: dict, offsets: dict, factors: dict, path: str):
+    try:
+        write_snapshot(path, table_columns, offsets, factors)
+    except OSError as e:
+        print(f'Snapshot {path} failed: {e}')
+
+def ingest_records(table: VesselTable, records: list, archive: VesselArchive = None):
+    kinematic = [record for record in records if len(record) > 4]
+
+    for record in records:
+        if len(record) <= 4:
+            vessel_type = METADATA.code_mappings.get(str(record.get('shiptype', '')), '').split(',')[0]
+            name_code, type_code = METADATA.update(record.get('mmsi'), record.get('shipname', ''), vessel_type)
+            table.update_codes(int(record.get('mmsi')), name_code, type_code)
+
+    if not kinematic:
+        return
+
+    # Project the batch's positions at once
+    xs, ys = get_coord_transformer().transform(np.array([float(r.get('longitude')) for r in kinematic]), np.array([float(r.get('latitude')) for r in kinematic]))
+
+    for record, x, y in zip(kinematic, np.atleast_1d(xs), np.atleast_1d(ys)):
+        mmsi, ts = int(record.get('mmsi')), int(record.get('timestamp'))
+        speed, heading = float(record.get('speed', 0)), float(record.get('heading', 0))
+        name_code, type_code = METADATA.lookup(mmsi)
+
+        table.upsert(mmsi, ts, x, y, speed, heading, name_code, type_code)    # Stale and duplicate reports are dropped (consult ``VesselTable.upsert``)
+        if archive is not None:
+            archive.append(mmsi, ts, x, y, speed, heading)
+
+def fold_latest(mmsis: np.ndarray, timestamps: np.ndarray):
+    # Return the indices of the latest report per MMSI (ties are resolved in favour of the last one received)
+    order = np.lexsort((np.arange(len(mmsis)), timestamps, mmsis))
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = mmsis[order][1:] != mmsis[order][:-1]
+    return order[last]
+
+def warmup_from_kafka(table: VesselTable, horizon_ms: int, batch_size: int = 10_000, idle_timeout: float = 10.0):
+    # Replay the last ``horizon_ms`` of the stream (up to the high watermark) into the table; returns the offsets to resume the live stream from, or None on failure
+    consumer = Consumer({'bootstrap.servers': settings['kafka_broker'], 'group.id': settings.get('ingest_group_id', 'unipi-ais-ingest'), 'enable.auto.commit': False})
+    try:
+        broker_reply = consumer.list_topics(timeout=5)
+        start_ms = int(time.time_ns() // 1_000_000) - horizon_ms
+        partitions = [TopicPartition(topic, partition, start_ms) for topic in settings['kafka_topics'].split(',') if topic in broker_reply.topics for partition in broker_reply.topics[topic].partitions]
+        partitions = consumer.offsets_for_times(partitions, timeout=5)
+    except KafkaException as e:
+        print(f'Kafka warm-up failed: {e}. Falling back to the Redis cache...')
+        consumer.close()
+        return None
+
+    # The offsets to resume from are the high watermarks at the time of the warm-up (of the drained partitions); anything past them is consumed live
+    high = {(p.topic, p.partition): consumer.get_watermark_offsets(p, timeout=5)[1] for p in partitions}
+    for partition in partitions:
+        if partition.offset < 0:    # No messages within the horizon
+            partition.offset = high[(partition.topic, partition.partition)]
+
+    pending = {(p.topic, p.partition) for p in partitions if p.offset < high[(p.topic, p.partition)]}
+    resume = {(p.topic, p.partition): p.offset for p in partitions}    # i.e., past the last replayed message of each partition
+    consumer.assign(partitions)
+
+    n_replayed, last_msg = 0, time.time()
+    try:
+        while pending and time.time() - last_msg < idle_timeout:
+            msgs = [msg for msg in consumer.consume(num_messages=batch_size, timeout=1.0) if not msg.error()]
+            if not msgs:
+                continue
+            last_msg = time.time()
+
+            records = []
+            for msg in msgs:
+                key = (msg.topic(), msg.partition())
+                if key in pending and msg.offset() < high[key]:
+                    records.append(json.loads(msg.value().decode('utf-8'))['payload'])
+                    resume[key] = max(resume[key], msg.offset() + 1)
+                if msg.offset() + 1 >= high[key]:
+                    pending.discard(key)
+
+            # Static reports are applied in order, whereas the kinematic ones are folded to the latest per vessel
+            static = [record for record in records if len(record) <= 4]
+            kinematic = [record for record in records if len(record) > 4]
+            if kinematic:
+                latest = fold_latest(np.array([int(r.get('mmsi')) for r in kinematic]), np.array([int(r.get('timestamp')) for r in kinematic]))
+                kinematic = [kinematic[i] for i in latest]
+
+            with table.batch():
+                ingest_records(table, static + kinematic)
+            n_replayed += len(records)
+    finally:
+        consumer.close()
+
+    # The partitions that timed out are resumed from where their replay stopped (i.e., their remaining backlog is consumed live)
+    print(f'Kafka warm-up replayed {n_replayed} reports ({len(table)} vessels)' + (f'; timed out on {len(pending)} partitions' if pending else ''))
+    return {f'{topic}:{partition}': resume[(topic, partition)] if (topic, partition) in pending else offset for (topic, partition), offset in high.items()}
+
+def ingest_process(table_path: str = TABLE_PATH, batch_size: int = 1000, batch_timeout: float = 0.1, expire_interval: float = 10.0, moving_ttl: int = 720_000, stationary_ttl: int = 1_800_000, seal_interval: float = 60.0, snapshot_interval: float = 30.0, warmup: str = settings.get('warmup', 'redis')):
+
+    # The table is rebuilt from scratch (i.e., after a restart, its vessels are dropped), and the metadata journal is (re)set before
+    # any vessel is written, so that the workers never see a code that the journal lacks
+    table = VesselTable(table_path, writable=True)
+    with table.batch():
+        table.clear()
+    METADATA.set_journal(f'{table_path}.metadata')
+    METADATA.on_compact(table.recode)
+
+    snapshot_path = settings.get('snapshot_path')
+    offsets = load_table_from_snapshot(table, snapshot_path) if snapshot_path else None
+
+    # Cold start from the snapshot; Redis is only scanned (in the background) to reconcile the vessels that were updated since.
+    # Otherwise, either replay the stream (``warmup = kafka``) or scan Redis; the former resumes the live stream exactly where the replay stopped
+    METADATA.code_mappings.update(load_code_mappings())
+    if offsets is None and warmup == 'kafka':
+        offsets = warmup_from_kafka(table, stationary_ttl)
+
+    reconciled = Queue()
+    if offsets is None:
+        load_table_from_cache(table)
+    elif warmup != 'kafka':
+        Thread(target=lambda: reconciled.put(scan_table_cache()), name='unipi-ais-reconcile', daemon=True).start()
+
+    print(f"Kafka ingest process starting ({len(table)} vessels cached), subscribing to topics: {settings['kafka_topics'].split(',')}")
+    consumer = create_consumer(settings.get('ingest_group_id', 'unipi-ais-ingest'), offsets=offsets)
+    if consumer is None:
+        sys.exit(1)    # i.e., the ingest process is restarted by its supervisor (consult serve.py)
+
+    # The ingest metrics are dumped next to the table, and served by the workers (consult ``vessel_metrics``)
+    INGEST_METRICS.gauge('vessels', 'Vessels tracked by the shared table', lambda: len(table))
+    metrics_path = f'{table_path}.metrics'
+
+    last_expire = last_seal = last_snapshot = time.time()
+    snapshot_writer = None
+    try:
+        while True:
+            msgs = [msg for msg in consumer.consume(num_messages=batch_size, timeout=batch_timeout) if not msg.error()]
+            expire = time.time() - last_expire >= expire_interval
+
+            if msgs or expire:
+                with table.batch(kafka_ms=min((msg.timestamp()[1] for msg in msgs), default=None)):
+                    decode_start = time.perf_counter()
+                    ingest_records(table, [json.loads(msg.value().decode('utf-8'))['payload'] for msg in msgs], archive=ARCHIVE)
+                    MESSAGES.inc(len(msgs))
+                    DECODE_SECONDS.inc(time.perf_counter() - decode_start)
+
+                    if expire:
+                        purge_start = time.perf_counter()
+                        table.expire(int(time.time_ns() // 1_000_000), moving_ttl, stationary_ttl)
+                        EXPIRE_SECONDS.observe(time.perf_counter() - purge_start)
+                        last_expire = time.time()
+
+            if expire:
+                STALE_REPORTS.value, DUPLICATE_REPORTS.value = table.stale, table.duplicates
+                INGEST_METRICS.dump(metrics_path, namespace='unipi_ais_ingest')
+
+            try:
+                rows = reconciled.get_nowait()
+                print(f'Reconciled {load_table_from_cache(table, rows or [], newer_only=True)} vessels with the Redis cache')
+            except Empty:
+                pass
+
+            if ARCHIVE is not None:
+                ARCHIVE.flush()
+                if time.time() - last_seal >= seal_interval:
+                    ARCHIVE.seal()
+                    last_seal = time.time()
+
+            # Write-behind: the table is copied (along with the offsets it reflects) here, but written to disk by a background thread
+            if snapshot_path and time.time() - last_snapshot >= snapshot_interval and not (snapshot_writer and snapshot_writer.is_alive()):
+                positions = {f'{p.topic}:{p.partition}': p.offset for p in consumer.position(consumer.assignment()) if p.offset >= 0}
+                snapshot_writer = Thread(target=snapshot_thread, args=(table.columns(), positions, METADATA.factors(), snapshot_path), name='unipi-ais-snapshot', daemon=True)
+                snapshot_writer.start()
+                last_snapshot = time.time()
+    finally:
+        if ARCHIVE is not None:
+            ARCHIVE.flush()
+        if snapshot_writer is not None:
+            snapshot_writer.join()
+        consumer.close()
+
+def sync_from_table(table: VesselTable, since_version: int, source: ColumnDataSource, record_index: dict, index_lock: Lock, sp_cols: dict = {'x': 'lon', 'y': 'lat'}, mercator_suffix: str = '_merc', trails: VesselTrails = None, dead_reckoning: DeadReckoning = None, factors: MetadataFactors = None, vessel_list: VesselList = None):
+    # Apply the vessels that changed (at the shared table) since ``since_version`` as a single patch (and stream); returns the synced version
+    version, rows = table.read_changes(since_version)
+    rows = rows[rows['valid'] == 1]
+    if len(rows) == 0:
+        return version
+
+    # The vessels' codes are re-coded at the table on every compaction of the factors, i.e., they are patched along with the changes
+    METADATA.follow(f'{table.path}.metadata')
+    if factors is not None:
+        factors.sync()
+
+    x_col, y_col = f'{sp_cols["x"]}{mercator_suffix}', f'{sp_cols["y"]}{mercator_suffix}'
+    kinematic_cols = ['ts', 'moving', 'heading', 'speed', x_col, y_col]
+    patches = {col: [] for col in kinematic_cols + ['vessel_name_id', 'vessel_type_id']}
+    new_rows = {col: [] for col in ['mmsi'] + kinematic_cols + ['vessel_name_id', 'vessel_type_id']}
+
+    with index_lock:
+        data = source.data
+        n_rows = len(data['mmsi'])
+
+        for mmsi, ts, x, y, speed, heading, name_code, type_code in zip(rows['mmsi'].astype(str).tolist(), rows['ts'].tolist(), rows['x'].tolist(), rows['y'].tolist(), 
+                                                                        rows['speed'].tolist(), rows['heading'].tolist(), rows['name_code'].tolist(), rows['type_code'].tolist()):
+            values = {'ts': ts, 'moving': 'Y' if speed > 0 else 'N', 'heading': heading, 'speed': speed, x_col: x, y_col: y}
+            idx = record_index.get(mmsi)
+
+            if idx is None:
+                idx = record_index[mmsi] = n_rows + len(new_rows['mmsi'])
+                for col, value in zip(new_rows.keys(), [mmsi] + list(values.values()) + [name_code, type_code]):
+                    new_rows[col].append(value)
+                if trails is not None:
+                    trails.push(idx, x, y)
+                if dead_reckoning is not None:
+                    dead_reckoning.should_send(idx, ts, x, y, speed, heading)
+                if vessel_list is not None:
+                    vessel_list.touch(idx)
+                continue
+
+            if ts != data['ts'][idx]:
+                if trails is not None:
+                    trails.push(idx, x, y)
+                if dead_reckoning is None or dead_reckoning.should_send(idx, ts, x, y, speed, heading):
+                    for col, value in values.items():
+                        patches[col].append((idx, value))
+                    if vessel_list is not None:
+                        vessel_list.touch(idx)
+
+            if (name_code, type_code) != (data['vessel_name_id'][idx], data['vessel_type_id'][idx]):
+                patches['vessel_name_id'].append((idx, name_code))
+                patches['vessel_type_id'].append((idx, type_code))
+                if vessel_list is not None:
+                    vessel_list.touch(idx)
+
+        patches = {col: patch for col, patch in patches.items() if patch}
+        if patches:
+            source.patch(patches)
+        if new_rows['mmsi']:
+            source.stream(new_rows)
+
+    if patches or new_rows['mmsi']:
+        n_rows = max((len(patch) for patch in patches.values()), default=0) + len(new_rows['mmsi'])
+        observe_flush({'patches': patches, 'new_rows': new_rows}, n_rows=n_rows, kafka_ms=table.kafka_ms)
+
+    return version
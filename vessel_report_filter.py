@@ -0,0 +1,60 @@
+"""Suppression of Out-of-Order and Duplicate Kinematic Reports.
+
+   Keeps the timestamp of the latest report (per vessel) that was applied to a session's ColumnDataSource, keyed by its row (i.e., via
+   the MMSI index). Reports that are older than (stale), or as old as (duplicate), the applied one are dropped before they are patched,
+   e.g., late messages from another partition, or messages that are redelivered during broker rebalances and replays.
+"""
+
+
+import numpy as np
+
+from vessel_metrics import STALE_REPORTS, DUPLICATE_REPORTS
+
+
+class ReportFilter:
+    def __init__(self, capacity: int = 1024):
+        """
+        capacity: The initial number of vessels; doubled whenever exceeded
+        """
+        self._last_ts = np.full(capacity, -1, dtype='i8')    # -1: No report has been applied yet
+
+        self.accepted = 0
+        self.stale = 0
+        self.duplicates = 0
+
+    def _ensure_capacity(self, idx: int):
+        capacity = len(self._last_ts)
+        if idx < capacity:
+            return
+
+        self._last_ts = np.concatenate([self._last_ts, np.full(max(capacity, idx + 1 - capacity), -1, dtype='i8')])
+
+    def accept(self, idx: int, ts: int):
+        """
+        Decide whether a (kinematic) report of the vessel at row ``idx`` is newer than the applied one; if so, it is recorded as applied.
+        """
+        self._ensure_capacity(idx)
+        last_ts = self._last_ts[idx]
+
+        if ts < last_ts:
+            self.stale += 1
+            STALE_REPORTS.inc()
+            return False
+        if ts == last_ts:
+            self.duplicates += 1
+            DUPLICATE_REPORTS.inc()
+            return False
+
+        self._last_ts[idx] = ts
+        self.accepted += 1
+        return True
+
+    def compact(self, keep: list):
+        """
+        Drop the purged vessels, so as to remain aligned with the (compacted) live ColumnDataSource.
+        """
+        self._ensure_capacity(len(keep) - 1)
+        rows = np.flatnonzero(keep)
+
+        self._last_ts[:len(rows)] = self._last_ts[rows]
+        self._last_ts[len(rows):] = -1
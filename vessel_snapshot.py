@@ -0,0 +1,94 @@
+"""Columnar, Checksummed Snapshots of the Shared Vessel Table.
+
+   A snapshot is a single file: a magic number, a JSON header (i.e., the Kafka offsets that the snapshot reflects, the metadata factors,
+   and the dtype, location and CRC32 of every column), followed by the (64-byte aligned) column blobs. Snapshots are written to a temporary
+   file that atomically replaces the previous one, and are read back via memory mapping.
+"""
+
+
+import os
+import json
+import time
+import zlib
+import struct
+
+import numpy as np
+
+
+SNAPSHOT_MAGIC = b'AISSNAP1'
+SNAPSHOT_ALIGNMENT = 64
+
+
+def _aligned(offset: int):
+    return -(-offset // SNAPSHOT_ALIGNMENT) * SNAPSHOT_ALIGNMENT
+
+
+def write_snapshot(path: str, columns: dict, offsets: dict, factors: dict = None):
+    """
+    columns: The table's columns (name -> NumPy array; all of the same length)
+    offsets: The next Kafka offset to be consumed, per ``'<topic>:<partition>'``
+    factors: The (dictionary-encoding) factors of the table's code columns (e.g., ``{'names': [...], 'types': [...]}``)
+    """
+    columns = {name: np.ascontiguousarray(values) for name, values in columns.items()}
+    header = {
+        'created_ms': int(time.time_ns() // 1_000_000),
+        'n_rows': len(next(iter(columns.values()))) if columns else 0,
+        'offsets': offsets,
+        'factors': factors or {},
+        'columns': [],
+    }
+
+    # The blobs' offsets are relative to the (aligned) end of the header
+    position = 0
+    for name, values in columns.items():
+        header['columns'].append({'name': name, 'dtype': values.dtype.str, 'offset': position, 'nbytes': values.nbytes, 'crc32': zlib.crc32(values.data)})
+        position = _aligned(position + values.nbytes)
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = _aligned(len(SNAPSHOT_MAGIC) + 8 + len(header_bytes))
+
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+
+        for desc, values in zip(header['columns'], columns.values()):
+            f.seek(data_start + desc['offset'])
+            f.write(values.data)
+
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: str):
+    """
+    Return the snapshot's columns (memory-mapped) along with its header, or None if the snapshot is missing or corrupted.
+    """
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                raise ValueError('invalid magic number')
+            header_len, = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_len).decode('utf-8'))
+    except (OSError, ValueError, struct.error) as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f'Snapshot {path} is not readable: {e}')
+        return None
+
+    data_start = _aligned(len(SNAPSHOT_MAGIC) + 8 + header_len)
+    columns = {}
+
+    for desc in header['columns']:
+        dtype = np.dtype(desc['dtype'])
+        n_values = desc['nbytes'] // dtype.itemsize
+        values = np.memmap(path, dtype=dtype, mode='r', offset=data_start + desc['offset'], shape=(n_values,)) if n_values else np.zeros(0, dtype=dtype)
+
+        if zlib.crc32(values.data if n_values else b'') != desc['crc32']:
+            print(f'Snapshot {path} is corrupted (column {desc["name"]})')
+            return None
+        columns[desc['name']] = values
+
+    return columns, header
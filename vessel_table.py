@@ -0,0 +1,229 @@
+"""Shared-Memory Vessel Table of the multi-process deployment (consult ``serve.py``).
+
+   A single writer (i.e., the ingest process) keeps the latest state of every vessel in a fixed-capacity, memory-mapped array (by
+   default, under ``/dev/shm``), while the Bokeh worker processes map the same file read-only. Writes are grouped in batches, each
+   guarded by a sequence lock (the sequence is odd while a batch is being written) and stamped with an increasing version, so that
+   readers copy only the (consistent) rows that changed since the version they last saw.
+"""
+
+
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+
+TABLE_HEADER_DTYPE = np.dtype([('seq', '<u8'), ('version', '<u8'), ('n_rows', '<u8'), ('capacity', '<u8'), ('stale', '<u8'), ('duplicates', '<u8'), ('kafka_ms', '<u8'), ('reserved', '<u8', (1,))])
+TABLE_ROW_DTYPE = np.dtype([
+    ('mmsi', '<u4'), ('valid', 'u1'), ('reserved', 'u1', (3,)), ('ts', '<i8'), ('x', '<f8'), ('y', '<f8'),
+    ('speed', '<f4'), ('heading', '<f4'), ('name_code', '<i4'), ('type_code', '<i4'), ('version', '<u8')
+])
+TABLE_SNAPSHOT_COLUMNS = ['mmsi', 'ts', 'x', 'y', 'speed', 'heading', 'name_code', 'type_code']    # i.e., the arguments of ``upsert``
+TABLE_DEFAULT_PATH = '/dev/shm/unipi-ais.table'
+TABLE_DEFAULT_CAPACITY = 65536
+
+
+class VesselTable:
+    def __init__(self, path: str = TABLE_DEFAULT_PATH, writable: bool = False):
+        """
+        path: The table's (memory-mapped) file; consult ``create``
+        writable: Whether the table is opened by the (single) writer
+        """
+        self.path = path
+        self.writable = writable
+        mode = 'r+' if writable else 'r'
+
+        self._header = np.memmap(path, dtype=TABLE_HEADER_DTYPE, mode=mode, shape=(1,))
+        self.capacity = int(self._header['capacity'][0])
+        self._rows = np.memmap(path, dtype=TABLE_ROW_DTYPE, mode=mode, offset=TABLE_HEADER_DTYPE.itemsize, shape=(self.capacity,))
+
+        self._version = None
+        self._index = {}    # mmsi -> row (writer only)
+        self._free = []
+
+        if writable:
+            n_rows = int(self._header['n_rows'][0])
+            rows = self._rows[:n_rows]
+            self._index = {int(mmsi): row for row, mmsi in zip(np.flatnonzero(rows['valid']), rows['mmsi'][rows['valid'] == 1])}
+            self._free = np.flatnonzero(rows['valid'] == 0)[::-1].tolist()
+
+    @staticmethod
+    def create(path: str = TABLE_DEFAULT_PATH, capacity: int = TABLE_DEFAULT_CAPACITY):
+        """
+        Create (or truncate) a table of ``capacity`` vessels.
+        """
+        with open(path, 'wb') as f:
+            f.truncate(TABLE_HEADER_DTYPE.itemsize + capacity * TABLE_ROW_DTYPE.itemsize)
+
+        header = np.memmap(path, dtype=TABLE_HEADER_DTYPE, mode='r+', shape=(1,))
+        header['capacity'] = capacity
+        header.flush()
+
+    @property
+    def version(self):
+        return int(self._header['version'][0])
+
+    @property
+    def stale(self):
+        """
+        The number of (kinematic) reports that were dropped for being older than the vessel's latest position.
+        """
+        return int(self._header['stale'][0])
+
+    @property
+    def duplicates(self):
+        """
+        The number of (kinematic) reports that were dropped for being as old as the vessel's latest position.
+        """
+        return int(self._header['duplicates'][0])
+
+    def __len__(self):
+        return len(self._index) if self.writable else int(np.count_nonzero(self._rows['valid'][:int(self._header['n_rows'][0])]))
+
+    @property
+    def kafka_ms(self):
+        """
+        The (oldest) Kafka timestamp of the latest batch's messages, if any (e.g., for the ingest-to-patch latency).
+        """
+        return int(self._header['kafka_ms'][0])
+
+    @contextmanager
+    def batch(self, kafka_ms: int = None):
+        """
+        Group a batch of writes, i.e., readers either see all of them or none.
+        """
+        if kafka_ms and kafka_ms > 0:    # i.e., unless unavailable
+            self._header['kafka_ms'] = kafka_ms
+        self._header['seq'] += 1    # Odd: a batch is being written
+        self._version = self.version + 1
+        try:
+            yield self
+        finally:
+            self._header['version'] = self._version
+            self._header['seq'] += 1
+            self._version = None
+
+    def _row(self, mmsi: int, allocate: bool = True):
+        row = self._index.get(mmsi)
+        if row is not None or not allocate:
+            return row
+
+        if self._free:
+            row = self._free.pop()
+        else:
+            row = int(self._header['n_rows'][0])
+            if row == self.capacity:
+                print(f'Vessel table is full ({self.capacity} vessels); dropping {mmsi}')
+                return None
+            self._header['n_rows'] = row + 1
+
+        self._index[mmsi] = row
+        return row
+
+    def upsert(self, mmsi: int, ts: int, x: float, y: float, speed: float, heading: float, name_code: int = 0, type_code: int = 0):
+        """
+        Update the latest position of a vessel; stale and duplicate reports (i.e., not newer than the latest position) are dropped.
+        Return whether the table was updated.
+        """
+        row = self._row(int(mmsi))
+        if row is None:
+            return False
+
+        if self._rows['valid'][row] and ts <= self._rows['ts'][row]:
+            self._header['stale' if ts < self._rows['ts'][row] else 'duplicates'] += 1
+            return False
+
+        self._rows[row] = (mmsi, 1, 0, ts, x, y, speed, heading, name_code, type_code, self._version)
+        return True
+
+    def update_codes(self, mmsi: int, name_code: int, type_code: int):
+        """
+        Update the static information of an (already tracked) vessel.
+        """
+        row = self._row(int(mmsi), allocate=False)
+        if row is None:
+            return
+
+        self._rows['name_code'][row] = name_code
+        self._rows['type_code'][row] = type_code
+        self._rows['version'][row] = self._version
+
+    def recode(self, name_remap: list, type_remap: list):
+        """
+        Map the codes of every vessel to their current ones, e.g., once the metadata factors are compacted; must be called within a batch.
+        """
+        rows = self._rows[:int(self._header['n_rows'][0])]
+        rows['name_code'] = np.asarray(name_remap)[rows['name_code']]
+        rows['type_code'] = np.asarray(type_remap)[rows['type_code']]
+        rows['version'][rows['valid'] == 1] = self._version
+
+    def clear(self):
+        """
+        Drop every vessel, e.g., once a (restarted) writer rebuilds the table; must be called within a batch.
+        """
+        rows = self._rows[:int(self._header['n_rows'][0])]
+        rows['version'][rows['valid'] == 1] = self._version
+        rows['valid'] = 0
+
+        self._index.clear()
+        self._free = list(range(len(rows)))[::-1]
+
+    def latest_ts(self, mmsi: int):
+        """
+        Return the timestamp of the vessel's latest position, or None if it is not tracked (writer only).
+        """
+        row = self._row(int(mmsi), allocate=False)
+        return None if row is None else int(self._rows['ts'][row])
+
+    def expire(self, now_ms: int, moving_ttl: int, stationary_ttl: int):
+        """
+        Drop the vessels whose latest position is older than ``moving_ttl`` (``stationary_ttl``) ms, if moving (stationary).
+        """
+        n_rows = int(self._header['n_rows'][0])
+        rows = self._rows[:n_rows]
+        age = now_ms - rows['ts']
+        expired = np.flatnonzero((rows['valid'] == 1) & np.where(rows['speed'] > 0, age > moving_ttl, age > stationary_ttl))
+
+        for row in expired:
+            del self._index[int(rows['mmsi'][row])]
+            self._free.append(int(row))
+
+        self._rows['valid'][expired] = 0
+        self._rows['version'][expired] = self._version
+
+        return len(expired)
+
+    def columns(self):
+        """
+        Return (a copy of) the columns of the tracked vessels (writer only; e.g., for a snapshot).
+        """
+        rows = self._rows[:int(self._header['n_rows'][0])]
+        rows = rows[rows['valid'] == 1]
+
+        return {name: np.array(rows[name]) for name in TABLE_SNAPSHOT_COLUMNS}
+
+    def restore(self, columns: dict):
+        """
+        Upsert the vessels of a set of columns (e.g., of a snapshot) to the table; must be called within a batch.
+        """
+        for values in zip(*[columns[name].tolist() for name in TABLE_SNAPSHOT_COLUMNS]):
+            self.upsert(*values)
+
+    def read_changes(self, since_version: int = 0, max_retries: int = 1000):
+        """
+        Return the current version along with (a copy of) the rows that changed after ``since_version`` (inc. the expired ones, i.e., ``valid == 0``).
+        """
+        for _ in range(max_retries):
+            seq = int(self._header['seq'][0])
+            if seq % 2 == 1:
+                time.sleep(0.001)
+                continue
+
+            version = int(self._header['version'][0])
+            rows = self._rows[:int(self._header['n_rows'][0])]
+            changes = rows[rows['version'] > since_version]    # Boolean indexing copies the rows
+
+            if int(self._header['seq'][0]) == seq:
+                return version, np.array(changes)
+
+        raise TimeoutError(f'Could not read a consistent version of {self.path}')
@@ -0,0 +1,105 @@
+"""Opt-in Tracing and Profiling Endpoints (consult ``st_visions/trace_helper.py``).
+
+   Enabled by setting ``tracing = yes`` at server.ini. Served at ``127.0.0.1:<debug_port>`` only (server.ini; default: 5097), i.e., never at
+   the public port; every worker of the multi-process deployment serves its own at ``debug_port + <worker id>``:
+     * ``/debug/trace``: The recorded spans as Chrome trace-event JSON (``?clear=1`` also clears them)
+     * ``/debug/spans``: The rolling percentiles (ms) of every span's duration
+     * ``/debug/profile?seconds=10``: A cProfile capture of the IOLoop (i.e., of every callback) for the given duration
+     * ``/debug/profile?seconds=10&mode=sampling``: A statistical profile (collapsed stacks, i.e., the input of flamegraph.pl)
+"""
+
+
+import os
+import sys
+import json
+import asyncio
+from threading import get_ident
+
+from tornado.ioloop import IOLoop
+from tornado.web import Application, RequestHandler, HTTPError
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'st_visions'))
+from trace_helper import TRACER, Tracer, sample_stacks, instrument_bokeh_server
+
+
+TRACING_PREFIX = '/debug'
+DEBUG_DEFAULT_PORT = 5097
+PROFILE_MAX_SECONDS = 60
+
+
+def enable_tracing(tracer: Tracer = TRACER):
+    """
+    Start recording spans, including the Bokeh Server's document patches.
+    """
+    tracer.enabled = True
+    instrument_bokeh_server(tracer)
+
+
+class TraceHandler(RequestHandler):
+    def initialize(self, tracer: Tracer):
+        self.tracer = tracer
+
+    def get(self):
+        self.set_header('Content-Type', 'application/json')
+        self.set_header('Content-Disposition', f'attachment; filename="unipi-ais-trace-{os.getpid()}.json"')
+        self.write(json.dumps(self.tracer.to_chrome_trace()))
+
+        if self.get_argument('clear', '0') == '1':
+            self.tracer.clear()
+
+
+class SpansHandler(RequestHandler):
+    def initialize(self, tracer: Tracer):
+        self.tracer = tracer
+
+    def get(self):
+        self.set_header('Content-Type', 'application/json')
+        self.write(json.dumps(self.tracer.stats()))
+
+
+class ProfileHandler(RequestHandler):
+    def initialize(self, tracer: Tracer):
+        self.tracer = tracer
+
+    async def get(self):
+        seconds = min(float(self.get_argument('seconds', '10')), PROFILE_MAX_SECONDS)
+        mode = self.get_argument('mode', 'cprofile')
+        self.set_header('Content-Type', 'text/plain; charset=utf-8')
+
+        if mode == 'sampling':
+            # Sampled from another thread, so that the IOLoop keeps running (i.e., it is profiled under its actual load)
+            samples = await IOLoop.current().run_in_executor(None, sample_stacks, seconds, 0.005, get_ident())
+            self.write(''.join(f'{stack} {count}\n' for stack, count in samples.most_common()))
+            return
+
+        if mode != 'cprofile':
+            raise HTTPError(400, f'Unknown profiling mode: {mode}')
+
+        try:
+            self.tracer.start_profile()
+        except ValueError as e:
+            raise HTTPError(409, str(e))
+        await asyncio.sleep(seconds)
+        self.write(self.tracer.stop_profile(sort=self.get_argument('sort', 'cumulative')))
+
+
+def tracing_patterns(tracer: Tracer = TRACER, prefix: str = TRACING_PREFIX):
+    """
+    The URL patterns of the endpoints, e.g., for the ``extra_patterns`` of a Bokeh Server.
+    """
+    return [
+        (f'{prefix}/trace', TraceHandler, {'tracer': tracer}),
+        (f'{prefix}/spans', SpansHandler, {'tracer': tracer}),
+        (f'{prefix}/profile', ProfileHandler, {'tracer': tracer}),
+    ]
+
+
+def start_debug_server(port: int = DEBUG_DEFAULT_PORT, tracer: Tracer = TRACER, address: str = '127.0.0.1', prefix: str = TRACING_PREFIX):
+    """
+    Start serving the endpoints on the current IOLoop (e.g., the Bokeh Server's); on the loopback interface, unless ``address`` is set.
+    """
+    app = Application(tracing_patterns(tracer, prefix))
+    app.listen(port, address=address)
+    print(f'Tracing: serving at {address}:{port}{prefix}')
+
+    return app
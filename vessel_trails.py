@@ -0,0 +1,111 @@
+"""Per-Vessel Trajectory Trails, backed by fixed-size Ring Buffers.
+
+   The last ``length`` (Mercator) positions of every vessel are kept in a preallocated 2-D array, whose rows are aligned with the
+   rows of the live ColumnDataSource (i.e., they are addressed via the MMSI index). Only the trails that changed since the last
+   flush are patched to the trails' ColumnDataSource.
+"""
+
+
+import numpy as np
+
+from bokeh.models import ColumnDataSource
+
+
+class VesselTrails:
+    def __init__(self, length: int = 20, capacity: int = 1024, sp_cols: dict = {'x': 'lon', 'y': 'lat'}, mercator_suffix: str = '_merc'):
+        """
+        length: The (maximum) number of positions per trail
+        capacity: The initial number of vessels; doubled whenever exceeded
+        """
+        self.length = length
+        self.x_col = f'{sp_cols["x"]}{mercator_suffix}'
+        self.y_col = f'{sp_cols["y"]}{mercator_suffix}'
+
+        self._xs = np.full((capacity, length), np.nan)
+        self._ys = np.full((capacity, length), np.nan)
+        self._heads = np.zeros(capacity, dtype=np.int64)     # The next slot to be written (per vessel)
+        self._counts = np.zeros(capacity, dtype=np.int64)    # The number of positions (per vessel)
+        self._dirty = set()
+
+        self.source = ColumnDataSource(data={self.x_col: [], self.y_col: []})
+
+    def _ensure_capacity(self, idx: int):
+        capacity = len(self._heads)
+        if idx < capacity:
+            return
+
+        new_capacity = max(capacity * 2, idx + 1)
+        self._xs = np.vstack([self._xs, np.full((new_capacity - capacity, self.length), np.nan)])
+        self._ys = np.vstack([self._ys, np.full((new_capacity - capacity, self.length), np.nan)])
+        self._heads = np.concatenate([self._heads, np.zeros(new_capacity - capacity, dtype=np.int64)])
+        self._counts = np.concatenate([self._counts, np.zeros(new_capacity - capacity, dtype=np.int64)])
+
+    def push(self, idx: int, x: float, y: float):
+        self._ensure_capacity(idx)
+
+        head = self._heads[idx]
+        self._xs[idx, head] = x
+        self._ys[idx, head] = y
+        self._heads[idx] = (head + 1) % self.length
+        self._counts[idx] = min(self._counts[idx] + 1, self.length)
+
+        self._dirty.add(idx)
+
+    def trail(self, idx: int):
+        """
+        Return the (x, y) coordinates of a vessel's trail, ordered from the oldest to the most recent position.
+        """
+        count, head = self._counts[idx], self._heads[idx]
+        order = (np.arange(head - count, head)) % self.length
+
+        return self._xs[idx, order], self._ys[idx, order]
+
+    def flush(self):
+        if not self._dirty:
+            return
+
+        n_rows = len(self.source.data[self.x_col])
+        patches = {self.x_col: [], self.y_col: []}
+        new_rows = {self.x_col: [], self.y_col: []}
+
+        for idx in sorted(self._dirty):
+            xs, ys = self.trail(idx)
+            if idx < n_rows:
+                patches[self.x_col].append((idx, xs.tolist()))
+                patches[self.y_col].append((idx, ys.tolist()))
+            else:
+                # Newly tracked vessels (rows are appended in the same order as the live ColumnDataSource)
+                for gap_idx in range(n_rows + len(new_rows[self.x_col]), idx):
+                    gap_xs, gap_ys = self.trail(gap_idx)
+                    new_rows[self.x_col].append(gap_xs.tolist())
+                    new_rows[self.y_col].append(gap_ys.tolist())
+                new_rows[self.x_col].append(xs.tolist())
+                new_rows[self.y_col].append(ys.tolist())
+
+        if patches[self.x_col]:
+            self.source.patch(patches)
+        if new_rows[self.x_col]:
+            self.source.stream(new_rows)
+
+        self._dirty.clear()
+
+    def compact(self, keep: list):
+        """
+        Drop the trails of the purged vessels, so as to remain aligned with the (compacted) live ColumnDataSource.
+        """
+        self._ensure_capacity(len(keep) - 1)
+        rows = np.flatnonzero(keep)
+
+        self._xs[:len(rows)] = self._xs[rows]
+        self._ys[:len(rows)] = self._ys[rows]
+        self._heads[:len(rows)] = self._heads[rows]
+        self._counts[:len(rows)] = self._counts[rows]
+
+        self._xs[len(rows):] = np.nan
+        self._ys[len(rows):] = np.nan
+        self._heads[len(rows):] = 0
+        self._counts[len(rows):] = 0
+
+        self._dirty.clear()
+        trails = [self.trail(idx) for idx in range(len(rows))]
+        self.source.data = {self.x_col: [xs.tolist() for xs, _ in trails], self.y_col: [ys.tolist() for _, ys in trails]}